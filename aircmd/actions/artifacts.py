@@ -0,0 +1,162 @@
+"""Keep build outputs on the host, addressed by content hash, so that later runs can fetch them instead of building them again."""
+
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import List, Optional
+
+from dagger import Client, Directory, File
+
+from ..models.settings import GlobalSettings
+
+OBJECTS_DIR = "objects"
+REFS_DIR = "refs"
+
+
+def get_directory_digest(path: str) -> str:
+    """The content hash of a host directory: its file paths, executable bits and contents."""
+    digest = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            file_path = os.path.join(dirpath, filename)
+            file_hash = hashlib.sha256()
+            with open(file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    file_hash.update(chunk)
+            executable = os.access(file_path, os.X_OK)
+            digest.update(f"{os.path.relpath(file_path, path)}\0{executable:d}\0{file_hash.hexdigest()}\n".encode())
+    return digest.hexdigest()
+
+
+def get_directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(dirpath, filename)) for dirpath, _, filenames in os.walk(path) for filename in filenames)
+
+
+class ArtifactStore:
+    """A content-addressed store of directories under the aircmd cache directory.
+
+    Artifacts are stored once per content hash and can be given keys, e.g. the digest of the sources they were built from.
+    The least recently used artifacts are evicted once the store exceeds max_bytes.
+
+    Args:
+        root (str): The directory of the store.
+        max_bytes (int): The size above which artifacts get evicted.
+    """
+
+    def __init__(self, root: str, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_settings(cls, settings: GlobalSettings) -> "ArtifactStore":
+        return cls(os.path.join(settings.CACHE_DIR, "artifacts"), settings.ARTIFACT_STORE_MAX_BYTES)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, OBJECTS_DIR, digest)
+
+    def _ref_path(self, key: str) -> str:
+        return os.path.join(self.root, REFS_DIR, hashlib.sha256(key.encode()).hexdigest())
+
+    def resolve(self, key: str) -> Optional[str]:
+        """The digest of the artifact stored under a key, None if there is none or if it was evicted."""
+        ref_path = self._ref_path(key)
+        if not os.path.isfile(ref_path):
+            return None
+        with open(ref_path) as f:
+            digest = f.read().strip()
+        return digest if os.path.isdir(self._object_path(digest)) else None
+
+    def get_path(self, key_or_digest: str) -> Optional[str]:
+        """The host path of an artifact, by key or digest, marking it as recently used."""
+        digest = self.resolve(key_or_digest) or key_or_digest
+        object_path = self._object_path(digest)
+        if not os.path.isdir(object_path):
+            return None
+        os.utime(object_path)
+        return object_path
+
+    def fetch_directory(self, client: Client, key_or_digest: str) -> Optional[Directory]:
+        """Load an artifact in the engine, by key or digest, None if it is not in the store."""
+        object_path = self.get_path(key_or_digest)
+        return client.host().directory(object_path) if object_path is not None else None
+
+    def _add(self, staging_path: str, key: Optional[str]) -> str:
+        digest = get_directory_digest(staging_path)
+        object_path = self._object_path(digest)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        try:
+            os.rename(staging_path, object_path)
+        except OSError:
+            # Already stored, e.g. by a concurrent run
+            shutil.rmtree(staging_path, ignore_errors=True)
+            if not os.path.isdir(object_path):
+                raise
+        os.utime(object_path)
+        if key is not None:
+            ref_path = self._ref_path(key)
+            os.makedirs(os.path.dirname(ref_path), exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(ref_path), delete=False) as f:
+                f.write(digest)
+            os.replace(f.name, ref_path)
+        self.evict(keep=digest)
+        return digest
+
+    def _staging_path(self) -> str:
+        os.makedirs(self.root, exist_ok=True)
+        return tempfile.mkdtemp(prefix=".staging-", dir=self.root)
+
+    async def publish_directory(self, directory: Directory, key: Optional[str] = None) -> str:
+        """Export a directory from the engine to the store.
+
+        Args:
+            directory (Directory): The directory to store, e.g. a build output.
+            key (Optional[str], optional): A key to fetch the artifact with, in addition to its digest. Defaults to None.
+
+        Returns:
+            str: The digest of the artifact.
+        """
+        staging_path = self._staging_path()
+        try:
+            await directory.export(staging_path)
+        except BaseException:
+            shutil.rmtree(staging_path, ignore_errors=True)
+            raise
+        return self._add(staging_path, key)
+
+    async def publish_file(self, file: File, name: str, key: Optional[str] = None) -> str:
+        """Export a file from the engine to the store, as an artifact directory holding the file under name."""
+        staging_path = self._staging_path()
+        try:
+            await file.export(os.path.join(staging_path, name))
+        except BaseException:
+            shutil.rmtree(staging_path, ignore_errors=True)
+            raise
+        return self._add(staging_path, key)
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        """Remove the least recently used artifacts until the store fits in max_bytes.
+
+        Args:
+            keep (Optional[str], optional): The digest of an artifact to keep even if it does not fit alone, e.g. the one just published. Defaults to None.
+
+        Returns:
+            List[str]: The digests of the evicted artifacts.
+        """
+        objects_path = os.path.join(self.root, OBJECTS_DIR)
+        if not os.path.isdir(objects_path):
+            return []
+        artifacts = [(os.stat(os.path.join(objects_path, digest)).st_mtime, digest) for digest in os.listdir(objects_path)]
+        sizes = {digest: get_directory_size(os.path.join(objects_path, digest)) for _, digest in artifacts}
+        total_bytes = sum(sizes.values())
+        evicted = []
+        for _, digest in sorted(artifacts):
+            if total_bytes <= self.max_bytes:
+                break
+            if digest == keep:
+                continue
+            shutil.rmtree(os.path.join(objects_path, digest), ignore_errors=True)
+            total_bytes -= sizes[digest]
+            evicted.append(digest)
+        return evicted
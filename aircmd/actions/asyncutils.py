@@ -1,15 +1,113 @@
 
-from typing import Any, Callable, Coroutine, Dict, List, Tuple
+import asyncio
+from contextlib import AsyncExitStack
+from typing import Any, AsyncIterator, Callable, Coroutine, Dict, List, Optional, Set, Tuple
 
-from prefect.utilities.asyncutils import create_gather_task_group
+from pydantic import BaseModel
 
 
-async def gather(*calls: Callable[..., Coroutine[Any, Any, Any]], args: List[Tuple[Any, ...]] = [], kwargs: List[Dict[str, Any]] = []) -> List[Any]:
+class GatherResult(BaseModel):
+    """The outcome of one of the gathered calls, index is its position in the calls."""
+
+    index: int
+    result: Any = None
+    error: Optional[BaseException] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+
+async def gather_iter(
+    *calls: Callable[..., Coroutine[Any, Any, Any]],
+    args: Optional[List[Tuple[Any, ...]]] = None,
+    kwargs: Optional[List[Dict[str, Any]]] = None,
+    limit: Optional[int] = None,
+    semaphores: Optional[List[Optional[asyncio.Semaphore]]] = None,
+    fail_fast: bool = True,
+) -> AsyncIterator[GatherResult]:
+    """
+    Run calls concurrently and yield their results as they complete.
+
+    At most limit calls are in flight at once: the next call only starts when one finishes, so gathering
+    hundreds of calls does not flood the engine.
+
+    Args:
+        *calls: Functions or coroutines to be run concurrently.
+        args: A list of tuples, where each tuple contains the positional arguments for the corresponding callable in `calls`.
+            Defaults to no positional arguments.
+        kwargs: A list of dictionaries, where each dictionary contains the keyword arguments for the corresponding callable in `calls`.
+            Defaults to no keyword arguments.
+        limit: The maximum number of calls in flight. Defaults to no limit.
+        semaphores: A semaphore to hold while running the corresponding callable in `calls`, or None, e.g. to share a resource limit
+            with other gathers. Defaults to no semaphores.
+        fail_fast: Whether to cancel the calls in flight and raise as soon as a call fails. Otherwise the failures are yielded
+            as results with an error. Defaults to True.
+
+    Yields:
+        The result of each call, in completion order.
+    """
+    # If no arguments or semaphores provided, use empty tuples, empty dictionaries and no semaphores
+    call_args = args if args is not None else [()] * len(calls)
+    call_kwargs = kwargs if kwargs is not None else [{}] * len(calls)
+    call_semaphores = semaphores if semaphores is not None else [None] * len(calls)
+
+    if len(calls) != len(call_args) or len(calls) != len(call_kwargs) or len(calls) != len(call_semaphores):
+        raise ValueError("The lengths of 'calls', 'args', 'kwargs' and 'semaphores' should be the same.")
+    if limit is not None and limit < 1:
+        raise ValueError("The limit should be at least 1.")
+
+    async def run(index: int) -> Any:
+        async with AsyncExitStack() as stack:
+            semaphore = call_semaphores[index]
+            if semaphore is not None:
+                await stack.enter_async_context(semaphore)
+            return await calls[index](*call_args[index], **call_kwargs[index])
+
+    pending_indexes = iter(range(len(calls)))
+    in_flight: Dict[asyncio.Task[Any], int] = {}
+
+    def start_next() -> None:
+        index = next(pending_indexes, None)
+        if index is not None:
+            in_flight[asyncio.ensure_future(run(index))] = index
+
+    try:
+        for _ in range(limit or len(calls)):
+            start_next()
+        while in_flight:
+            done: Set[asyncio.Task[Any]]
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=in_flight.__getitem__):
+                index = in_flight.pop(task)
+                if task.cancelled():
+                    error: Optional[BaseException] = asyncio.CancelledError()
+                else:
+                    error = task.exception()
+                if error is not None and fail_fast:
+                    raise error
+                # Only start the next call once the failure check passed, fail fast must not start any more work
+                start_next()
+                yield GatherResult(index=index, result=task.result() if error is None else None, error=error)
+    finally:
+        # Cancel the calls still in flight if a call failed or if the caller stopped iterating
+        for task in in_flight:
+            task.cancel()
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+
+async def gather(
+    *calls: Callable[..., Coroutine[Any, Any, Any]],
+    args: Optional[List[Tuple[Any, ...]]] = None,
+    kwargs: Optional[List[Dict[str, Any]]] = None,
+    limit: Optional[int] = None,
+) -> List[Any]:
     """
     Run calls concurrently and gather their results.
 
     Unlike `asyncio.gather` this expects to receive _callables_ not _coroutines_.
-    This matches `anyio` semantics.
+    This matches `anyio` semantics. The first failure cancels the other calls and is raised,
+    check gather_iter to stream the results or collect the failures instead.
 
     Args:
         *calls: Functions or coroutines to be run concurrently.
@@ -17,20 +115,12 @@ async def gather(*calls: Callable[..., Coroutine[Any, Any, Any]], args: List[Tup
             If no arguments are provided for a callable, use an empty tuple.
         kwargs: A list of dictionaries, where each dictionary contains the keyword arguments for the corresponding callable in `calls`.
             If no keyword arguments are provided for a callable, use an empty dictionary.
+        limit: The maximum number of calls in flight. Defaults to no limit.
 
     Returns:
         A list containing the results of the calls.
     """
-    if args is None:
-        args = [()] * len(calls)  # If no positional arguments provided, use empty tuples
-    if kwargs is None:
-        kwargs = [{}] * len(calls)  # If no keyword arguments provided, use empty dictionaries
-
-    if len(calls) != len(args) or len(calls) != len(kwargs):
-        raise ValueError("The lengths of 'calls', 'args', and 'kwargs' should be the same.")
-
-    keys = []
-    async with create_gather_task_group() as tg:
-        for call, arg, kwarg in zip(calls, args, kwargs):
-            keys.append(tg.start_soon(lambda c=call, a=arg, k=kwarg: c(*a, **k)))
-    return [tg.get_result(key) for key in keys]
+    results: List[Any] = [None] * len(calls)
+    async for gather_result in gather_iter(*calls, args=args, kwargs=kwargs, limit=limit):
+        results[gather_result.index] = gather_result.result
+    return results
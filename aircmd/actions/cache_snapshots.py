@@ -0,0 +1,299 @@
+"""Snapshot cache volumes into content addressed tarballs on a host path or an S3 compatible store, and restore them on ephemeral runners."""
+
+import os
+import shlex
+import tempfile
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+from dagger import CacheSharingMode, Client, Container, File
+from pydantic import BaseModel
+
+from ..models.settings import GlobalSettings
+from .asyncutils import gather
+from .cache_volumes import CACHE_VOLUMES_MOUNT_PATH, get_cache_volume_name, record_cache_volume_use
+from .constants import ALPINE_IMAGE, AWS_CLI_IMAGE
+from .images import pin_image
+
+# Written in the restored volumes, so that an up to date volume is not extracted again
+SNAPSHOT_MARKER = ".aircmd-snapshot"
+SNAPSHOT_PATH = "/snapshot/snapshot.tar.gz"
+OBJECTS_DIR = "objects"
+REFS_DIR = "refs"
+
+
+class CacheSnapshotReport(BaseModel):
+    volume: str
+    # exported, unchanged, restored, up-to-date or missing
+    action: str
+    digest: Optional[str] = None
+    size_bytes: Optional[int] = None
+    duration: float
+
+    def __str__(self) -> str:
+        size = f", {self.size_bytes / 1024**2:.1f} MiB" if self.size_bytes is not None else ""
+        return f"{self.volume}: {self.action} in {self.duration:.1f}s{size}"
+
+
+class SnapshotStore(ABC):
+    """Where the snapshots are kept: tarballs named by the digest of the volume contents, and a ref per volume to its latest digest."""
+
+    @abstractmethod
+    async def get_ref(self, volume: str) -> Optional[str]:
+        """The digest of the latest snapshot of a volume, None if it was never exported."""
+
+    @abstractmethod
+    async def set_ref(self, volume: str, digest: str) -> None:
+        """Point the ref of a volume to a snapshot."""
+
+    @abstractmethod
+    async def has(self, digest: str) -> bool:
+        """Whether the tarball of a snapshot is in the store."""
+
+    @abstractmethod
+    async def upload(self, tarball: File, digest: str) -> None:
+        """Store the tarball of a snapshot."""
+
+    @abstractmethod
+    def download(self, digest: str) -> File:
+        """The tarball of a snapshot, lazily loaded in the engine."""
+
+
+class LocalSnapshotStore(SnapshotStore):
+    def __init__(self, client: Client, root: str) -> None:
+        self.client = client
+        self.root = root
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, OBJECTS_DIR, f"{digest}.tar.gz")
+
+    def _ref_path(self, volume: str) -> str:
+        return os.path.join(self.root, REFS_DIR, volume)
+
+    async def get_ref(self, volume: str) -> Optional[str]:
+        if not os.path.isfile(self._ref_path(volume)):
+            return None
+        with open(self._ref_path(volume)) as f:
+            return f.read().strip() or None
+
+    async def set_ref(self, volume: str, digest: str) -> None:
+        ref_path = self._ref_path(volume)
+        os.makedirs(os.path.dirname(ref_path), exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(ref_path), delete=False) as f:
+            f.write(digest)
+        os.replace(f.name, ref_path)
+
+    async def has(self, digest: str) -> bool:
+        return os.path.isfile(self._object_path(digest))
+
+    async def upload(self, tarball: File, digest: str) -> None:
+        object_path = self._object_path(digest)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        staging_path = f"{object_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            await tarball.export(staging_path)
+            os.replace(staging_path, object_path)
+        finally:
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
+
+    def download(self, digest: str) -> File:
+        return self.client.host().file(self._object_path(digest))
+
+
+class S3SnapshotStore(SnapshotStore):
+    """A store in an S3 compatible bucket, e.g. a MinIO server, accessed with the AWS CLI in a container.
+
+    Args:
+        client (Client): The dagger client.
+        settings (GlobalSettings): The global settings object, with the endpoint and the credentials of the store.
+        url (str): The location of the store, s3://bucket/prefix.
+    """
+
+    def __init__(self, client: Client, settings: GlobalSettings, url: str) -> None:
+        self.client = client
+        self.settings = settings
+        self.url = url.rstrip("/")
+
+    def _with_aws_cli(self) -> Container:
+        aws_cli = self.client.container().from_(pin_image(AWS_CLI_IMAGE, self.settings)).with_entrypoint([])
+        if self.settings.CACHE_SNAPSHOT_S3_ENDPOINT_URL:
+            aws_cli = aws_cli.with_env_variable("AWS_ENDPOINT_URL", self.settings.CACHE_SNAPSHOT_S3_ENDPOINT_URL)
+        if self.settings.SECRET_CACHE_SNAPSHOT_S3_ACCESS_KEY_ID and self.settings.SECRET_CACHE_SNAPSHOT_S3_SECRET_ACCESS_KEY:
+            access_key_id = self.settings.SECRET_CACHE_SNAPSHOT_S3_ACCESS_KEY_ID.get_secret_value()
+            secret_access_key = self.settings.SECRET_CACHE_SNAPSHOT_S3_SECRET_ACCESS_KEY.get_secret_value()
+            aws_cli = (
+                aws_cli.with_secret_variable("AWS_ACCESS_KEY_ID", self.client.set_secret("cache_snapshot_s3_access_key_id", access_key_id))
+                .with_secret_variable("AWS_SECRET_ACCESS_KEY", self.client.set_secret("cache_snapshot_s3_secret_access_key", secret_access_key))
+            )
+        return aws_cli
+
+    async def _run(self, script: str) -> str:
+        # The store changes between runs, its listings must not be cached by the engine
+        return await (
+            self._with_aws_cli().with_env_variable("CACHEBUSTER", str(uuid.uuid4()))
+            .with_exec(["sh", "-c", script])
+            .stdout()
+        )
+
+    async def get_ref(self, volume: str) -> Optional[str]:
+        ref_url = shlex.quote(f"{self.url}/{REFS_DIR}/{volume}")
+        return (await self._run(f"aws s3 cp {ref_url} - 2>/dev/null || true")).strip() or None
+
+    async def set_ref(self, volume: str, digest: str) -> None:
+        await self._run(f"printf %s {shlex.quote(digest)} | aws s3 cp - {shlex.quote(f'{self.url}/{REFS_DIR}/{volume}')}")
+
+    async def has(self, digest: str) -> bool:
+        object_url = shlex.quote(f"{self.url}/{OBJECTS_DIR}/{digest}.tar.gz")
+        return (await self._run(f"aws s3 ls {object_url} > /dev/null 2>&1 && echo yes || echo no")).strip() == "yes"
+
+    async def upload(self, tarball: File, digest: str) -> None:
+        await (
+            self._with_aws_cli()
+            .with_file(SNAPSHOT_PATH, tarball)
+            .with_exec(["aws", "s3", "cp", SNAPSHOT_PATH, f"{self.url}/{OBJECTS_DIR}/{digest}.tar.gz"])
+            .sync()
+        )
+
+    def download(self, digest: str) -> File:
+        # Snapshots never change once stored, the engine can cache their download
+        return (
+            self._with_aws_cli()
+            .with_exec(["aws", "s3", "cp", f"{self.url}/{OBJECTS_DIR}/{digest}.tar.gz", SNAPSHOT_PATH])
+            .file(SNAPSHOT_PATH)
+        )
+
+
+def get_snapshot_store(client: Client, settings: GlobalSettings) -> SnapshotStore:
+    """The store of settings.CACHE_SNAPSHOT_STORE: a host path, or s3://bucket/prefix. Defaults to a directory of the aircmd cache."""
+    location = settings.CACHE_SNAPSHOT_STORE or os.path.join(settings.CACHE_DIR, "cache-snapshots")
+    if location.startswith("s3://"):
+        return S3SnapshotStore(client, settings, location)
+    return LocalSnapshotStore(client, os.path.abspath(os.path.expanduser(location)))
+
+
+def with_mounted_volume(client: Client, settings: GlobalSettings, volume: str) -> Container:
+    # Locked so that the snapshot is not taken or restored while another container writes to the volume
+    return (
+        client.container()
+        .from_(pin_image(ALPINE_IMAGE, settings))
+        .with_mounted_cache(f"{CACHE_VOLUMES_MOUNT_PATH}/{volume}", client.cache_volume(volume), sharing=CacheSharingMode.LOCKED)
+        .with_workdir(f"{CACHE_VOLUMES_MOUNT_PATH}/{volume}")
+        .with_env_variable("CACHEBUSTER", str(uuid.uuid4()))
+    )
+
+
+def get_volume_digest_command() -> List[str]:
+    """The command printing the digest of the paths, link targets and file contents of the working directory, the marker excluded."""
+    find = f"find . -path ./{SNAPSHOT_MARKER} -prune -o"
+    return [
+        "sh",
+        "-c",
+        f"{{ {find} -type f -print0 | sort -z | xargs -0 -r sha256sum; "
+        f"{find} -type l -print0 | sort -z | xargs -0 -r stat -c %N; }} "
+        "| sha256sum | cut -d ' ' -f 1",
+    ]
+
+
+async def export_cache_volume(client: Client, settings: GlobalSettings, store: SnapshotStore, volume: str) -> CacheSnapshotReport:
+    """Snapshot a cache volume to the store, unless the store already holds a snapshot with the same contents.
+
+    Args:
+        client (Client): The dagger client.
+        settings (GlobalSettings): The global settings object.
+        store (SnapshotStore): The store of the snapshots, check get_snapshot_store.
+        volume (str): The engine name of the volume, check get_cache_volume_name.
+
+    Returns:
+        CacheSnapshotReport: Whether the snapshot was exported, its digest, compressed size and duration.
+    """
+    start = time.monotonic()
+    mounted_volume = with_mounted_volume(client, settings, volume)
+    digest = (await mounted_volume.with_exec(get_volume_digest_command()).stdout()).strip()
+    if await store.has(digest):
+        await store.set_ref(volume, digest)
+        return CacheSnapshotReport(volume=volume, action="unchanged", digest=digest, duration=time.monotonic() - start)
+
+    tarball = (
+        mounted_volume.with_exec(["sh", "-c", f"mkdir -p {os.path.dirname(SNAPSHOT_PATH)} && tar -czf {SNAPSHOT_PATH} --exclude ./{SNAPSHOT_MARKER} ."])
+        .file(SNAPSHOT_PATH)
+    )
+    await store.upload(tarball, digest)
+    await store.set_ref(volume, digest)
+    return CacheSnapshotReport(volume=volume, action="exported", digest=digest, size_bytes=await tarball.size(), duration=time.monotonic() - start)
+
+
+async def import_cache_volume(client: Client, settings: GlobalSettings, store: SnapshotStore, volume: str) -> CacheSnapshotReport:
+    """Restore the latest snapshot of a cache volume over its current contents, unless it was already restored.
+
+    The snapshot is extracted over the volume: files missing from the snapshot are kept, so a partially warm volume is only completed.
+
+    Args:
+        client (Client): The dagger client.
+        settings (GlobalSettings): The global settings object.
+        store (SnapshotStore): The store of the snapshots, check get_snapshot_store.
+        volume (str): The engine name of the volume, check get_cache_volume_name.
+
+    Returns:
+        CacheSnapshotReport: Whether the snapshot was restored, its digest, compressed size and duration.
+    """
+    start = time.monotonic()
+    digest = await store.get_ref(volume)
+    if digest is None or not await store.has(digest):
+        return CacheSnapshotReport(volume=volume, action="missing", duration=time.monotonic() - start)
+
+    mounted_volume = with_mounted_volume(client, settings, volume)
+    restored_digest = (await mounted_volume.with_exec(["sh", "-c", f"cat {SNAPSHOT_MARKER} 2>/dev/null || true"]).stdout()).strip()
+    if restored_digest == digest:
+        return CacheSnapshotReport(volume=volume, action="up-to-date", digest=digest, duration=time.monotonic() - start)
+
+    tarball = store.download(digest)
+    await (
+        mounted_volume.with_mounted_file(SNAPSHOT_PATH, tarball)
+        .with_exec(["sh", "-c", f"tar -xzf {SNAPSHOT_PATH} && printf %s {shlex.quote(digest)} > {SNAPSHOT_MARKER}"])
+        .sync()
+    )
+    return CacheSnapshotReport(volume=volume, action="restored", digest=digest, size_bytes=await tarball.size(), duration=time.monotonic() - start)
+
+
+def get_snapshot_volumes(settings: GlobalSettings, names: Optional[List[str]] = None) -> List[str]:
+    """The engine names of registered cache volumes in the current namespace. Defaults to settings.CACHE_SNAPSHOT_VOLUMES."""
+    names = names or settings.CACHE_SNAPSHOT_VOLUMES
+    # All the names are resolved before any use is recorded, an invalid one fails the whole selection
+    volumes = [get_cache_volume_name(name, settings) for name in names]
+    for name, volume in zip(names, volumes):
+        record_cache_volume_use(settings, volume, name)
+    return volumes
+
+
+async def export_cache_volumes(client: Client, settings: GlobalSettings, volumes: List[str]) -> List[CacheSnapshotReport]:
+    store = get_snapshot_store(client, settings)
+    return await gather(
+        *[export_cache_volume] * len(volumes),
+        args=[(client, settings, store, volume) for volume in volumes],
+        limit=settings.CACHE_SNAPSHOT_PARALLELISM,
+    )
+
+
+async def import_cache_volumes(client: Client, settings: GlobalSettings, volumes: List[str]) -> List[CacheSnapshotReport]:
+    store = get_snapshot_store(client, settings)
+    return await gather(
+        *[import_cache_volume] * len(volumes),
+        args=[(client, settings, store, volume) for volume in volumes],
+        limit=settings.CACHE_SNAPSHOT_PARALLELISM,
+    )
+
+
+async def restore_cache_snapshots(client: Client, settings: GlobalSettings) -> List[CacheSnapshotReport]:
+    """Restore the cache volumes of settings.CACHE_SNAPSHOT_VOLUMES at the start of a flow, if settings.CACHE_SNAPSHOT_RESTORE is set."""
+    if not settings.CACHE_SNAPSHOT_RESTORE:
+        return []
+    start = time.monotonic()
+    reports = await import_cache_volumes(client, settings, get_snapshot_volumes(settings))
+    for report in reports:
+        print(report)
+    restored_bytes = sum(report.size_bytes or 0 for report in reports if report.action == "restored")
+    print(f"Restored {len(reports)} cache volumes in {time.monotonic() - start:.1f}s, {restored_bytes / 1024**2:.1f} MiB downloaded")
+    return reports
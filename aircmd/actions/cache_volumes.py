@@ -0,0 +1,264 @@
+"""Name the cache volumes of the environments by scope, keep an inventory of them on the host, and measure and prune them."""
+
+import fcntl
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from enum import Enum
+from typing import Dict, Iterator, List, Optional, Set
+
+from dagger import CacheSharingMode, CacheVolume, Client
+from pydantic import BaseModel
+
+from ..models.settings import GlobalSettings
+from .constants import ALPINE_IMAGE
+from .images import pin_image
+from .strings import slugify
+
+CACHE_VOLUMES_MOUNT_PATH = "/caches"
+
+
+class CacheVolumeScope(str, Enum):
+    # One volume for everything, for content addressed caches such as pip wheels
+    SHARED = "shared"
+    # One volume per plugin, for caches of the plugin sources such as mypy
+    PLUGIN = "plugin"
+    # One volume per branch family, for build outputs which differ from one branch to the other
+    BRANCH = "branch"
+
+
+class CacheVolumeSpec(BaseModel):
+    name: str
+    scope: CacheVolumeScope = CacheVolumeScope.SHARED
+
+
+class CacheVolumeRecord(BaseModel):
+    """A cache volume used on this host, with its size when it was last measured."""
+
+    volume: str
+    name: str
+    scope: CacheVolumeScope
+    namespace: Optional[str] = None
+    first_used_at: float
+    last_used_at: float
+    size_bytes: Optional[int] = None
+    measured_at: Optional[float] = None
+
+
+class CacheVolumeInventory(BaseModel):
+    volumes: Dict[str, CacheVolumeRecord] = {}
+
+    @classmethod
+    def load(cls, path: str) -> "CacheVolumeInventory":
+        return cls.parse_file(path) if os.path.isfile(path) else cls()
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(path), delete=False) as f:
+            f.write(self.json(indent=2, sort_keys=True))
+        os.replace(f.name, path)
+
+    @classmethod
+    @contextmanager
+    def update(cls, path: str) -> Iterator["CacheVolumeInventory"]:
+        """Load the inventory and save it back once the block updated it, concurrent runs on the host wait for their turn.
+
+        The lock is held on a sidecar file, the inventory file itself is replaced on save.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                inventory = cls.load(path)
+                yield inventory
+                inventory.save(path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(record.size_bytes or 0 for record in self.volumes.values())
+
+
+CACHE_VOLUMES: Dict[str, CacheVolumeSpec] = {
+    spec.name: spec
+    for spec in [
+        CacheVolumeSpec(name="pip_cache"),
+        CacheVolumeSpec(name="uv_cache"),
+        CacheVolumeSpec(name="wheelhouse"),
+        CacheVolumeSpec(name="poetry_cache"),
+        CacheVolumeSpec(name="pnpm-cache"),
+        CacheVolumeSpec(name="apk-cache"),
+        CacheVolumeSpec(name="apt-cache"),
+        CacheVolumeSpec(name="apt-lists"),
+        CacheVolumeSpec(name="registry-mirror-cache"),
+        CacheVolumeSpec(name="github-actions"),
+        CacheVolumeSpec(name="gradle-cache", scope=CacheVolumeScope.BRANCH),
+        CacheVolumeSpec(name="docker-lib", scope=CacheVolumeScope.BRANCH),
+        CacheVolumeSpec(name="docker_cache", scope=CacheVolumeScope.BRANCH),
+        CacheVolumeSpec(name="shared-tmp", scope=CacheVolumeScope.BRANCH),
+        CacheVolumeSpec(name="mypy_cache", scope=CacheVolumeScope.PLUGIN),
+    ]
+}
+
+# Volumes recorded in the inventory during the session, it is written once per volume
+_recorded_volumes: Set[str] = set()
+
+
+def register_cache_volume(spec: CacheVolumeSpec) -> None:
+    """Declare a cache volume, e.g. one specific to a plugin, so that it can be created with get_cache_volume."""
+    CACHE_VOLUMES[spec.name] = spec
+
+
+def get_branch_family(branch: str, main_branches: List[str]) -> str:
+    """The family of a branch: main for the main branches, the prefix of prefixed branches such as release/1.2, dev otherwise."""
+    if branch in main_branches:
+        return "main"
+    if "/" in branch:
+        return slugify(branch.split("/")[0]) or "dev"
+    return "dev"
+
+
+def get_cache_volume_namespace(spec: CacheVolumeSpec, settings: GlobalSettings, plugin: Optional[str] = None) -> Optional[str]:
+    if spec.scope == CacheVolumeScope.PLUGIN:
+        if plugin is None:
+            raise ValueError(f"The {spec.name} cache volume is namespaced per plugin, pass the name of the plugin using it")
+        return f"plugin-{slugify(plugin)}"
+    if spec.scope == CacheVolumeScope.BRANCH:
+        return f"branch-{get_branch_family(settings.GIT_CURRENT_BRANCH, settings.CACHE_VOLUME_MAIN_BRANCHES)}"
+    return None
+
+
+def get_cache_volume_name(name: str, settings: GlobalSettings, plugin: Optional[str] = None, instance: Optional[str] = None) -> str:
+    """The engine name of a registered cache volume in the current namespace.
+
+    Shared volumes keep their registered name, so that the caches filled before namespacing stay hot.
+
+    Args:
+        name (str): The registered name of the volume, check CACHE_VOLUMES.
+        settings (GlobalSettings): The global settings object, providing the current branch.
+        plugin (Optional[str], optional): The plugin using the volume, required by plugin scoped volumes. Defaults to None.
+        instance (Optional[str], optional): Distinguishes several volumes of the same namespace, e.g. one per pooled daemon. Defaults to None.
+
+    Raises:
+        ValueError: Raised if the volume is not registered, or if a plugin scoped volume is used without a plugin.
+
+    Returns:
+        str: The name of the volume in the engine.
+    """
+    if name not in CACHE_VOLUMES:
+        raise ValueError(f"Unknown cache volume {name}, declare it with register_cache_volume")
+    namespace = get_cache_volume_namespace(CACHE_VOLUMES[name], settings, plugin)
+    return "-".join(part for part in [name, namespace, slugify(instance) if instance else None] if part)
+
+
+def get_inventory_path(settings: GlobalSettings) -> str:
+    return os.path.join(settings.CACHE_DIR, "cache-volumes.json")
+
+
+def record_cache_volume_use(settings: GlobalSettings, volume: str, name: str, plugin: Optional[str] = None) -> None:
+    if volume in _recorded_volumes:
+        return
+    spec = CACHE_VOLUMES[name]
+    with CacheVolumeInventory.update(get_inventory_path(settings)) as inventory:
+        now = time.time()
+        previous = inventory.volumes.get(volume)
+        inventory.volumes[volume] = CacheVolumeRecord(
+            volume=volume,
+            name=name,
+            scope=spec.scope,
+            namespace=get_cache_volume_namespace(spec, settings, plugin),
+            first_used_at=previous.first_used_at if previous is not None else now,
+            last_used_at=now,
+            size_bytes=previous.size_bytes if previous is not None else None,
+            measured_at=previous.measured_at if previous is not None else None,
+        )
+    _recorded_volumes.add(volume)
+
+
+def get_cache_volume(
+    client: Client, name: str, settings: Optional[GlobalSettings] = None, plugin: Optional[str] = None, instance: Optional[str] = None
+) -> CacheVolume:
+    """Get a registered cache volume in the current namespace, recording its use in the host inventory (check aircmd cache stats).
+
+    Args:
+        client (Client): The dagger client.
+        name (str): The registered name of the volume, check CACHE_VOLUMES.
+        settings (Optional[GlobalSettings], optional): The global settings object. Defaults to the global settings.
+        plugin (Optional[str], optional): The plugin using the volume, required by plugin scoped volumes. Defaults to None.
+        instance (Optional[str], optional): Distinguishes several volumes of the same namespace. Defaults to None.
+
+    Returns:
+        CacheVolume: The cache volume, to mount with with_mounted_cache.
+    """
+    settings = settings or GlobalSettings()
+    volume = get_cache_volume_name(name, settings, plugin, instance)
+    record_cache_volume_use(settings, volume, name, plugin)
+    return client.cache_volume(volume)
+
+
+async def measure_cache_volumes(client: Client, settings: GlobalSettings, volumes: List[str]) -> Dict[str, int]:
+    """Measure the disk usage of cache volumes, in a single container mounting all of them.
+
+    Returns:
+        Dict[str, int]: The size of each volume, in bytes.
+    """
+    if not volumes:
+        return {}
+    container = client.container().from_(pin_image(ALPINE_IMAGE, settings))
+    for volume in volumes:
+        container = container.with_mounted_cache(f"{CACHE_VOLUMES_MOUNT_PATH}/{volume}", client.cache_volume(volume), sharing=CacheSharingMode.SHARED)
+    du_output = await (
+        container.with_env_variable("CACHEBUSTER", str(time.time()))
+        .with_exec(["du", "-sk"] + [f"{CACHE_VOLUMES_MOUNT_PATH}/{volume}" for volume in volumes])
+        .stdout()
+    )
+    sizes = {}
+    for line in du_output.splitlines():
+        size_kb, path = line.split(maxsplit=1)
+        sizes[os.path.basename(path)] = int(size_kb) * 1024
+    return sizes
+
+
+async def empty_cache_volumes(client: Client, settings: GlobalSettings, volumes: List[str]) -> None:
+    """Delete the contents of cache volumes, waiting for the containers using them to release them.
+
+    The engine API cannot delete a volume, its emptied snapshot is left to the engine garbage collection.
+    """
+    if not volumes:
+        return
+    container = client.container().from_(pin_image(ALPINE_IMAGE, settings))
+    for volume in volumes:
+        container = container.with_mounted_cache(f"{CACHE_VOLUMES_MOUNT_PATH}/{volume}", client.cache_volume(volume), sharing=CacheSharingMode.LOCKED)
+    await (
+        container.with_env_variable("CACHEBUSTER", str(time.time()))
+        .with_exec(["find"] + [f"{CACHE_VOLUMES_MOUNT_PATH}/{volume}" for volume in volumes] + ["-mindepth", "1", "-delete"])
+        .sync()
+    )
+
+
+def plan_cache_volume_prune(inventory: CacheVolumeInventory, max_age: int, max_bytes: int, now: Optional[float] = None) -> List[str]:
+    """Pick the volumes to empty: the ones unused for max_age seconds, then the least recently used until the others fit in max_bytes.
+
+    Args:
+        inventory (CacheVolumeInventory): The volumes used on this host, with their measured sizes.
+        max_age (int): How long an unused volume is kept, in seconds.
+        max_bytes (int): The total size of the volumes to keep, volumes never measured count as empty.
+        now (Optional[float], optional): The current timestamp. Defaults to time.time().
+
+    Returns:
+        List[str]: The names of the volumes to empty, least recently used first.
+    """
+    now = now if now is not None else time.time()
+    records = sorted(inventory.volumes.values(), key=lambda record: (record.last_used_at, record.volume))
+    to_prune = [record for record in records if now - record.last_used_at > max_age]
+    total_bytes = sum(record.size_bytes or 0 for record in records if record not in to_prune)
+    for record in records:
+        if total_bytes <= max_bytes:
+            break
+        if record in to_prune:
+            continue
+        to_prune.append(record)
+        total_bytes -= record.size_bytes or 0
+    return [record.volume for record in to_prune]
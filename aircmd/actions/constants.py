@@ -1,2 +1,15 @@
 PYTHON_IMAGE = "python:3.11-slim"
+OPENJDK_IMAGE = "openjdk:17.0.1-jdk-slim"
+ALPINE_IMAGE = "alpine:3.18"
+AWS_CLI_IMAGE = "amazon/aws-cli:2.15.0"
 CRANE_DEBUG_IMAGE = "gcr.io/go-containerregistry/crane/debug:v0.15.1"
+GHA_NODE_VERSION = "20.11.1"
+PNPM_VERSION = "8.15.4"
+REGISTRY_MIRROR_HOSTNAME = "registry-mirror"
+REGISTRY_MIRROR_PORT = 5000
+REGISTRY_MIRROR_DEBUG_PORT = 5001
+PYTHON_DEPENDENCY_MANIFESTS = ["requirements.txt", "setup.py", "setup.cfg", "pyproject.toml", "poetry.lock", "README.md"]
+# The requirements resolved from the dependency manifests, written next to requirements.txt
+DEPENDENCY_REQUIREMENTS_FILE = ".aircmd-dependency-requirements.txt"
+POETRY_DEPENDENCY_MANIFESTS = ["pyproject.toml", "poetry.lock"]
+PNPM_DEPENDENCY_MANIFESTS = ["pnpm-lock.yaml", "pnpm-workspace.yaml", ".npmrc"]
@@ -0,0 +1,278 @@
+"""Resolve the local path dependencies of python packages, transitively, so that each one gets mounted and installed once."""
+
+import hashlib
+import json
+import os
+import re
+import tomllib
+from typing import Dict, List, Optional, Tuple, Union
+
+from pydantic import BaseModel
+
+REQUIREMENTS_FILE = "requirements.txt"
+PYPROJECT_FILE = "pyproject.toml"
+
+
+class LocalDependencyGraph(BaseModel):
+    """The local path dependencies of a package, keyed by package path relative to the current working directory."""
+
+    root: str
+    nodes: Dict[str, List[str]] = {}
+    manifests: Dict[str, int] = {}
+
+    @property
+    def local_dependencies(self) -> List[str]:
+        """The local dependencies of the root package, in installation order."""
+        return [path for path in self.install_order() if path != self.root]
+
+    def install_order(self) -> List[str]:
+        """The packages of the graph sorted so that each package comes after its local dependencies.
+
+        Raises:
+            ValueError: Raised if the local dependencies are cyclic.
+        """
+        order: List[str] = []
+        visiting: List[str] = []
+
+        def visit(path: str) -> None:
+            if path in order:
+                return
+            if path in visiting:
+                raise ValueError(f"Cyclic local dependencies: {' -> '.join(visiting[visiting.index(path):] + [path])}")
+            visiting.append(path)
+            for dependency in self.nodes.get(path, []):
+                visit(dependency)
+            visiting.pop()
+            order.append(path)
+
+        visit(self.root)
+        return order
+
+    def is_fresh(self) -> bool:
+        """Whether none of the manifests the graph was resolved from changed since."""
+        return all(_get_mtime(path) == mtime for path, mtime in self.manifests.items())
+
+
+# Graphs resolved during the session, keyed by cache directory, revision and package path
+_resolved_graphs: Dict[Tuple[Optional[str], Optional[str], str], LocalDependencyGraph] = {}
+
+
+def _get_mtime(path: str) -> int:
+    return os.stat(path).st_mtime_ns if os.path.exists(path) else -1
+
+
+def parse_local_requirement(line: str) -> Optional[str]:
+    """The path of a requirements.txt line if it is a local path requirement, e.g. `-e ../bases/base-normalization`."""
+    requirement = line.split("#", 1)[0].strip()
+    if requirement.startswith("-e ") or requirement.startswith("--editable "):
+        requirement = requirement.split(" ", 1)[1].strip()
+    if requirement.startswith("file:"):
+        requirement = requirement[len("file:"):]
+    if not requirement.startswith((".", "/")):
+        return None
+    # Drop extras, e.g. `-e .[tests]`
+    return requirement.split("[", 1)[0]
+
+
+def parse_requirement_include(line: str) -> Optional[str]:
+    """The path of the file a requirements.txt line includes, e.g. `-r requirements-dev.txt` or `-c constraints.txt`."""
+    requirement = line.split("#", 1)[0].strip()
+    for option in ("-r", "-c", "--requirement", "--constraint"):
+        if requirement.startswith(option + " ") or requirement.startswith(option + "="):
+            return requirement[len(option) + 1:].strip() or None
+    return None
+
+
+# Print the install_requires and extras_require of a setup.py or setup.cfg package as JSON, without building it: setup() is replaced
+# by a function recording its arguments, so that the package sources are not needed. Prints nothing if that fails, e.g. when
+# setup.py imports the package sources, which are not mounted in the dependency layer, or calls distutils instead.
+SETUP_METADATA_SCRIPT = """
+import json, os, sys
+import setuptools
+metadata = {}
+try:
+    if os.path.isfile("setup.cfg"):
+        try:
+            from setuptools.config.setupcfg import read_configuration
+        except ImportError:
+            from setuptools.config import read_configuration
+        options = read_configuration("setup.cfg").get("options", {})
+        metadata.update({key: options[key] for key in ("install_requires", "extras_require") if key in options})
+    if os.path.isfile("setup.py"):
+        calls = []
+        setuptools.setup = lambda **kwargs: calls.append(kwargs)
+        sys.argv = ["setup.py", "egg_info"]
+        exec(compile(open("setup.py").read(), "setup.py", "exec"), {"__name__": "__main__", "__file__": "setup.py"})
+        metadata.update({key: calls[0][key] for key in ("install_requires", "extras_require") if key in calls[0]})
+except BaseException:
+    sys.exit(0)
+print(json.dumps(metadata, default=list))
+"""
+
+
+class ManifestRequirements(BaseModel):
+    """The third-party requirements of a package, read from its dependency manifests."""
+
+    requirements: List[str] = []
+    # Whether the manifests declare all the requirements, so that the package can be installed without its dependencies
+    complete: bool = False
+
+
+def _get_requirement_name(requirement: str) -> str:
+    name = re.match(r"[A-Za-z0-9._-]*", requirement.strip())
+    return re.sub(r"[-_.]+", "-", name.group(0) if name else "").lower()
+
+
+def _is_local(requirement: str) -> bool:
+    return parse_local_requirement(requirement) is not None or " @ file:" in requirement
+
+
+def get_pyproject_requirements(pyproject_toml: str, extras: Optional[List[str]] = None) -> Optional[List[str]]:
+    """The PEP 621 dependencies of a pyproject.toml, and those of the requested extras.
+
+    Extras referring to the project itself, e.g. `all = ["package[tests,docs]"]`, can only be installed with the package and are dropped.
+
+    Returns:
+        Optional[List[str]]: The requirements, None if the pyproject.toml does not declare them statically,
+            e.g. poetry dependency tables which do not use the requirement syntax.
+    """
+    project = tomllib.loads(pyproject_toml).get("project")
+    if project is None or "dependencies" in project.get("dynamic", []):
+        return None
+    requirements = list(project.get("dependencies", []))
+    for extra in extras or []:
+        requirements += project.get("optional-dependencies", {}).get(extra, [])
+    project_name = _get_requirement_name(project.get("name", ""))
+    return [requirement for requirement in requirements if _get_requirement_name(requirement) != project_name]
+
+
+def parse_setup_metadata(output: str, extras: Optional[List[str]] = None) -> Optional[List[str]]:
+    """The requirements of a setup.py package, and those of the requested extras, from the output of SETUP_METADATA_SCRIPT.
+
+    Returns:
+        Optional[List[str]]: The requirements, None if the metadata could not be read.
+    """
+    try:
+        metadata = json.loads(output.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        return None
+
+    def as_list(requirements: Union[str, List[str]]) -> List[str]:
+        lines = requirements.splitlines() if isinstance(requirements, str) else requirements
+        return [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
+
+    requirements = as_list(metadata.get("install_requires", []))
+    # Extras may carry a marker, e.g. `tests:python_version < "3.12"`
+    for extra_key, extra_requirements in metadata.get("extras_require", {}).items():
+        extra, _, marker = extra_key.partition(":")
+        if extra in (extras or []):
+            requirements += [f"{requirement}; {marker}" if marker else requirement for requirement in as_list(extra_requirements)]
+    return requirements
+
+
+def get_manifest_requirements(
+    requirements_txt: Optional[str], pyproject_toml: Optional[str], setup_metadata: Optional[str], extras: Optional[List[str]] = None
+) -> ManifestRequirements:
+    """Collect the third-party requirements of a package from its requirements.txt, pyproject.toml and setup.py metadata.
+
+    Args:
+        requirements_txt (Optional[str]): The content of the requirements.txt, if any.
+        pyproject_toml (Optional[str]): The content of the pyproject.toml, if any.
+        setup_metadata (Optional[str]): The output of SETUP_METADATA_SCRIPT, if the package has a setup.py or a setup.cfg.
+        extras (Optional[List[str]], optional): The extras of the package to install. Defaults to None.
+
+    Returns:
+        ManifestRequirements: The requirements to install before the package sources are mounted, local ones are left out.
+    """
+    requirements = [line for line in (requirements_txt or "").split("\n") if parse_local_requirement(line) is None]
+    # The requirements the package metadata declares, when they could be read without the package sources
+    declared = [
+        declared_requirements
+        for declared_requirements in [
+            get_pyproject_requirements(pyproject_toml, extras) if pyproject_toml else None,
+            parse_setup_metadata(setup_metadata, extras) if setup_metadata is not None else None,
+        ]
+        if declared_requirements is not None
+    ]
+    declared_local = [requirement for declared_requirements in declared for requirement in declared_requirements if _is_local(requirement)]
+    requirements += [requirement for declared_requirements in declared for requirement in declared_requirements if not _is_local(requirement)]
+    # A package depending on a local path still needs pip to resolve it
+    complete = bool(declared) and not declared_local
+    return ManifestRequirements(requirements=[requirement for requirement in requirements if requirement.strip()], complete=complete)
+
+
+def get_local_dependency_paths(package_path: str) -> List[str]:
+    """The direct local path dependencies declared in a package requirements.txt and pyproject.toml, relative to the current working directory."""
+    dependency_paths: List[str] = []
+    requirements_path = os.path.join(package_path, REQUIREMENTS_FILE)
+    if os.path.isfile(requirements_path):
+        with open(requirements_path) as f:
+            for line in f:
+                if (local_requirement := parse_local_requirement(line)) is not None:
+                    dependency_paths.append(local_requirement)
+    pyproject_path = os.path.join(package_path, PYPROJECT_FILE)
+    if os.path.isfile(pyproject_path):
+        with open(pyproject_path, "rb") as f:
+            pyproject = tomllib.load(f)
+        for dependency in pyproject.get("tool", {}).get("poetry", {}).get("dependencies", {}).values():
+            if isinstance(dependency, dict) and "path" in dependency:
+                dependency_paths.append(dependency["path"])
+
+    normalized_paths = [os.path.normpath(os.path.join(package_path, path)) for path in dependency_paths]
+    return [path for path in dict.fromkeys(normalized_paths) if path != os.path.normpath(package_path)]
+
+
+class LocalDependencyResolver:
+    """Resolve local dependency graphs, cached for the session and on disk per commit."""
+
+    def __init__(self, cache_dir: Optional[str] = None, revision: Optional[str] = None) -> None:
+        self.cache_dir = cache_dir
+        self.revision = revision
+
+    def _get_cache_path(self, package_path: str) -> Optional[str]:
+        if self.cache_dir is None or self.revision is None:
+            return None
+        key = hashlib.sha256(f"{os.getcwd()}\0{package_path}".encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, "local-dependency-graphs", self.revision, f"{key}.json")
+
+    def resolve(self, package_path: str) -> LocalDependencyGraph:
+        """Walk the local path dependencies of a package transitively.
+
+        A graph cached for the current commit is reused as long as none of its manifests changed.
+
+        Args:
+            package_path (str): The path of the package, relative to the current working directory.
+
+        Returns:
+            LocalDependencyGraph: The deduplicated local dependency graph of the package.
+        """
+        package_path = os.path.normpath(package_path)
+        cache_path = self._get_cache_path(package_path)
+        session_key = (self.cache_dir, self.revision, package_path)
+        graph = _resolved_graphs.get(session_key)
+        if graph is None and cache_path is not None and os.path.isfile(cache_path):
+            graph = LocalDependencyGraph.parse_file(cache_path)
+        if graph is not None and graph.is_fresh():
+            _resolved_graphs[session_key] = graph
+            return graph
+
+        graph = LocalDependencyGraph(root=package_path)
+        to_visit = [package_path]
+        while to_visit:
+            path = to_visit.pop()
+            if path in graph.nodes:
+                continue
+            graph.nodes[path] = get_local_dependency_paths(path)
+            for manifest in (REQUIREMENTS_FILE, PYPROJECT_FILE):
+                manifest_path = os.path.join(path, manifest)
+                graph.manifests[manifest_path] = _get_mtime(manifest_path)
+            to_visit.extend(graph.nodes[path])
+        # Fail early on cycles, before the graph gets cached
+        graph.install_order()
+
+        _resolved_graphs[session_key] = graph
+        if cache_path is not None:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(cache_path, "w") as f:
+                f.write(graph.json())
+        return graph
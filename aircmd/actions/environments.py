@@ -7,53 +7,130 @@
 
 from __future__ import annotations
 
+import json
 import os
+import time
 import uuid
-from typing import Callable, List, Optional, Tuple
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
 
-import dagger
 from dagger import CacheSharingMode, CacheVolume, Client, Container, Directory, File
 
 from ..models.base import PipelineContext
+from ..models.docker import DockerdPool, ImageLoadReport, RegistryMirrorStats
 from ..models.settings import GithubActionsInputSettings, GlobalSettings, load_settings
-from .constants import CRANE_DEBUG_IMAGE, PYTHON_IMAGE
+from .constants import (
+    CRANE_DEBUG_IMAGE,
+    GHA_NODE_VERSION,
+    PNPM_DEPENDENCY_MANIFESTS,
+    PNPM_VERSION,
+    POETRY_DEPENDENCY_MANIFESTS,
+    DEPENDENCY_REQUIREMENTS_FILE,
+    PYTHON_DEPENDENCY_MANIFESTS,
+    OPENJDK_IMAGE,
+    PYTHON_IMAGE,
+    REGISTRY_MIRROR_DEBUG_PORT,
+    REGISTRY_MIRROR_HOSTNAME,
+    REGISTRY_MIRROR_PORT,
+)
+from .cache_volumes import get_cache_volume
+from .dependencies import (
+    SETUP_METADATA_SCRIPT,
+    LocalDependencyResolver,
+    ManifestRequirements,
+    get_manifest_requirements,
+    parse_requirement_include,
+)
+from .githubactions import GITHUB_ACTION_ARCHIVE_SCRIPT
+from .images import pin_image
+from .installers import PythonInstaller, get_python_installer
 from .pipelines import (
-    get_file_contents,
+    get_files_contents,
     get_repo_dir,
     sync_from_gradle_cache_to_homedir,
 )
-from .strings import slugify
+from .scheduler import (
+    DOCKERD_RESOURCES,
+    GRADLE_RESOURCES,
+    PYTHON_INSTALL_RESOURCES,
+    ResourceScheduler,
+)
 
 
-def with_typescript_gha(client: Client, directory: Directory, github_repo: str, release_version: str, inputs:                
- GithubActionsInputSettings) -> Container:  
+def with_typescript_gha(
+    client: Client,
+    directory: Directory,
+    github_repo: str,
+    release_version: str,
+    inputs: GithubActionsInputSettings,
+    node_version: str = GHA_NODE_VERSION,
+    settings: Optional[GlobalSettings] = None,
+) -> Container:
+    """Run a typescript GitHub action release against a directory.
+
+    The action archive is downloaded once per (repository, tag) to the github-actions cache volume
+    and extracted in a layer that only depends on its content, so repeated runs do no network download.
+    The download runs in the engine along with the other execs, the builder stays lazy.
 
-    action_url = f"https://github.com/{github_repo}/archive/refs/tags/{release_version}.tar.gz"
-    filename = f"{github_repo.split('/')[-1]}-{release_version}.tar.gz"
+    Args:
+        client (Client): The dagger client.
+        directory (Directory): The directory to run the action against, mounted at /input.
+        github_repo (str): The repository of the action, in the owner/name form.
+        release_version (str): The tag of the action release.
+        inputs (GithubActionsInputSettings): The action inputs and GitHub context.
+        node_version (str, optional): The node version to run the action with. Defaults to GHA_NODE_VERSION.
+        settings (Optional[GlobalSettings], optional): The global settings object, providing the GitHub token. Defaults to the global settings.
+
+    Returns:
+        Container: The container which ran the action.
+    """
+    settings = settings or GlobalSettings()
+    action_fetcher = (
+        client.container()
+        .from_(pin_image(PYTHON_IMAGE, settings))
+        .with_mounted_cache("/github-actions", get_cache_volume(client, "github-actions", settings), sharing=CacheSharingMode.SHARED)
+        .with_new_file("/fetch_action.py", contents=GITHUB_ACTION_ARCHIVE_SCRIPT)
+    )
+    if settings.GITHUB_TOKEN:
+        action_fetcher = action_fetcher.with_secret_variable("GITHUB_TOKEN", client.set_secret("github_token", settings.GITHUB_TOKEN.get_secret_value()))
+    action_archive = action_fetcher.with_exec(
+        [
+            "python",
+            "/fetch_action.py",
+            f"https://github.com/{github_repo}/archive/refs/tags/{release_version}.tar.gz",
+            f"/github-actions/{github_repo}/{release_version}.tar.gz",
+            "/action.tar.gz",
+        ]
+    ).file("/action.tar.gz")
+    event_dir = os.path.dirname(inputs.GITHUB_EVENT_PATH)
     result: Container = (
-        with_node(client, "latest")
+        with_node(client, node_version, settings)
+        .with_mounted_file("/tmp/action.tar.gz", action_archive)
+        .with_workdir("/action")
+        .with_exec(["tar", "--strip-components=1", "-xzf", "/tmp/action.tar.gz"])
         .with_directory("/input", directory)
-        .with_directory(os.path.dirname(inputs.GITHUB_EVENT_PATH), client.host().directory( os.path.dirname(inputs.GITHUB_EVENT_PATH)))
+        .with_directory(event_dir, client.host().directory(event_dir))
         .with_(load_settings(client, inputs))
-        .with_exec(["printenv"])
-        .with_exec(["curl", "-L", "-o", filename, action_url])
-        .with_exec(["tar", "--strip-components=1", "-xzf", filename])
-        .with_exec(["chown", "-R", "node:node", "/input"])
-        .with_exec(["chown", "-R", "node:node", inputs.GITHUB_EVENT_PATH])
-        .with_exec(["chmod", "755", "/input"])
-        .with_exec(["chmod", "755", inputs.GITHUB_EVENT_PATH])
-        .with_exec(["node", "dist/index.js"]) 
-    )  
-    return result                                                                    
-         
-
-
-def with_python_base(client: Client, python_image_name: str = PYTHON_IMAGE) -> Container:
-    """Build a Python container with a cache volume for pip cache.
+        .with_exec(
+            [
+                "sh",
+                "-c",
+                f"chown -R node:node /input {inputs.GITHUB_EVENT_PATH} && chmod 755 /input {inputs.GITHUB_EVENT_PATH} && node dist/index.js",
+            ]
+        )
+    )
+    return result
+
+
+def with_python_base(client: Client, python_image_name: str = PYTHON_IMAGE, settings: Optional[GlobalSettings] = None) -> Container:
+    """Build a Python container with the installer backend selected in the settings and its wheel cache volume.
+
+    The pip cache volume can be seeded from the host pip cache, check seed_cache_volumes_from_host.
     
     Args:
         context (Pipeline): The current test pipeline, providing a dagger client and a repository directory.
         python_image_name (str, optional): The python image to use to build the python base environment. Defaults to "python:3.11-slim".
+        settings (Optional[GlobalSettings], optional): The global settings object, selecting the installer backend. Defaults to the global settings.
 
     Raises:
         ValueError: Raised if the python_image_name is not a python image.
@@ -64,13 +141,12 @@ def with_python_base(client: Client, python_image_name: str = PYTHON_IMAGE) -> C
     
     if not python_image_name.startswith("python:3"):
         raise ValueError("You have to use a python image to build the python base environment")
-    pip_cache: CacheVolume = client.cache_volume("pip_cache")
+    installer = get_python_installer(settings or GlobalSettings())
 
     base_container = (
         client.container()
-        .from_(python_image_name)
-        .with_mounted_cache("/root/.cache/pip", pip_cache)
-        .with_exec(["pip", "install", "--upgrade", "pip"])
+        .from_(pin_image(python_image_name, settings))
+        .with_(installer.bootstrap(client))
     )
 
     return base_container
@@ -85,9 +161,9 @@ def with_testing_dependencies(client: Client, settings: GlobalSettings, pyproj_p
     Returns:
         Container: The testing environment container.
     """
-    python_environment: Container = with_python_base(client)
+    python_environment: Container = with_python_base(client, settings=settings)
     pyproject_toml_file = get_repo_dir(client, settings,".", include=[pyproj_path]).file(pyproj_path)
-    return python_environment.with_exec(["pip", "install"] + test_reqs).with_file(
+    return python_environment.with_exec(get_python_installer(settings).install_command(test_reqs)).with_file(
         f"/{test_reqs}", pyproject_toml_file
     )
 
@@ -122,6 +198,11 @@ def with_python_package(
     return container
 
 
+def get_package_install_command(installer: PythonInstaller, package_target: str, manifest_requirements: ManifestRequirements) -> List[str]:
+    """The command installing a package from its sources, without its dependencies if the dependency layer installed all of them."""
+    return installer.install_command([package_target], no_deps=manifest_requirements.complete)
+
+
 async def with_installed_python_package(
     client: Client,
     settings: GlobalSettings,
@@ -132,6 +213,10 @@ async def with_installed_python_package(
 ) -> Container:
     """Install a python package in a python environment container.
 
+    The requirements resolved from the dependency manifests, setup.py metadata included, are installed in a layer of their own,
+    so that source changes do not invalidate it. The package itself is installed once its full sources are mounted,
+    without its dependencies when the manifests declare all of them (check get_manifest_requirements).
+
     Args:
         context (Pipeline): The current test pipeline, providing the repository directory from which the python sources will be pulled.
         python_environment (Container): An existing python environment in which the package will be installed.
@@ -142,70 +227,243 @@ async def with_installed_python_package(
     Returns:
         Container: A python environment container with the python package installed.
     """
-    install_local_requirements_cmd = ["python", "-m", "pip", "install", "-r", "requirements.txt"]
-    install_connector_package_cmd = ["python", "-m", "pip", "install", "."]
-
-    container = with_python_package(client, settings, python_environment, package_source_code_path, exclude=exclude)
-    if requirements_txt := await get_file_contents(container, "requirements.txt"):
-        for line in requirements_txt.split("\n"):
-            if line.startswith("-e ."):
-                local_dependency_path = package_source_code_path + "/" + line[3:]
-                container = container.with_mounted_directory(
-                    "/" + local_dependency_path, get_repo_dir(client, settings, local_dependency_path, exclude=settings.DEFAULT_PYTHON_EXCLUDE)
-                )
-        container = container.with_exec(install_local_requirements_cmd)
+    installer = get_python_installer(settings)
+    package_target = f".[{','.join(additional_dependency_groups)}]" if additional_dependency_groups else "."
+    package_source_code_mount_path = "/" + package_source_code_path
 
-    container = container.with_exec(install_connector_package_cmd)
+    manifests_directory = get_repo_dir(client, settings, package_source_code_path, include=PYTHON_DEPENDENCY_MANIFESTS)
+    manifests_container = python_environment.with_mounted_directory(package_source_code_mount_path, manifests_directory).with_workdir(
+        package_source_code_mount_path
+    )
+    manifests = await get_files_contents(client, manifests_container, ["requirements.txt", "pyproject.toml", "setup.py", "setup.cfg"])
+
+    # The files the requirements include with -r and -c, and theirs, are mounted too so that their relative paths still resolve
+    requirements_path = os.path.normpath(os.path.join(package_source_code_path, "requirements.txt"))
+    included_files: Dict[str, File] = {}
+    to_read = {requirements_path: manifests["requirements.txt"]}
+    while to_read:
+        path, contents = to_read.popitem()
+        includes = [
+            os.path.normpath(os.path.join(os.path.dirname(path), include))
+            for line in (contents or "").split("\n")
+            if (include := parse_requirement_include(line)) is not None
+        ]
+        includes = [include for include in dict.fromkeys(includes) if include not in included_files and include != requirements_path]
+        for include in includes:
+            include_directory, include_name = os.path.split(include)
+            included_files[include] = get_repo_dir(client, settings, include_directory or ".", include=[include_name]).file(include_name)
+            manifests_container = manifests_container.with_mounted_file("/" + include, included_files[include])
+        if includes:
+            to_read.update(await get_files_contents(client, manifests_container, includes, directory="/"))
+
+    setup_metadata = None
+    if manifests["setup.py"] is not None or manifests["setup.cfg"] is not None:
+        setup_metadata = await manifests_container.with_exec(["python", "-c", SETUP_METADATA_SCRIPT]).stdout()
+    manifest_requirements = get_manifest_requirements(
+        manifests["requirements.txt"], manifests["pyproject.toml"], setup_metadata, additional_dependency_groups
+    )
+    dependency_requirements = manifest_requirements.requirements
 
-    if additional_dependency_groups:
-        container = container.with_exec(
-            install_connector_package_cmd[:-1] + [install_connector_package_cmd[-1] + f"[{','.join(additional_dependency_groups)}]"]
-        )
+    # Written next to requirements.txt, the paths of its -r and -c lines are relative to it
+    manifests_directory = manifests_directory.with_new_file(DEPENDENCY_REQUIREMENTS_FILE, "\n".join(dependency_requirements))
+    container = python_environment.with_mounted_directory(package_source_code_mount_path, manifests_directory).with_workdir(
+        package_source_code_mount_path
+    )
+    for include, included_file in included_files.items():
+        container = container.with_mounted_file("/" + include, included_file)
+    if dependency_requirements:
+        container = container.with_exec(installer.install_command(["-r", DEPENDENCY_REQUIREMENTS_FILE]))
 
-    return container
+    # Local dependencies, and theirs, are installed once each, in a layer per package after the packages it depends on.
+    # A local package source change only invalidates its layer and the following ones.
+    local_dependency_graph = LocalDependencyResolver(settings.CACHE_DIR, settings.GIT_CURRENT_REVISION).resolve(package_source_code_path)
+    for local_dependency_path in local_dependency_graph.local_dependencies:
+        container = container.with_mounted_directory(
+            "/" + local_dependency_path, get_repo_dir(client, settings, local_dependency_path, exclude=settings.DEFAULT_PYTHON_EXCLUDE)
+        ).with_exec(installer.install_command(["-e", "/" + local_dependency_path]))
+
+    container = with_python_package(client, settings, container, package_source_code_path, exclude=exclude)
+    # The installs run here, in a slot of the runner capacity shared with the other heavy steps
+    install_package_cmd = get_package_install_command(installer, package_target, manifest_requirements)
+    return await ResourceScheduler(settings).sync(container.with_exec(install_package_cmd), PYTHON_INSTALL_RESOURCES)
+
+
+def merge_package_requests(*package_requests: List[str]) -> List[str]:
+    """Merge several system package requests into a single, deduplicated and sorted, list of packages.
+
+    Installing the merged list in one step creates a single layer whose cache key does not depend on the order of the requests.
+    """
+    return sorted({package for package_request in package_requests for package in package_request})
 
 
-def with_alpine_packages(base_container: Container, packages_to_install: List[str]) -> Container:
+def with_alpine_packages(
+    base_container: Container, packages_to_install: List[str], client: Optional[Client] = None, settings: Optional[GlobalSettings] = None
+) -> Container:
     """Installs packages using apk-get.
+
+    When a client is given, the apk cache is kept on a cache volume and the package index is only refreshed
+    when older than settings.SYSTEM_PACKAGES_INDEX_MAX_AGE minutes.
+
     Args:
         context (Container): A alpine based container.
+        client (Optional[Client], optional): The dagger client used to get the apk cache volume. Defaults to None.
+        settings (Optional[GlobalSettings], optional): The global settings object. Defaults to the global settings.
 
     Returns:
         Container: A container with the packages installed.
 
     """
-    package_install_command = ["apk", "add"]
-    return base_container.with_exec(package_install_command + packages_to_install)
+    packages_to_install = merge_package_requests(packages_to_install)
+    if client is None:
+        return base_container.with_exec(["apk", "add"] + packages_to_install)
+
+    max_age = (settings or GlobalSettings()).SYSTEM_PACKAGES_INDEX_MAX_AGE
+    install_script = (
+        "[ -e /etc/apk/cache ] || ln -s /var/cache/apk /etc/apk/cache; "
+        f"apk add --cache-max-age {max_age} {' '.join(packages_to_install)}"
+    )
+    return (
+        base_container.with_mounted_cache("/var/cache/apk", get_cache_volume(client, "apk-cache", settings), sharing=CacheSharingMode.LOCKED)
+        .with_exec(["sh", "-c", install_script])
+    )
 
 
-def with_debian_packages(base_container: Container, packages_to_install: List[str]) -> Container:
+def with_debian_packages(
+    base_container: Container, packages_to_install: List[str], client: Optional[Client] = None, settings: Optional[GlobalSettings] = None
+) -> Container:
     """Installs packages using apt-get.
+
+    When a client is given, /var/cache/apt and /var/lib/apt/lists are kept on cache volumes and `apt-get update` is skipped
+    if the lists of the container distribution were updated less than settings.SYSTEM_PACKAGES_INDEX_MAX_AGE minutes ago.
+    If the install fails on stale lists, they are updated and the install is retried.
+
     Args:
-        context (Container): A alpine based container.
+        context (Container): A debian based container.
+        client (Optional[Client], optional): The dagger client used to get the apt cache volumes. Defaults to None.
+        settings (Optional[GlobalSettings], optional): The global settings object. Defaults to the global settings.
 
     Returns:
         Container: A container with the packages installed.
 
     """
+    packages_to_install = merge_package_requests(packages_to_install)
     update_packages_command = ["apt-get", "update"]
     package_install_command = ["apt-get", "install", "-y"]
-    return base_container.with_exec(update_packages_command).with_exec(package_install_command + packages_to_install)
+    if client is None:
+        return base_container.with_exec(update_packages_command).with_exec(package_install_command + packages_to_install)
+
+    max_age = (settings or GlobalSettings()).SYSTEM_PACKAGES_INDEX_MAX_AGE
+    install = " ".join(package_install_command + packages_to_install)
+    update = f"{' '.join(update_packages_command)} && touch $MARKER"
+    install_script = (
+        # Debian images delete downloaded packages after each install, which defeats the cache volume
+        "rm -f /etc/apt/apt.conf.d/docker-clean; "
+        "echo 'Binary::apt::APT::Keep-Downloaded-Packages \"true\";' > /etc/apt/apt.conf.d/keep-cache; "
+        # The lists volume is shared by distributions, the marker tells when this one was last updated
+        'MARKER=/var/lib/apt/lists/.aircmd-updated-$(. /etc/os-release && echo "$ID-$VERSION_CODENAME"); '
+        f'if [ -z "$(find $MARKER -mmin -{max_age} 2>/dev/null)" ]; then {update}; fi; '
+        f"{install} || ({update} && {install})"
+    )
+    return (
+        base_container.with_mounted_cache("/var/cache/apt", get_cache_volume(client, "apt-cache", settings), sharing=CacheSharingMode.LOCKED)
+        .with_mounted_cache("/var/lib/apt/lists", get_cache_volume(client, "apt-lists", settings), sharing=CacheSharingMode.LOCKED)
+        .with_exec(["sh", "-c", install_script])
+    )
 
 
-def with_pip_packages(base_container: Container, packages_to_install: List[str]) -> Container:
-    """Installs packages using pip
+def with_pip_packages(base_container: Container, packages_to_install: List[str], settings: Optional[GlobalSettings] = None) -> Container:
+    """Installs packages using the installer backend selected in the settings
     Args:
         context (Container): A container with python installed
+        settings (Optional[GlobalSettings], optional): The global settings object, selecting the installer backend. Defaults to the global settings.
 
     Returns:
         Container: A container with the pip packages installed.
 
     """
-    package_install_command = ["pip", "install"]
-    return base_container.with_exec(package_install_command + packages_to_install)
+    package_install_command = get_python_installer(settings or GlobalSettings()).install_command(packages_to_install)
+    return base_container.with_exec(package_install_command)
+
+def with_registry_mirror(client: Client, settings: GlobalSettings) -> Container:
+    """Create a container running a pull-through registry mirror of Docker Hub, to be shared by the dockerd services.
+
+    Images are pulled from the upstream registry once and then served from a cache volume.
+    When Docker Hub credentials are set, the mirror is the only place authenticating against Docker Hub.
+    Its 5001 port exposes the proxy hit and miss counters (check get_registry_mirror_stats).
+
+    Args:
+        client (Client): The dagger client used to create the container.
+        settings (GlobalSettings): The global settings object.
+
+    Returns:
+        Container: The container running the registry mirror as a service.
+    """
+    registry_mirror = (
+        client.container()
+        .from_(pin_image(settings.REGISTRY_MIRROR_IMAGE, settings))
+        .with_env_variable("REGISTRY_PROXY_REMOTEURL", settings.REGISTRY_MIRROR_REMOTE_URL)
+        .with_env_variable("REGISTRY_HTTP_ADDR", f"0.0.0.0:{REGISTRY_MIRROR_PORT}")
+        .with_env_variable("REGISTRY_HTTP_DEBUG_ADDR", f"0.0.0.0:{REGISTRY_MIRROR_DEBUG_PORT}")
+        .with_mounted_cache("/var/lib/registry", get_cache_volume(client, "registry-mirror-cache", settings), sharing=CacheSharingMode.SHARED)
+    )
+    if settings.SECRET_DOCKER_HUB_USERNAME and settings.SECRET_DOCKER_HUB_PASSWORD:
+        registry_mirror = (
+            registry_mirror
+            .with_secret_variable("REGISTRY_PROXY_USERNAME", client.set_secret("docker_hub_username", settings.SECRET_DOCKER_HUB_USERNAME.get_secret_value()))
+            .with_secret_variable("REGISTRY_PROXY_PASSWORD", client.set_secret("docker_hub_password", settings.SECRET_DOCKER_HUB_PASSWORD.get_secret_value()))
+        )
+    return (
+        registry_mirror.with_exposed_port(REGISTRY_MIRROR_PORT)
+        .with_exposed_port(REGISTRY_MIRROR_DEBUG_PORT)
+        .with_exec(["registry", "serve", "/etc/docker/registry/config.yml"], skip_entrypoint=True)
+    )
+
+
+def with_bound_registry_mirror(registry_mirror: Optional[Container]) -> Callable[[Container], Container]:
+    """Bind a dockerd container to the registry mirror, if any, before dockerd gets started with get_dockerd_command."""
+    def bind(ctr: Container) -> Container:
+        if registry_mirror is None:
+            return ctr
+        return ctr.with_service_binding(REGISTRY_MIRROR_HOSTNAME, registry_mirror)
+    return bind
+
+
+def get_dockerd_command(registry_mirror: Optional[Container] = None) -> List[str]:
+    dockerd_command = ["dockerd", "--log-level=error", "--host=tcp://0.0.0.0:2375", "--tls=false"]
+    if registry_mirror is not None:
+        mirror_address = f"{REGISTRY_MIRROR_HOSTNAME}:{REGISTRY_MIRROR_PORT}"
+        dockerd_command += [f"--registry-mirror=http://{mirror_address}", f"--insecure-registry={mirror_address}"]
+    return dockerd_command
+
+
+async def get_registry_mirror_stats(client: Client, settings: GlobalSettings, registry_mirror: Container) -> RegistryMirrorStats:
+    """Read the pull-through hit and miss counters of the registry mirror.
+
+    Args:
+        client (Client): The dagger client.
+        settings (GlobalSettings): The global settings object.
+        registry_mirror (Container): The registry mirror service.
+
+    Returns:
+        RegistryMirrorStats: The blob and manifest counters of the mirror.
+    """
+    debug_vars = await (
+        client.container()
+        .from_(pin_image(settings.DOCKER_CLI_IMAGE, settings))
+        .with_service_binding(REGISTRY_MIRROR_HOSTNAME, registry_mirror)
+        .with_env_variable("CACHEBUSTER", str(uuid.uuid4()))
+        .with_exec(["wget", "-qO-", f"http://{REGISTRY_MIRROR_HOSTNAME}:{REGISTRY_MIRROR_DEBUG_PORT}/debug/vars"], skip_entrypoint=True)
+        .stdout()
+    )
+    return RegistryMirrorStats.from_debug_vars(debug_vars)
+
 
 def with_dockerd_service(
-    client: Client, settings: GlobalSettings, shared_volume: Optional[Tuple[str, CacheVolume]] = None, docker_service_name: Optional[str] = None
+    client: Client,
+    settings: GlobalSettings,
+    shared_volume: Optional[Tuple[str, CacheVolume]] = None,
+    docker_service_name: Optional[str] = None,
+    registry_mirror: Optional[Container] = None,
 ) -> Container:
     """Create a container running dockerd, exposing its 2375 port, can be used as the docker host for docker-in-docker use cases.
 
@@ -213,53 +471,150 @@ def with_dockerd_service(
         context (Pipeline): The current connector context.
         shared_volume (Optional, optional): A tuple in the form of (mounted path, cache volume) that will be mounted to the dockerd container. Defaults to None.
         docker_service_name (Optional[str], optional): The name of the docker service, appended to volume name, useful context isolation. Defaults to None.
+        registry_mirror (Optional[Container], optional): A registry mirror service (check with_registry_mirror) to pull images through.
+            Docker Hub authentication is then left to the mirror. Defaults to None.
 
     Returns:
-        Container: The container running dockerd as a service.
+        Container: The container running dockerd as a service. Bind it with bound_docker_host_lease to account for it in the runner capacity.
     """
-    docker_lib_volume_name = f"{shared_volume[0]}-docker-lib" if shared_volume is not None else "docker-lib"
-    if docker_service_name:
-        docker_lib_volume_name = f"{docker_lib_volume_name}-{slugify(docker_service_name)}"
+    docker_lib_instance = "-".join(part for part in [shared_volume[0] if shared_volume is not None else None, docker_service_name] if part)
     dind = (
         client.container()
-        .from_(settings.DOCKER_DIND_IMAGE)
+        .from_(pin_image(settings.DOCKER_DIND_IMAGE, settings))
         .with_(load_settings(client, settings))
-        .with_exec(["sh", "-c", "docker login -u $SECRET_DOCKER_HUB_USERNAME -p $SECRET_DOCKER_HUB_PASSWORD"])
+    )
+    if registry_mirror is None:
+        dind = dind.with_exec(["sh", "-c", "docker login -u $SECRET_DOCKER_HUB_USERNAME -p $SECRET_DOCKER_HUB_PASSWORD"])
+    dind = (
+        dind
         .with_mounted_cache(
             "/var/lib/docker",
-            client.cache_volume(docker_lib_volume_name),
+            get_cache_volume(client, "docker-lib", settings, instance=docker_lib_instance or None),
             sharing=CacheSharingMode.SHARED,
         )
+        .with_(with_bound_registry_mirror(registry_mirror))
     )
     if shared_volume is not None:
         dind = dind.with_mounted_cache(*shared_volume)
-    return dind.with_exposed_port(2375).with_exec(
-        ["dockerd", "--log-level=error", "--host=tcp://0.0.0.0:2375", "--tls=false"], insecure_root_capabilities=True
-    )
+    return dind.with_exposed_port(2375).with_exec(get_dockerd_command(registry_mirror), insecure_root_capabilities=True)
+
+
+def get_dockerd_pool(context: PipelineContext, client: Client) -> Optional[DockerdPool]:
+    """Set up the docker hosts of the pipeline context on first use, and return its dockerd pool.
+
+    The context gets a pool of settings.DOCKERD_POOL_SIZE daemons (check with_dockerd_pool) if the size is above 1,
+    with its first daemon as the dockerd service, and the single global dockerd service otherwise.
+    A dockerd service or pool already set on the context, e.g. by a plugin, is kept.
+
+    Args:
+        context (PipelineContext): The current pipeline context.
+        client (Client): The dagger client used to create the dockerd services.
+
+    Returns:
+        Optional[DockerdPool]: The dockerd pool of the context, None if it binds to the single dockerd service.
+    """
+    if context.dockerd_pool is None and context.dockerd_service is None:
+        settings = context.global_settings
+        if settings.DOCKERD_POOL_SIZE > 1:
+            context.dockerd_pool = with_dockerd_pool(client, settings)
+            context.dockerd_service = context.dockerd_pool.services[0]
+        else:
+            registry_mirror = with_registry_mirror(client, settings) if settings.REGISTRY_MIRROR_ENABLED else None
+            context.dockerd_service = with_global_dockerd_service(client, settings, registry_mirror=registry_mirror)
+    return context.dockerd_pool
 
 
 def with_bound_docker_host(
     context: PipelineContext,
     client: Client,
     container: Container,
+    docker_host_index: Optional[int] = None,
 ) -> Container:
-    """Bind a container to a docker host. It will use the dockerd service as a docker host.
+    """Bind a container to a docker host. It will use the dockerd service as a docker host, set up on first use (check get_dockerd_pool).
+
+    If the context holds a dockerd pool, the container is bound to its least loaded daemon, or to the daemon at docker_host_index if given.
+    The binding is not counted in the daemon load and the daemon is not probed, the engine only waits for its port to be open:
+    prefer bound_docker_host_lease from async code, or call wait_for_docker_host with the index first.
 
     Args:
         context (ConnectorContext): The current connector context.
         container (Container): The container to bind to the docker host.
+        docker_host_index (Optional[int], optional): The index of the pooled daemon to bind to. Defaults to None.
     Returns:
         Container: The container bound to the docker host.
     """
+    pool = get_dockerd_pool(context, client)
+    if pool is not None:
+        index = pool.pick(docker_host_index)
+        return _bind_to_docker_host(client, context.global_settings, container, pool.hostname(index), pool.services[index])
     dockerd = context.dockerd_service
     assert dockerd is not None
-    docker_hostname = "global-docker-host"
+    return _bind_to_docker_host(client, context.global_settings, container, "global-docker-host", dockerd)
+
+
+def _bind_to_docker_host(client: Client, settings: GlobalSettings, container: Container, docker_hostname: str, dockerd: Container) -> Container:
     return (
         container.with_env_variable("DOCKER_HOST", f"tcp://{docker_hostname}:2375")
         .with_service_binding(docker_hostname, dockerd)
-        .with_mounted_cache("/tmp", client.cache_volume("shared-tmp"))
+        .with_mounted_cache("/tmp", get_cache_volume(client, "shared-tmp", settings))
     )
 
+
+async def wait_for_docker_host(context: PipelineContext, settings: GlobalSettings, client: Client, index: int) -> None:
+    """Probe a pooled dockerd service until it answers `docker info`, only once per daemon.
+
+    Args:
+        context (PipelineContext): The current pipeline context, holding the dockerd pool.
+        index (int): The index of the daemon to probe in the pool.
+
+    Raises:
+        ValueError: Raised if the context has no dockerd pool.
+    """
+    pool = context.dockerd_pool
+    if pool is None:
+        raise ValueError("The pipeline context has no dockerd pool to probe.")
+    async with pool.probe_lock(index):
+        if pool.is_ready(index):
+            return
+        probe = f"for i in $(seq 1 {settings.DOCKERD_READINESS_TIMEOUT}); do docker info > /dev/null 2>&1 && exit 0; sleep 1; done; exit 1"
+        docker_cli = client.container().from_(pin_image(settings.DOCKER_CLI_IMAGE, settings))
+        await (
+            _bind_to_docker_host(client, settings, docker_cli, pool.hostname(index), pool.services[index])
+            .with_env_variable("CACHEBUSTER", str(uuid.uuid4()))
+            .with_exec(["sh", "-c", probe])
+            .sync()
+        )
+        pool.mark_ready(index)
+
+
+@asynccontextmanager
+async def bound_docker_host_lease(
+    context: PipelineContext, settings: GlobalSettings, client: Client, container: Container
+) -> AsyncIterator[Container]:
+    """Bind a container to the least loaded daemon of the dockerd pool for the duration of the block.
+
+    The daemon is probed for readiness before its first use and its load is released when the block exits.
+    The block holds a dockerd slot of the runner capacity (check ResourceScheduler).
+
+    Args:
+        context (PipelineContext): The current pipeline context, holding the dockerd pool.
+        container (Container): The container to bind to the docker host.
+
+    Yields:
+        Container: The container bound to the docker host.
+    """
+    async with ResourceScheduler(settings).slot(DOCKERD_RESOURCES):
+        pool = get_dockerd_pool(context, client)
+        if pool is None:
+            yield with_bound_docker_host(context, client, container)
+            return
+        index = pool.acquire()
+        try:
+            await wait_for_docker_host(context, settings, client, index)
+            yield _bind_to_docker_host(client, settings, container, pool.hostname(index), pool.services[index])
+        finally:
+            pool.release(index)
+
 def with_bound_docker_host_and_authenticated_client(
     context: PipelineContext,
     settings: GlobalSettings,
@@ -285,60 +640,141 @@ def with_bound_docker_host_and_authenticated_client(
     )
 
 
-def with_global_dockerd_service(dagger_client: Client, settings: GlobalSettings) -> Container:
+def with_global_dockerd_service(
+    dagger_client: Client, settings: GlobalSettings, docker_service_name: Optional[str] = None, registry_mirror: Optional[Container] = None
+) -> Container:
     """Create a container with a docker daemon running.
     We expose its 2375 port to use it as a docker host for docker-in-docker use cases.
     Args:
         dagger_client (Client): The dagger client used to create the container.
+        docker_service_name (Optional[str], optional): The name of the docker service, appended to the docker cache volume name to isolate it. Defaults to None.
+        registry_mirror (Optional[Container], optional): A registry mirror service (check with_registry_mirror) to pull images through. Defaults to None.
     Returns:
         Container: The container running dockerd as a service
     """
     return (
         dagger_client.container()
-        .from_(settings.DOCKER_DIND_IMAGE)
+        .from_(pin_image(settings.DOCKER_DIND_IMAGE, settings))
         .with_mounted_cache(
             "/tmp",
-            dagger_client.cache_volume("shared-tmp"),
+            get_cache_volume(dagger_client, "shared-tmp", settings),
         )
         .with_mounted_cache( 
             "/var/lib/docker", 
-            dagger_client.cache_volume("docker_cache") 
+            get_cache_volume(dagger_client, "docker_cache", settings, instance=docker_service_name)
         )
+        .with_(with_bound_registry_mirror(registry_mirror))
         .with_exposed_port(2375)
-        .with_exec(["dockerd", "--log-level=error", "--host=tcp://0.0.0.0:2375", "--tls=false"], insecure_root_capabilities=True)
+        .with_exec(get_dockerd_command(registry_mirror), insecure_root_capabilities=True)
     )
 
-def with_docker_cli(context: PipelineContext, settings: GlobalSettings, client: Client) -> Container:
+
+def with_dockerd_pool(
+    dagger_client: Client, settings: GlobalSettings, size: Optional[int] = None, registry_mirror: Optional[Container] = None
+) -> DockerdPool:
+    """Create a pool of docker daemons, each with its own /var/lib/docker cache volume.
+
+    Args:
+        dagger_client (Client): The dagger client used to create the containers.
+        size (Optional[int], optional): The number of daemons in the pool. Defaults to settings.DOCKERD_POOL_SIZE.
+        registry_mirror (Optional[Container], optional): A registry mirror service all the daemons pull images through.
+            Defaults to a new one if settings.REGISTRY_MIRROR_ENABLED is set, to None otherwise.
+    Returns:
+        DockerdPool: The pool of containers running dockerd as services.
+    """
+    size = size or settings.DOCKERD_POOL_SIZE
+    if registry_mirror is None and settings.REGISTRY_MIRROR_ENABLED:
+        registry_mirror = with_registry_mirror(dagger_client, settings)
+    services = [
+        with_global_dockerd_service(dagger_client, settings, docker_service_name=f"pool-{index}" if size > 1 else None, registry_mirror=registry_mirror)
+        for index in range(size)
+    ]
+    return DockerdPool(services=services, registry_mirror=registry_mirror)
+
+def with_docker_cli(context: PipelineContext, settings: GlobalSettings, client: Client, docker_host_index: Optional[int] = None) -> Container:
     """Create a container with the docker CLI installed and bound to a persistent docker host.
 
     Args:
         context (ConnectorContext): The current connector context.
+        docker_host_index (Optional[int], optional): The index of the pooled daemon to bind to. Defaults to None.
 
     Returns:
         Container: A docker cli container bound to a docker host.
     """
-    docker_cli = client.container().from_(settings.DOCKER_CLI_IMAGE)
-    return with_bound_docker_host(context, client, docker_cli)
+    docker_cli = client.container().from_(pin_image(settings.DOCKER_CLI_IMAGE, settings))
+    return with_bound_docker_host(context, client, docker_cli, docker_host_index)
 
-def with_node(client: Client, node_version:str) -> Container:
+def with_node(client: Client, node_version:str, settings: Optional[GlobalSettings] = None) -> Container:
     
     node = (
                 client.container()
-                .from_(f"node:{node_version}") # TODO: take this as an imput
+                .from_(pin_image(f"node:{node_version}", settings))
         )
     return node
 
-def with_pnpm(client: Client, pnpm_version: str = "latest") -> Callable[[Container], Container]:
+def with_pnpm(client: Client, pnpm_version: str = PNPM_VERSION, settings: Optional[GlobalSettings] = None) -> Callable[[Container], Container]:
     def pnpm(ctr: Container) -> Container:
-        pnpm_cache: CacheVolume = client.cache_volume("pnpm-cache")
+        pnpm_cache: CacheVolume = get_cache_volume(client, "pnpm-cache", settings)
         ctr = (ctr.with_mounted_cache("/root/pnpm-cache", pnpm_cache)
             .with_exec(["corepack", "enable"])
-            .with_exec(["corepack", "prepare", f"pnpm@{pnpm_version}", "--activate"]) # TODO: take this as an input
+            .with_exec(["corepack", "prepare", f"pnpm@{pnpm_version}", "--activate"])
             .with_exec(["pnpm", "config", "set", "store-dir", "/root/pnpm-cache"]))
         return ctr
     return pnpm
 
 
+def with_pnpm_project(
+    client: Client,
+    node_container: Container,
+    project_directory: Directory,
+    project_path: str = "/app",
+    pnpm_version: str = PNPM_VERSION,
+    settings: Optional[GlobalSettings] = None,
+) -> Container:
+    """Install the dependencies of a pnpm project, prefetched from its lockfile only.
+
+    `pnpm fetch` runs on the lockfile (and .npmrc, pnpm-workspace.yaml) in a dedicated layer whose store is part of the layer,
+    so source changes keep reusing it and the following `pnpm install --offline` makes no network request.
+
+    Args:
+        client (Client): The dagger client.
+        node_container (Container): A container with node installed, check with_node.
+        project_directory (Directory): The pnpm project sources, with its pnpm-lock.yaml.
+        project_path (str, optional): Where to mount the project in the container. Defaults to "/app".
+        pnpm_version (str, optional): The pinned pnpm version. Defaults to PNPM_VERSION.
+        settings (Optional[GlobalSettings], optional): The global settings object, namespacing the pnpm cache volume. Defaults to the global settings.
+
+    Returns:
+        Container: A container with the project sources and its dependencies installed.
+    """
+    lockfile_directory = client.directory().with_directory(".", project_directory, include=PNPM_DEPENDENCY_MANIFESTS)
+    return (
+        node_container.with_(with_pnpm(client, pnpm_version, settings))
+        # The prefetched store must live in the layer for the offline install to find it, the cache volume keeps pnpm metadata
+        .with_exec(["pnpm", "config", "set", "store-dir", "/root/.pnpm-store"])
+        .with_exec(["pnpm", "config", "set", "cache-dir", "/root/pnpm-cache"])
+        .with_directory(project_path, lockfile_directory)
+        .with_workdir(project_path)
+        .with_exec(["pnpm", "fetch"])
+        .with_directory(project_path, project_directory, exclude=["**/node_modules"])
+        .with_exec(["pnpm", "install", "--offline", "--frozen-lockfile"])
+    )
+
+
+def with_openjdk(client: Client, settings: GlobalSettings) -> Container:
+    """Create a JDK container with the system packages the Gradle builds need.
+
+    Args:
+        client (Client): The dagger client.
+        settings (GlobalSettings): The global settings object.
+
+    Returns:
+        Container: The JDK environment, without any sources.
+    """
+    # we use prettier in java builds unfortunately
+    return with_debian_packages(client.container().from_(pin_image(OPENJDK_IMAGE, settings)), ["curl", "jq", "rsync", "nodejs", "npm"], client, settings)
+
+
 def with_gradle(
     client: Client,
     context: PipelineContext,
@@ -358,7 +794,7 @@ def with_gradle(
         directory: The directory to mount to the container. Defaults to "."
 
     Returns:
-        Container: A container with Gradle installed and Java sources from the repository.
+        Container: A container with Gradle installed and Java sources from the repository, run gradle tasks in it with run_gradle_task.
     """
 
     include = [
@@ -392,12 +828,10 @@ def with_gradle(
     include = [directory + "/" + x for x in include] if directory else include
     exclude = [directory + "/" + x for x in exclude] if directory else exclude
 
-    gradle_cache: CacheVolume = client.cache_volume("gradle-cache")
+    gradle_cache: CacheVolume = get_cache_volume(client, "gradle-cache", settings)
 
     openjdk_with_docker = (
-        client.container()
-        .from_("openjdk:17.0.1-jdk-slim")
-        .with_exec(["bin/bash", "-c", "apt-get update && apt-get install -y curl jq rsync nodejs npm"]) # we use prettier in java builds unfortunately
+        with_openjdk(client, settings)
         .with_env_variable("VERSION", settings.DOCKER_VERSION)
         .with_exec(["sh", "-c", "curl -fsSL https://get.docker.com | sh"])
         .with_env_variable("GRADLE_HOME", settings.GRADLE_HOMEDIR_PATH)
@@ -415,60 +849,113 @@ def with_gradle(
         return openjdk_with_docker
 
 
-async def load_image_to_docker_host(context: PipelineContext, settings: GlobalSettings, client: Client, tar_file: File, image_tag: str) -> None:
+async def run_gradle_task(settings: GlobalSettings, gradle_container: Container, gradle_args: List[str]) -> Container:
+    """Run gradle tasks in a container built by with_gradle, in a gradle slot of the runner capacity (check ResourceScheduler).
+
+    Args:
+        settings (GlobalSettings): The global settings object.
+        gradle_container (Container): The container built by with_gradle.
+        gradle_args (List[str]): The gradle tasks and options, e.g. ["build", "--scan"].
+
+    Returns:
+        Container: The container which ran the gradle tasks.
+    """
+    return await ResourceScheduler(settings).sync(gradle_container.with_exec(["./gradlew"] + gradle_args), GRADLE_RESOURCES)
+
+
+def get_image_id_from_tarball_manifest(manifest: str) -> str:
+    """Extract the image ID from the manifest.json of a `docker save` tarball.
+
+    Both the legacy docker layout ("<hex>.json") and the OCI layout ("blobs/sha256/<hex>") are supported.
+
+    Args:
+        manifest (str): The content of the manifest.json file of the tarball.
+
+    Raises:
+        ValueError: Raised if the manifest does not describe exactly one image.
+
+    Returns:
+        str: The image ID, in the form of sha256:<hex>.
+    """
+    entries = json.loads(manifest)
+    if len(entries) != 1:
+        raise ValueError(f"Expected a single image in the tarball manifest, found {len(entries)}")
+    config_path: str = entries[0]["Config"]
+    return "sha256:" + os.path.basename(config_path).removesuffix(".json")
+
+
+async def load_image_to_docker_host(
+    context: PipelineContext, settings: GlobalSettings, client: Client, tar_file: File, image_tag: str, docker_host_index: Optional[int] = None
+) -> ImageLoadReport:
     """Load a docker image tar archive to the docker host.
 
+    The image ID is read from the tarball manifest and the docker host is checked for it first:
+    the archive is only loaded if the host does not already have the image, and the tag is then (re)applied without reloading.
+
     Args:
         context (ConnectorContext): The current connector context.
         tar_file (File): The file object holding the docker image tar archive.
-        image_tag (str): The tag to create on the image if it has no tag.
+        image_tag (str): The tag to create on the image.
+        docker_host_index (Optional[int], optional): The index of the pooled daemon to load the image to.
+            Containers using the image must be bound to the same daemon. Defaults to the least loaded daemon.
+
+    Returns:
+        ImageLoadReport: The image ID, whether it had to be loaded, the daemon holding it, and the time spent.
     """
-    # Hacky way to make sure the image is always loaded
-    tar_name = f"{str(uuid.uuid4())}.tar"
-    docker_cli = with_docker_cli(context, settings, client).with_mounted_file(tar_name, tar_file)
-
-    image_load_output = await docker_cli.with_exec(["docker", "load", "--input", tar_name]).stdout()
-    print(image_load_output)
-    # Not tagged images only have a sha256 id the load output shares.
-    if "sha256:" in image_load_output:
-        image_id = image_load_output.replace("\n", "").replace("Loaded image ID: sha256:", "")
-        docker_tag_output = await docker_cli.with_exec(["docker", "tag", image_id, image_tag]).stdout()
-        print(docker_tag_output)
-
-    # Remove a previously existing image with the same tag if any.
-    try:
-        await (
-            docker_cli
-            .with_env_variable("CACHEBUSTER", tar_name)
-            .with_exec(["docker", "image", "rm", image_tag])
-        )
-    except dagger.ExecError:
-        pass
-    else:
-        print(f"Removed an existing image tagged {image_tag}")
+    start = time.monotonic()
+    tar_name = "/image.tar"
+    pool = get_dockerd_pool(context, client)
+    if pool is not None:
+        docker_host_index = pool.pick(docker_host_index)
+        await wait_for_docker_host(context, settings, client, docker_host_index)
+    docker_cli = with_docker_cli(context, settings, client, docker_host_index).with_mounted_file(tar_name, tar_file)
+
+    # Reading the manifest only depends on the tarball content, so this exec is cached across runs.
+    manifest = await docker_cli.with_exec(["tar", "-xOf", tar_name, "manifest.json"]).stdout()
+    image_id = get_image_id_from_tarball_manifest(manifest)
+
+    # The state of the docker host can change between runs, so this exec must never be cached.
+    load_if_missing = (
+        f"if docker image inspect {image_id} > /dev/null 2>&1; then echo present; "
+        f"else docker load --quiet --input {tar_name} > /dev/null && echo loaded; fi "
+        f"&& docker tag {image_id} {image_tag}"
+    )
+    load_output = await (
+        docker_cli.with_env_variable("CACHEBUSTER", str(uuid.uuid4()))
+        .with_exec(["sh", "-c", load_if_missing])
+        .stdout()
+    )
 
-    image_load_output = await docker_cli.with_exec(["docker", "load", "--input", tar_name]).stdout()
-    print(image_load_output)
-    # Not tagged images only have a sha256 id the load output shares.
-    if "sha256:" in image_load_output:
-        image_id = image_load_output.replace("\n", "").replace("Loaded image ID: sha256:", "")
-        docker_tag_output = await docker_cli.with_exec(["docker", "tag", image_id, image_tag]).stdout()
-        print(docker_tag_output)
+    report = ImageLoadReport(
+        image_id=image_id,
+        image_tag=image_tag,
+        loaded=load_output.strip() == "loaded",
+        duration=time.monotonic() - start,
+        docker_host=await docker_cli.env_variable("DOCKER_HOST"),
+        docker_host_index=docker_host_index,
+    )
+    print(report)
+    return report
 
 
-def with_poetry(client: Client) -> Container:
+def with_poetry(client: Client, settings: Optional[GlobalSettings] = None, debian_packages: Optional[List[str]] = None) -> Container:
     """Install poetry in a python environment.
 
+    The poetry version is settings.POETRY_VERSION. Its poetry cache volume can be seeded from the host poetry cache,
+    check seed_cache_volumes_from_host.
+
     Args:
         context (Pipeline): The current test pipeline, providing the repository directory from which the ci_credentials sources will be pulled.
+        settings (Optional[GlobalSettings], optional): The global settings object, selecting the installer backend. Defaults to the global settings.
+        debian_packages (Optional[List[str]], optional): Additional system packages, installed in the same step as git. Defaults to None.
     Returns:
         Container: A python environment with poetry installed.
     """
-    python_base_environment: Container = with_python_base(client, PYTHON_IMAGE)
-    python_with_git = with_debian_packages(python_base_environment, ["git"])
-    python_with_poetry = with_pip_packages(python_with_git, ["poetry"])
+    python_base_environment: Container = with_python_base(client, PYTHON_IMAGE, settings)
+    python_with_git = with_debian_packages(python_base_environment, merge_package_requests(["git"], debian_packages or []), client, settings)
+    python_with_poetry = with_pip_packages(python_with_git, [f"poetry=={(settings or GlobalSettings()).POETRY_VERSION}"], settings)
 
-    poetry_cache: CacheVolume = client.cache_volume("poetry_cache")
+    poetry_cache: CacheVolume = get_cache_volume(client, "poetry_cache", settings)
     python_with_poetry_cache = python_with_poetry.with_mounted_cache("/root/.cache/pypoetry", poetry_cache, sharing=CacheSharingMode.SHARED)
 
     return python_with_poetry_cache
@@ -477,18 +964,27 @@ def with_poetry(client: Client) -> Container:
 def with_poetry_module(client: Client, parent_dir: Directory, module_path: str) -> Container:
     """Sets up a Poetry module.
 
+    The dependencies are installed from pyproject.toml and poetry.lock only, before the sources are mounted,
+    so that source changes do not invalidate the dependency layer.
+
     Args:
         context (Pipeline): The current test pipeline, providing the repository directory from which the sources will be pulled.
     Returns:
         Container: A python environment with dependencies installed using poetry.
     """
-    poetry_install_dependencies_cmd = ["poetry", "install"]
+    poetry_install_dependencies_cmd = ["poetry", "install", "--no-root", "--no-directory"]
+    poetry_install_cmd = ["poetry", "install"]
 
+    manifests_directory = client.directory().with_directory(
+        module_path, parent_dir.directory(module_path), include=POETRY_DEPENDENCY_MANIFESTS
+    )
     python_with_poetry = with_poetry(client)
     return (
-        python_with_poetry.with_mounted_directory("/src", parent_dir)
+        python_with_poetry.with_mounted_directory("/src", manifests_directory)
         .with_workdir(f"/src/{module_path}")
         .with_exec(poetry_install_dependencies_cmd)
+        .with_mounted_directory("/src", parent_dir)
+        .with_exec(poetry_install_cmd)
         .with_env_variable("CACHEBUSTER", str(uuid.uuid4()))
     )
 
@@ -504,7 +1000,7 @@ def with_crane(
     # We use the debug image as it contains a shell which we need to properly use environment variables
     # https://github.com/google/go-containerregistry/tree/main/cmd/crane#images
 
-    base_container = client.container().from_(CRANE_DEBUG_IMAGE)
+    base_container = client.container().from_(pin_image(CRANE_DEBUG_IMAGE, settings))
     if settings.SECRET_DOCKER_HUB_USERNAME and settings.SECRET_DOCKER_HUB_PASSWORD:
         dockerhub_user = client.set_secret("docker_hub_username", settings.SECRET_DOCKER_HUB_USERNAME.get_secret_value())
         dockerhub_password = client.set_secret("docker_hub_password", settings.SECRET_DOCKER_HUB_PASSWORD.get_secret_value())
@@ -1,5 +1,8 @@
-from typing import Any, Dict
+import os
+import tempfile
+from typing import Any, Dict, Optional
 
+import requests
 from github import Github
 from prefect import Flow, State
 from prefect import settings as prefect_settings
@@ -137,3 +140,61 @@ def github_status_update_hook(flow: Flow[Any, Any], flow_run: FlowRun, state: St
         description = "This check is in flight."
 
     create_status(settings, sha, status, context, description, target_url)
+
+
+def get_github_action_archive(github_repo: str, release_version: str, cache_dir: str, token: Optional[str] = None) -> str:
+    """Get the release archive of a GitHub action from the host cache, downloading it on the first use only.
+
+    Archives are keyed by repository and tag, so a tag is expected to be immutable.
+
+    Args:
+        github_repo (str): The repository of the action, in the owner/name form.
+        release_version (str): The tag of the action release.
+        cache_dir (str): The aircmd cache directory, archives are stored in its github-actions directory.
+        token (Optional[str], optional): A GitHub token to authenticate the download with. Defaults to None.
+
+    Returns:
+        str: The path of the cached archive.
+    """
+    archive_path = os.path.join(cache_dir, "github-actions", github_repo, f"{release_version}.tar.gz")
+    if os.path.isfile(archive_path):
+        return archive_path
+
+    os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+    action_url = f"https://github.com/{github_repo}/archive/refs/tags/{release_version}.tar.gz"
+    headers = {"Authorization": f"token {token}"} if token else {}
+    # Write to a temporary file first so that an interrupted download is never reused
+    download = tempfile.NamedTemporaryFile(dir=os.path.dirname(archive_path), delete=False)
+    try:
+        with download, requests.get(action_url, headers=headers, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                download.write(chunk)
+        os.replace(download.name, archive_path)
+    finally:
+        if os.path.exists(download.name):
+            os.remove(download.name)
+    return archive_path
+
+
+# Copy the release archive of a GitHub action from a cache volume to a path outside of it, downloading it on the first use only.
+# Takes the archive URL, its path in the cache volume and the output path, and reads an optional token from GITHUB_TOKEN.
+GITHUB_ACTION_ARCHIVE_SCRIPT = """
+import os, shutil, sys, tempfile, urllib.request
+url, archive_path, output_path = sys.argv[1:4]
+if not os.path.isfile(archive_path):
+    os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+    request = urllib.request.Request(url)
+    if os.environ.get("GITHUB_TOKEN"):
+        request.add_header("Authorization", "token " + os.environ["GITHUB_TOKEN"])
+    # Write to a temporary file first so that an interrupted download is never reused
+    download = tempfile.NamedTemporaryFile(dir=os.path.dirname(archive_path), delete=False)
+    try:
+        with download, urllib.request.urlopen(request, timeout=60) as response:
+            shutil.copyfileobj(response, download)
+        os.replace(download.name, archive_path)
+    finally:
+        if os.path.exists(download.name):
+            os.remove(download.name)
+shutil.copyfile(archive_path, output_path)
+"""
@@ -0,0 +1,109 @@
+"""Export source trees from git, so that builds only depend on committed content."""
+
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import List, Optional
+
+import pygit2  # type: ignore
+from pydantic import BaseModel
+
+from .uploads import is_excluded, is_included, normalize_pattern, rebase_pattern
+
+
+class GitTreeExport(BaseModel):
+    path: str
+    tree_id: str
+    revision: str
+
+
+def get_tree_export_key(tree_id: str, exclude: List[str], include: Optional[List[str]]) -> str:
+    """The identity of an export: the tree OID and the filters applied to it."""
+    key = hashlib.sha256(tree_id.encode())
+    for pattern in sorted(exclude):
+        key.update(f"exclude:{pattern}\n".encode())
+    for pattern in sorted(include or []):
+        key.update(f"include:{pattern}\n".encode())
+    return key.hexdigest()
+
+
+def _write_tree(repo: pygit2.Repository, tree: pygit2.Tree, destination: str, prefix: str, exclude: List[str], include: Optional[List[str]]) -> None:
+    for entry in tree:
+        relative_path = f"{prefix}{entry.name}"
+        if is_excluded(relative_path, exclude):
+            continue
+        if entry.filemode == pygit2.GIT_FILEMODE_TREE:
+            _write_tree(repo, repo[entry.id], destination, f"{relative_path}/", exclude, include)
+            continue
+        # Submodules are not part of the tree content
+        if entry.filemode == pygit2.GIT_FILEMODE_COMMIT or not is_included(relative_path, include):
+            continue
+        path = os.path.join(destination, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        blob = repo[entry.id]
+        if entry.filemode == pygit2.GIT_FILEMODE_LINK:
+            os.symlink(blob.data.decode(), path)
+            continue
+        with open(path, "wb") as f:
+            f.write(blob.data)
+        os.chmod(path, 0o755 if entry.filemode == pygit2.GIT_FILEMODE_BLOB_EXECUTABLE else 0o644)
+        # Fixed mtimes so that exports of the same tree are identical on any runner
+        os.utime(path, (0, 0))
+
+
+def export_git_tree(
+    repo_path: str,
+    revision: str,
+    subdir: str,
+    exclude: List[str],
+    include: Optional[List[str]],
+    cache_dir: str,
+) -> GitTreeExport:
+    """Export the tree of a repository subdirectory at a revision to a directory of the aircmd cache.
+
+    Exports are keyed by tree OID and filters: an unchanged subtree is exported once and then reused as is,
+    across revisions and runs.
+
+    Args:
+        repo_path (str): The path of the git repository.
+        revision (str): The revision to export the tree of, e.g. GIT_CURRENT_REVISION.
+        subdir (str): The subdirectory to export, relative to the current working directory.
+        exclude (List[str]): The patterns to exclude, relative to the current working directory.
+        include (Optional[List[str]]): The patterns to include, relative to subdir.
+        cache_dir (str): The aircmd cache directory, exports are written to its git-trees directory.
+
+    Raises:
+        ValueError: Raised if subdir is not a directory tracked at revision.
+
+    Returns:
+        GitTreeExport: The path of the export, with the tree OID and revision it was exported from.
+    """
+    repo = pygit2.Repository(repo_path)
+    tree = repo.revparse_single(revision).peel(pygit2.Commit).tree
+    subdir_in_repo = os.path.relpath(os.path.abspath(subdir), repo.workdir)
+    if subdir_in_repo != ".":
+        try:
+            tree = tree[subdir_in_repo]
+        except KeyError:
+            raise ValueError(f"{subdir} is not tracked at revision {revision}")
+        if not isinstance(tree, pygit2.Tree):
+            raise ValueError(f"{subdir} is not a directory at revision {revision}")
+
+    subdir_exclude = [rebased for pattern in exclude for rebased in rebase_pattern(pattern, os.path.relpath(subdir))]
+    include = [normalize_pattern(pattern) for pattern in include] if include is not None else None
+    tree_id = str(tree.id)
+    export_path = os.path.join(cache_dir, "git-trees", get_tree_export_key(tree_id, subdir_exclude, include))
+
+    if not os.path.isdir(export_path):
+        os.makedirs(os.path.dirname(export_path), exist_ok=True)
+        # Write to a temporary directory first so that an interrupted export is never reused
+        staging_path = tempfile.mkdtemp(dir=os.path.dirname(export_path))
+        try:
+            _write_tree(repo, tree, staging_path, "", subdir_exclude, include)
+            os.rename(staging_path, export_path)
+        except OSError:
+            shutil.rmtree(staging_path, ignore_errors=True)
+            if not os.path.isdir(export_path):
+                raise
+    return GitTreeExport(path=export_path, tree_id=tree_id, revision=revision)
@@ -0,0 +1,117 @@
+"""Declare pipeline steps with their inputs and run them as a graph: shared upstream steps run once and independent branches run concurrently."""
+
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
+
+from prefect import Task
+from pydantic import BaseModel
+
+
+class PipelineStep(BaseModel):
+    """A step of a pipeline graph.
+
+    Its output is the return value of task. inputs maps task parameters to the steps whose output they receive.
+    """
+
+    name: str
+    task: Callable[..., Any]
+    inputs: Dict[str, str] = {}
+    task_kwargs: Dict[str, Any] = {}
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    async def call(self, **kwargs: Any) -> Any:
+        """Run the task, submitting it to the task runner if it is a Prefect task."""
+        if isinstance(self.task, Task):
+            future = await self.task.submit(**kwargs)
+            return await future.result()
+        return await self.task(**kwargs)
+
+
+class PipelineGraph:
+    """A set of pipeline steps wired together by their inputs."""
+
+    def __init__(self) -> None:
+        self.steps: Dict[str, PipelineStep] = {}
+
+    def add_step(self, name: str, task: Callable[..., Any], inputs: Optional[Dict[str, str]] = None, **kwargs: Any) -> PipelineStep:
+        """Declare a step.
+
+        Args:
+            name (str): The name of the step, the other steps refer to its output with it.
+            task (Callable[..., Any]): The Prefect task or coroutine function running the step.
+            inputs (Optional[Dict[str, str]], optional): The task parameters receiving the output of upstream steps, e.g. {"build_result": "build"}. Defaults to None.
+            **kwargs: Additional keyword arguments for this step's task.
+
+        Raises:
+            ValueError: Raised if a step with the same name already exists.
+
+        Returns:
+            PipelineStep: The declared step.
+        """
+        if name in self.steps:
+            raise ValueError(f"A step with the name '{name}' already exists in this graph.")
+        step = PipelineStep(name=name, task=task, inputs=inputs or {}, task_kwargs=kwargs)
+        self.steps[name] = step
+        return step
+
+    def resolve(self, targets: List[str]) -> List[str]:
+        """The steps needed to produce the targets, each one once, sorted so that each step comes after its upstream steps.
+
+        Raises:
+            ValueError: Raised if a step is unknown or if the steps are cyclic.
+        """
+        order: List[str] = []
+        visiting: List[str] = []
+
+        def visit(name: str) -> None:
+            if name in order:
+                return
+            if name not in self.steps:
+                raise ValueError(f"Unknown step: {name}")
+            if name in visiting:
+                raise ValueError(f"Cyclic steps: {' -> '.join(visiting[visiting.index(name):] + [name])}")
+            visiting.append(name)
+            for upstream in self.steps[name].inputs.values():
+                visit(upstream)
+            visiting.pop()
+            order.append(name)
+
+        for target in targets:
+            visit(target)
+        return order
+
+    async def run(self, targets: List[str], parallelism: Optional[int] = None, **kwargs: Any) -> Dict[str, Any]:
+        """Run the steps needed to produce the targets.
+
+        Each step starts as soon as its upstream steps are done, at most parallelism steps run at once.
+        If a step fails, the steps still running are cancelled and its exception is raised.
+
+        Args:
+            targets (List[str]): The steps to produce the output of.
+            parallelism (Optional[int], optional): How many steps run at once. Defaults to no limit.
+            **kwargs: The keyword arguments passed to all the tasks, e.g. client and settings.
+
+        Returns:
+            Dict[str, Any]: The output of each step which ran, keyed by step name.
+        """
+        order = self.resolve(targets)
+        semaphore = asyncio.Semaphore(parallelism or len(order))
+        runs: Dict[str, asyncio.Future[Any]] = {}
+
+        async def run_step(step: PipelineStep) -> Any:
+            upstream_outputs = {parameter: await runs[upstream] for parameter, upstream in step.inputs.items()}
+            async with semaphore:
+                return await step.call(**kwargs, **step.task_kwargs, **upstream_outputs)
+
+        for name in order:
+            runs[name] = asyncio.ensure_future(run_step(self.steps[name]))
+        try:
+            outputs = await asyncio.gather(*runs.values())
+        except BaseException:
+            for run in runs.values():
+                run.cancel()
+            await asyncio.gather(*runs.values(), return_exceptions=True)
+            raise
+        return dict(zip(runs.keys(), outputs))
@@ -0,0 +1,156 @@
+"""Seed the pip and poetry cache volumes from the caches of the host, and sync the new artifacts back, so that first local runs are warm."""
+
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from typing import List, Set
+
+from dagger import CacheSharingMode, Client, Container
+from pydantic import BaseModel
+
+from ..models.settings import GlobalSettings
+from .cache_volumes import CACHE_VOLUMES_MOUNT_PATH, get_cache_volume
+from .constants import ALPINE_IMAGE
+from .images import pin_image
+
+HOST_CACHE_MOUNT_PATH = "/host-cache"
+SYNC_OUTPUT_PATH = "/sync-output"
+
+# Host caches seeded during the session, a volume is only seeded once
+_seeded_volumes: Set[str] = set()
+
+
+class HostCache(BaseModel):
+    """A host cache matching a cache volume, the files of both are laid out the same way."""
+
+    volume: str
+    host_path: str
+    # The hash addressed directories of the cache, e.g. not the poetry virtualenvs
+    include: List[str]
+
+
+class HostCacheReport(BaseModel):
+    volume: str
+    # seeded or synced
+    action: str
+    new_files: int
+    # Stale files of the volume replaced by the host ones, when seeding
+    refreshed_files: int = 0
+    duration: float
+
+    def __str__(self) -> str:
+        direction = "from" if self.action == "seeded" else "to"
+        refreshed = f" and refreshed {self.refreshed_files} files" if self.refreshed_files else ""
+        return f"{self.volume}: {self.action} {self.new_files} new files{refreshed} {direction} the host cache in {self.duration:.1f}s"
+
+
+def get_host_caches(settings: GlobalSettings) -> List[HostCache]:
+    """The host caches matching the pip and poetry cache volumes, the ones missing on the host are left out."""
+    host_caches = [
+        HostCache(volume="pip_cache", host_path=settings.PIP_CACHE_DIR, include=["wheels/**", "http/**", "http-v2/**"]),
+        HostCache(volume="poetry_cache", host_path=settings.POETRY_CACHE_DIR, include=["artifacts/**", "cache/**"]),
+    ]
+    return [host_cache for host_cache in host_caches if os.path.isdir(os.path.expanduser(host_cache.host_path))]
+
+
+def with_host_cache(client: Client, settings: GlobalSettings, host_cache: HostCache) -> Container:
+    volume_path = f"{CACHE_VOLUMES_MOUNT_PATH}/{host_cache.volume}"
+    host_directory = client.host().directory(os.path.expanduser(host_cache.host_path), include=host_cache.include)
+    return (
+        client.container()
+        .from_(pin_image(ALPINE_IMAGE, settings))
+        .with_mounted_directory(HOST_CACHE_MOUNT_PATH, host_directory)
+        .with_mounted_cache(volume_path, get_cache_volume(client, host_cache.volume, settings), sharing=CacheSharingMode.SHARED)
+        .with_workdir(volume_path)
+        # The volume may have changed since the last run, e.g. pruned
+        .with_env_variable("CACHEBUSTER", str(uuid.uuid4()))
+    )
+
+
+def get_seed_script(host_cache_path: str) -> str:
+    """A shell script copying the files of a host cache mounted at host_cache_path to the current directory.
+
+    Files missing from the current directory are copied, and the ones whose content differs from the host file are replaced,
+    e.g. an http cache entry the host tool refreshed. It prints the number of new files, then the number of refreshed files.
+    """
+    return (
+        f'cd "{host_cache_path}" && find . -type f | while IFS= read -r path; do '
+        'target="$OLDPWD/$path"; '
+        'if [ ! -e "$target" ]; then echo new; elif ! cmp -s "$path" "$target"; then echo refreshed; else continue; fi; '
+        # Replace the file atomically, other runs may read the volume meanwhile
+        'mkdir -p "$(dirname "$target")" && cp -p "$path" "$target.seed-$$" && mv -f "$target.seed-$$" "$target"; '
+        "done | sort | uniq -c | awk '{ counts[$2] = $1 } END { print counts[\"new\"] + 0, counts[\"refreshed\"] + 0 }'"
+    )
+
+
+async def seed_cache_volume(client: Client, settings: GlobalSettings, host_cache: HostCache) -> HostCacheReport:
+    """Copy the files of a host cache missing from its cache volume or stale in it, the other files of the volume are left untouched.
+
+    Files are compared by content, so that a host file refreshed under the same path replaces the stale copy of the volume.
+    The host cache is uploaded to the engine as a copy, the host files are never written.
+    """
+    start = time.monotonic()
+    seed_output = await with_host_cache(client, settings, host_cache).with_exec(["sh", "-c", get_seed_script(HOST_CACHE_MOUNT_PATH)]).stdout()
+    new_files, refreshed_files = (int(count) for count in seed_output.split())
+    return HostCacheReport(
+        volume=host_cache.volume, action="seeded", new_files=new_files, refreshed_files=refreshed_files, duration=time.monotonic() - start
+    )
+
+
+async def sync_cache_volume_to_host(client: Client, settings: GlobalSettings, host_cache: HostCache) -> HostCacheReport:
+    """Copy the files of a cache volume missing from its host cache back to the host, the host files are left untouched."""
+    start = time.monotonic()
+    copy_script = (
+        f"mkdir -p {SYNC_OUTPUT_PATH}; "
+        f"for dir in {' '.join(pattern.split('/')[0] for pattern in host_cache.include)}; do "
+        '[ -d "$dir" ] && find "$dir" -type f; '
+        "done | while IFS= read -r path; do "
+        f'[ -e "{HOST_CACHE_MOUNT_PATH}/$path" ] || {{ mkdir -p "{SYNC_OUTPUT_PATH}/$(dirname "$path")" && cp -p "$path" "{SYNC_OUTPUT_PATH}/$path"; }}; '
+        "done"
+    )
+    new_files = with_host_cache(client, settings, host_cache).with_exec(["sh", "-c", copy_script]).directory(SYNC_OUTPUT_PATH)
+    host_path = os.path.expanduser(host_cache.host_path)
+    synced = 0
+    with tempfile.TemporaryDirectory() as export_dir:
+        await new_files.export(export_dir)
+        for dirpath, _, filenames in os.walk(export_dir):
+            for filename in filenames:
+                target_path = os.path.join(host_path, os.path.relpath(os.path.join(dirpath, filename), export_dir))
+                # The host tool may have written the same file in the meantime, it wins
+                if not os.path.exists(target_path):
+                    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                    shutil.move(os.path.join(dirpath, filename), target_path)
+                    synced += 1
+    return HostCacheReport(volume=host_cache.volume, action="synced", new_files=synced, duration=time.monotonic() - start)
+
+
+async def seed_cache_volumes_from_host(client: Client, settings: GlobalSettings) -> List[HostCacheReport]:
+    """Seed the pip and poetry cache volumes from the host caches once per session, if settings.SEED_FROM_HOST_CACHES is set.
+
+    Run it before building the environments of with_python_base and with_poetry, which mount these volumes.
+    """
+    if not settings.SEED_FROM_HOST_CACHES:
+        return []
+    reports = []
+    for host_cache in get_host_caches(settings):
+        if host_cache.volume in _seeded_volumes:
+            continue
+        report = await seed_cache_volume(client, settings, host_cache)
+        _seeded_volumes.add(host_cache.volume)
+        print(report)
+        reports.append(report)
+    return reports
+
+
+async def sync_cache_volumes_to_host(client: Client, settings: GlobalSettings) -> List[HostCacheReport]:
+    """Sync the new artifacts of the pip and poetry cache volumes back to the host caches, if settings.SYNC_TO_HOST_CACHES is set."""
+    if not settings.SYNC_TO_HOST_CACHES:
+        return []
+    reports = []
+    for host_cache in get_host_caches(settings):
+        report = await sync_cache_volume_to_host(client, settings, host_cache)
+        print(report)
+        reports.append(report)
+    return reports
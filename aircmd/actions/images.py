@@ -0,0 +1,67 @@
+"""Pin the base images of the environments to digests, so that builds skip tag resolution and do not drift when a tag moves."""
+
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..models.docker import ImageLock
+from ..models.settings import GlobalSettings
+from .constants import ALPINE_IMAGE, AWS_CLI_IMAGE, CRANE_DEBUG_IMAGE, GHA_NODE_VERSION, OPENJDK_IMAGE, PYTHON_IMAGE
+
+# Lockfiles read during the session, keyed by path and modification time
+_image_locks: Dict[Tuple[str, int], ImageLock] = {}
+
+
+def get_base_images(settings: GlobalSettings, plugins: Optional[Iterable[Any]] = None) -> List[str]:
+    """The base images used by the environment builders, followed by the ones declared by the plugins in their base_images.
+
+    Args:
+        settings (GlobalSettings): The global settings object, some base images are configurable.
+        plugins (Optional[Iterable[Any]], optional): The loaded plugins. Defaults to None.
+
+    Returns:
+        List[str]: The deduplicated image references.
+    """
+    images = [
+        PYTHON_IMAGE,
+        OPENJDK_IMAGE,
+        ALPINE_IMAGE,
+        AWS_CLI_IMAGE,
+        CRANE_DEBUG_IMAGE,
+        f"node:{GHA_NODE_VERSION}",
+        settings.DOCKER_DIND_IMAGE,
+        settings.DOCKER_CLI_IMAGE,
+        settings.REGISTRY_MIRROR_IMAGE,
+    ]
+    for plugin in plugins or []:
+        images += getattr(plugin, "base_images", [])
+    return list(dict.fromkeys(images))
+
+
+def load_image_lock(lockfile_path: str) -> ImageLock:
+    """Read an image lockfile, an empty lock if it does not exist."""
+    if not os.path.isfile(lockfile_path):
+        return ImageLock()
+    key = (os.path.abspath(lockfile_path), os.stat(lockfile_path).st_mtime_ns)
+    if key not in _image_locks:
+        _image_locks[key] = ImageLock.parse_file(lockfile_path)
+    return _image_locks[key]
+
+
+def write_image_lock(lockfile_path: str, image_lock: ImageLock) -> None:
+    """Write an image lockfile, with sorted keys so that updates produce small diffs."""
+    with open(lockfile_path, "w") as f:
+        f.write(image_lock.json(indent=2, sort_keys=True) + "\n")
+
+
+def pin_image(image: str, settings: Optional[GlobalSettings] = None) -> str:
+    """The image reference pinned to the digest locked for it in settings.IMAGES_LOCKFILE, the reference itself if it is not locked.
+
+    Args:
+        image (str): The image reference, e.g. python:3.11-slim.
+        settings (Optional[GlobalSettings], optional): The global settings object, locating the lockfile. Defaults to the global settings.
+
+    Returns:
+        str: The image reference to pass to from_, e.g. python:3.11-slim@sha256:...
+    """
+    settings = settings or GlobalSettings()
+    return load_image_lock(settings.IMAGES_LOCKFILE).pin(image)
@@ -0,0 +1,112 @@
+"""Python installer backends used by the environment builders to install packages in containers."""
+
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Type
+
+from dagger import CacheSharingMode, Client, Container
+
+from ..models.settings import GlobalSettings
+from .cache_volumes import get_cache_volume
+
+PIP_CACHE_PATH = "/root/.cache/pip"
+UV_CACHE_PATH = "/root/.cache/uv"
+WHEELHOUSE_PATH = "/root/wheelhouse"
+
+
+class PythonInstaller(ABC):
+    """An installer backend: how a python container gets bootstrapped and how packages get installed in it."""
+
+    name: str
+
+    def __init__(self, settings: GlobalSettings) -> None:
+        self.settings = settings
+
+    @abstractmethod
+    def bootstrap(self, client: Client) -> Callable[[Container], Container]:
+        """Mount the installer wheel cache volume and install the pinned installer in a python container."""
+
+    @abstractmethod
+    def install_command(self, args: List[str], no_deps: bool = False, reinstall: bool = False) -> List[str]:
+        """Build the command installing the given requirements, `pip install` style arguments."""
+
+
+class PipInstaller(PythonInstaller):
+    name = "pip"
+
+    def bootstrap(self, client: Client) -> Callable[[Container], Container]:
+        def bootstrap_pip(ctr: Container) -> Container:
+            return (
+                ctr.with_mounted_cache(PIP_CACHE_PATH, get_cache_volume(client, "pip_cache", self.settings), sharing=CacheSharingMode.SHARED)
+                .with_exec(["pip", "install", f"pip=={self.settings.PIP_VERSION}"])
+            )
+        return bootstrap_pip
+
+    def install_command(self, args: List[str], no_deps: bool = False, reinstall: bool = False) -> List[str]:
+        command = ["python", "-m", "pip", "install"]
+        if no_deps:
+            command.append("--no-deps")
+        if reinstall:
+            command.append("--force-reinstall")
+        return command + args
+
+
+class UvInstaller(PythonInstaller):
+    name = "uv"
+
+    def bootstrap(self, client: Client) -> Callable[[Container], Container]:
+        def bootstrap_uv(ctr: Container) -> Container:
+            return (
+                ctr.with_mounted_cache(PIP_CACHE_PATH, get_cache_volume(client, "pip_cache", self.settings), sharing=CacheSharingMode.SHARED)
+                .with_exec(["pip", "install", f"uv=={self.settings.UV_VERSION}"])
+                .with_mounted_cache(UV_CACHE_PATH, get_cache_volume(client, "uv_cache", self.settings), sharing=CacheSharingMode.SHARED)
+                .with_env_variable("UV_CACHE_DIR", UV_CACHE_PATH)
+                # The cache volume is a different filesystem than site-packages, so hardlinks are not an option
+                .with_env_variable("UV_LINK_MODE", "copy")
+            )
+        return bootstrap_uv
+
+    def install_command(self, args: List[str], no_deps: bool = False, reinstall: bool = False) -> List[str]:
+        command = ["uv", "pip", "install", "--system"]
+        if no_deps:
+            command.append("--no-deps")
+        if reinstall:
+            command.append("--reinstall")
+        return command + args
+
+
+class OfflineWheelInstaller(PipInstaller):
+    """Install from a wheelhouse cache volume only, never reaching a package index.
+
+    The wheelhouse is filled ahead of time, e.g. with `pip wheel --wheel-dir /root/wheelhouse` in a container using the online backends.
+    """
+
+    name = "wheel-offline"
+
+    def bootstrap(self, client: Client) -> Callable[[Container], Container]:
+        def bootstrap_offline(ctr: Container) -> Container:
+            return (
+                ctr.with_mounted_cache(PIP_CACHE_PATH, get_cache_volume(client, "pip_cache", self.settings), sharing=CacheSharingMode.SHARED)
+                .with_mounted_cache(WHEELHOUSE_PATH, get_cache_volume(client, "wheelhouse", self.settings), sharing=CacheSharingMode.SHARED)
+                # Environment variables so that any pip call in the container, including build isolation, stays offline
+                .with_env_variable("PIP_NO_INDEX", "1")
+                .with_env_variable("PIP_FIND_LINKS", WHEELHOUSE_PATH)
+            )
+        return bootstrap_offline
+
+
+PYTHON_INSTALLERS: Dict[str, Type[PythonInstaller]] = {
+    PipInstaller.name: PipInstaller,
+    UvInstaller.name: UvInstaller,
+    OfflineWheelInstaller.name: OfflineWheelInstaller,
+}
+
+
+def get_python_installer(settings: GlobalSettings) -> PythonInstaller:
+    """Get the installer backend selected by settings.PYTHON_INSTALLER.
+
+    Raises:
+        ValueError: Raised if the selected installer is unknown.
+    """
+    if settings.PYTHON_INSTALLER not in PYTHON_INSTALLERS:
+        raise ValueError(f"Unknown python installer {settings.PYTHON_INSTALLER}, pick one of {', '.join(PYTHON_INSTALLERS)}")
+    return PYTHON_INSTALLERS[settings.PYTHON_INSTALLER](settings)
@@ -1,38 +1,43 @@
-from typing import Callable, List, Optional
+import os
+import tempfile
+from typing import AsyncIterator, Callable, Dict, List, Optional
 
 from dagger import Client, Container, Directory, QueryError
 
 from ..models.settings import GlobalSettings
+from .gittree import export_git_tree
+from .uploads import UploadPlanner, normalize_pattern
 
 
 def get_repo_dir(client: Client, settings: GlobalSettings, subdir: str = ".", exclude: Optional[List[str]] = None, include: Optional[List[str]] = None) -> Directory:
 
     """Get a directory from the current repository.
 
-    If running in the CI:
-    The directory is extracted from the git branch.
+    If SOURCE_MODE is "git":
+    The directory is extracted from the git tree at GIT_CURRENT_REVISION (LAST_COMMIT_SHA if set, HEAD otherwise),
+    so only committed content is uploaded and unchanged subtrees produce identical inputs across runs and runners.
 
-    If running locally:
+    If SOURCE_MODE is "host", the default:
     The directory is extracted from your host file system.
-    A couple of files or directories that could corrupt builds are exclude by default (check DEFAULT_EXCLUDED_FILES).
+    A couple of files or directories that could corrupt builds are exclude by default (check DEFAULT_EXCLUDED_FILES),
+    as well as the files ignored by .gitignore rules unless they are explicitly included (check UPLOAD_RESPECT_GITIGNORE).
+    The size of each upload is reported and identical uploads are only made once per session (check UploadPlanner).
 
     Args:
         subdir (str, optional): Path to the subdirectory to get. Defaults to "." to get the full repository.
-        exclude ([List[str], optional): List of files or directories to exclude from the directory. Defaults to None.
-        include ([List[str], optional): List of files or directories to include in the directory. Defaults to None.
+        exclude ([List[str], optional): List of files or directories to exclude from the directory, relative to the repository. Defaults to None.
+        include ([List[str], optional): List of files or directories to include in the directory, relative to subdir. Defaults to None.
 
     Returns:
         Directory: The selected repo directory.
     """
-    if exclude is None:
-        exclude = settings.DEFAULT_EXCLUDED_FILES
-    else:
-        exclude += settings.DEFAULT_EXCLUDED_FILES
-        exclude = list(set(exclude))
-    if subdir != ".":
-        subdir = f"{subdir}/" if not subdir.endswith("/") else subdir
-        exclude = [f.replace(subdir, "") for f in exclude if subdir in f]
-    return client.host().directory(subdir, exclude=exclude, include=include)
+    exclude = list(dict.fromkeys((exclude or []) + settings.DEFAULT_EXCLUDED_FILES))
+    if settings.SOURCE_MODE == "git":
+        export = export_git_tree(settings.GIT_REPO_ROOT_PATH, settings.GIT_CURRENT_REVISION, subdir, exclude, include, settings.CACHE_DIR)
+        return UploadPlanner().upload(client, export.path, exclude=[], respect_gitignore=False)
+    if settings.SOURCE_MODE != "host":
+        raise ValueError(f"Unknown source mode {settings.SOURCE_MODE}, pick one of host, git")
+    return UploadPlanner().upload(client, subdir, exclude, include, respect_gitignore=settings.UPLOAD_RESPECT_GITIGNORE)
 
 async def get_file_contents(container: Container, path: str) -> Optional[str]:
     """Retrieve a container file contents.
@@ -43,6 +48,8 @@ async def get_file_contents(container: Container, path: str) -> Optional[str]:
 
     Returns:
         Optional[str]: The file content if the file exists in the container, None otherwise.
+
+    Reading several files this way costs a round trip each, prefer get_files_contents.
     """
     try:
         return await container.file(path).contents()
@@ -53,6 +60,62 @@ async def get_file_contents(container: Container, path: str) -> Optional[str]:
             raise
     return None
 
+async def get_files_contents(client: Client, container: Container, paths: List[str], directory: str = ".") -> Dict[str, Optional[str]]:
+    """Retrieve the contents of several container files in a single engine round trip.
+
+    The requested files are copied to a filtered directory which is exported to the host at once,
+    so missing files are simply absent from the export and no error has to be inspected.
+
+    Args:
+        client (Client): The dagger client.
+        container (Container): The container hosting the files you want to read.
+        paths (List[str]): Paths of the files to read, relative to directory.
+        directory (str, optional): The container directory the paths are relative to. Defaults to "." for the container workdir.
+
+    Returns:
+        Dict[str, Optional[str]]: The content of each requested path, None if the file does not exist in the container.
+    """
+    paths = list(dict.fromkeys(normalize_pattern(path) for path in paths))
+    filtered_directory = client.directory().with_directory(".", container.directory(directory), include=paths)
+    with tempfile.TemporaryDirectory() as export_dir:
+        await filtered_directory.export(export_dir)
+        contents: Dict[str, Optional[str]] = {}
+        for path in paths:
+            exported_path = os.path.join(export_dir, path)
+            if os.path.isfile(exported_path):
+                with open(exported_path) as f:
+                    contents[path] = f.read()
+            else:
+                contents[path] = None
+    return contents
+
+async def stream_file_contents(client: Client, container: Container, path: str, directory: str = ".", chunk_size: int = 1024 * 1024) -> AsyncIterator[bytes]:
+    """Stream the content of a large container file by chunks, without loading it in memory.
+
+    Args:
+        client (Client): The dagger client.
+        container (Container): The container hosting the file you want to read.
+        path (str): Path of the file to read, relative to directory.
+        directory (str, optional): The container directory the path is relative to. Defaults to "." for the container workdir.
+        chunk_size (int, optional): The size of the yielded chunks, in bytes. Defaults to 1MiB.
+
+    Raises:
+        FileNotFoundError: Raised if the file does not exist in the container.
+
+    Yields:
+        bytes: The successive chunks of the file content.
+    """
+    path = normalize_pattern(path)
+    filtered_directory = client.directory().with_directory(".", container.directory(directory), include=[path])
+    with tempfile.TemporaryDirectory() as export_dir:
+        await filtered_directory.export(export_dir)
+        exported_path = os.path.join(export_dir, path)
+        if not os.path.isfile(exported_path):
+            raise FileNotFoundError(f"{path} does not exist in {directory} of the container")
+        with open(exported_path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
 def sync_from_gradle_cache_to_homedir(cache_volume_location: str, gradle_home_dir: str) -> Callable[[Container], Container]:
     def sync_cache(ctr: Container) -> Container:
         ctr = ctr.with_exec(["ls", "-la", cache_volume_location])
@@ -0,0 +1,110 @@
+"""Inspect container registries in bulk: many digests, tag lists and manifests resolved by a single crane container."""
+
+import shlex
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from dagger import Client
+
+from ..models.docker import RegistryQuery, RegistryResult
+from ..models.settings import GlobalSettings
+from .environments import with_crane
+from .pipelines import get_files_contents
+
+CRANE_COMMANDS = {
+    "digest": "crane digest",
+    "tags": "crane ls",
+    "manifest": "crane manifest",
+}
+
+# Results fetched during the session, shared by all the inspectors
+_registry_results: Dict[RegistryQuery, RegistryResult] = {}
+
+
+def get_inspection_script(queries: List[RegistryQuery], parallelism: int, output_dir: str = "/out") -> str:
+    """Build the shell script running the crane commands of the queries, parallelism at a time.
+
+    The output, errors and exit code of the i-th query are written to i.out, i.err and i.status in output_dir.
+    """
+    lines = [f"mkdir -p {output_dir}"]
+    for index, query in enumerate(queries):
+        command = f"{CRANE_COMMANDS[query.kind]} {shlex.quote(query.reference)}"
+        output = f"{output_dir}/{index}"
+        lines.append(f"({command} > {output}.out 2> {output}.err; echo $? > {output}.status) &")
+        if (index + 1) % parallelism == 0:
+            lines.append("wait")
+    lines.append("wait")
+    return "\n".join(lines)
+
+
+class RegistryInspector:
+    """Resolve registry queries in bulk, in parallel inside a single crane container, caching the results for the session.
+
+    Args:
+        client (Client): The dagger client.
+        settings (GlobalSettings): The global settings object, with the registry credentials.
+        ttl (Optional[int], optional): How long results are reused, in seconds. Defaults to settings.REGISTRY_INSPECTION_TTL.
+        parallelism (Optional[int], optional): How many crane commands run at once. Defaults to settings.REGISTRY_INSPECTION_PARALLELISM.
+    """
+
+    def __init__(self, client: Client, settings: GlobalSettings, ttl: Optional[int] = None, parallelism: Optional[int] = None) -> None:
+        self.client = client
+        self.settings = settings
+        self.ttl = ttl if ttl is not None else settings.REGISTRY_INSPECTION_TTL
+        self.parallelism = parallelism or settings.REGISTRY_INSPECTION_PARALLELISM
+
+    def _get_cached(self, query: RegistryQuery) -> Optional[RegistryResult]:
+        result = _registry_results.get(query)
+        if result is not None and time.time() - result.fetched_at < self.ttl:
+            return result
+        return None
+
+    async def inspect(self, queries: List[RegistryQuery]) -> Dict[RegistryQuery, RegistryResult]:
+        """Resolve registry queries, only running the ones without a fresh cached result.
+
+        Args:
+            queries (List[RegistryQuery]): The queries to resolve.
+
+        Returns:
+            Dict[RegistryQuery, RegistryResult]: The result of each query, failed queries hold the crane error.
+        """
+        queries = list(dict.fromkeys(queries))
+        results = {query: result for query in queries if (result := self._get_cached(query)) is not None}
+        to_fetch = [query for query in queries if query not in results]
+        if not to_fetch:
+            return results
+
+        output_dir = "/out"
+        crane = (
+            with_crane(self.client, self.settings)
+            # Registries change between runs, the inspection must never be cached
+            .with_env_variable("CACHEBUSTER", str(uuid.uuid4()))
+            .with_exec(["sh", "-c", get_inspection_script(to_fetch, self.parallelism, output_dir)], skip_entrypoint=True)
+        )
+        paths = [f"{index}.{extension}" for index in range(len(to_fetch)) for extension in ("out", "err", "status")]
+        outputs = await get_files_contents(self.client, crane, paths, directory=output_dir)
+        fetched_at = time.time()
+        for index, query in enumerate(to_fetch):
+            status = (outputs[f"{index}.status"] or "1").strip()
+            if status == "0":
+                result = RegistryResult(query=query, output=outputs[f"{index}.out"], fetched_at=fetched_at)
+            else:
+                result = RegistryResult(query=query, error=(outputs[f"{index}.err"] or "").strip() or f"crane exited with {status}", fetched_at=fetched_at)
+            _registry_results[query] = results[query] = result
+        return results
+
+    async def get_digests(self, references: List[str]) -> Dict[str, Optional[str]]:
+        """Resolve image references to their digests, None for the references that do not exist or failed."""
+        results = await self.inspect([RegistryQuery(kind="digest", reference=reference) for reference in references])
+        return {query.reference: result.digest for query, result in results.items()}
+
+    async def list_tags(self, repositories: List[str]) -> Dict[str, List[str]]:
+        """List the tags of image repositories, an empty list for the repositories that do not exist or failed."""
+        results = await self.inspect([RegistryQuery(kind="tags", reference=repository) for repository in repositories])
+        return {query.reference: result.tags for query, result in results.items()}
+
+    async def get_manifests(self, references: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Fetch the manifests of image references, None for the references that do not exist or failed."""
+        results = await self.inspect([RegistryQuery(kind="manifest", reference=reference) for reference in references])
+        return {query.reference: result.manifest for query, result in results.items()}
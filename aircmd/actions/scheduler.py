@@ -0,0 +1,204 @@
+"""Share the runner CPU and memory between the heavy container steps of all the flows and plugins running in the process."""
+
+import asyncio
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Deque, List, Optional, Set, Tuple
+
+from dagger import Container
+from pydantic import BaseModel
+
+from ..models.settings import GlobalSettings
+from ..models.singleton import Singleton
+
+
+class ResourceRequest(BaseModel):
+    """The share of the runner a step needs while it runs."""
+
+    cpus: float = 1
+    memory_mb: int = 0
+
+    def fits(self, used: "ResourceRequest", capacity: "ResourceRequest") -> bool:
+        return used.cpus + self.cpus <= capacity.cpus and used.memory_mb + self.memory_mb <= capacity.memory_mb
+
+    def clamp(self, capacity: "ResourceRequest") -> "ResourceRequest":
+        """The request reduced to the capacity, so that a step bigger than the runner still runs, alone."""
+        return ResourceRequest(cpus=min(self.cpus, capacity.cpus), memory_mb=min(self.memory_mb, capacity.memory_mb))
+
+
+GRADLE_RESOURCES = ResourceRequest(cpus=4, memory_mb=4096)
+DOCKERD_RESOURCES = ResourceRequest(cpus=2, memory_mb=2048)
+PYTHON_INSTALL_RESOURCES = ResourceRequest(cpus=1, memory_mb=1024)
+ZERO_RESOURCES = ResourceRequest(cpus=0, memory_mb=0)
+
+
+def _add(left: ResourceRequest, right: ResourceRequest) -> ResourceRequest:
+    return ResourceRequest(cpus=left.cpus + right.cpus, memory_mb=left.memory_mb + right.memory_mb)
+
+
+def _subtract(left: ResourceRequest, right: ResourceRequest) -> ResourceRequest:
+    return ResourceRequest(cpus=max(0.0, left.cpus - right.cpus), memory_mb=max(0, left.memory_mb - right.memory_mb))
+
+
+class Lease:
+    """The resources granted to a slot: borrowed from the slot it is nested in, and reserved from the runner capacity for the rest.
+
+    The resources of a lease are lent to the slots nested in it, those of all its child tasks together.
+    """
+
+    def __init__(self, request: ResourceRequest, borrowed: ResourceRequest, reserved: ResourceRequest, parent: Optional["Lease"] = None) -> None:
+        self.request = request
+        self.borrowed = borrowed
+        self.reserved = reserved
+        self.parent = parent
+        self.lent = ZERO_RESOURCES
+
+    @property
+    def available(self) -> ResourceRequest:
+        """The resources of the lease not lent to nested slots."""
+        return _subtract(self.request, self.lent)
+
+
+# The lease of the innermost slot of the current task, inherited by the tasks it spawns
+_current_lease: ContextVar[Optional[Lease]] = ContextVar("current_lease", default=None)
+
+
+def get_host_capacity() -> ResourceRequest:
+    """The cores and physical memory of the host."""
+    try:
+        memory_mb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        # Unknown memory size, only schedule on cores
+        memory_mb = 2**31
+    return ResourceRequest(cpus=os.cpu_count() or 1, memory_mb=memory_mb)
+
+
+class ResourceScheduler(Singleton):
+    """Grant weighted slots of the runner capacity to heavy steps, first come first served.
+
+    The capacity is settings.SCHEDULER_CPUS cores and settings.SCHEDULER_MEMORY_MB of memory, each defaulting to the host's.
+    Slots are reentrant: a slot taken inside another one first borrows the resources the outer slot has not lent yet,
+    and only reserves the rest, e.g. a gradle slot inside a dockerd lease reserves 2 more cores, not 4.
+    Sibling tasks share the lease they inherit, so that once it is lent out their nested slots wait for capacity like any other.
+    """
+
+    def __init__(self, settings: Optional[GlobalSettings] = None) -> None:
+        if not Singleton._initialized[ResourceScheduler]:
+            settings = settings or GlobalSettings()
+            host_capacity = get_host_capacity()
+            self.capacity = ResourceRequest(
+                cpus=settings.SCHEDULER_CPUS or host_capacity.cpus,
+                memory_mb=settings.SCHEDULER_MEMORY_MB or host_capacity.memory_mb,
+            )
+            self.used = ZERO_RESOURCES
+            # Tickets of the outermost requests waiting for capacity, granted in order
+            self._queue: Deque[int] = deque()
+            # Tickets of the nested requests waiting for capacity, with the lease they are nested in
+            self._nested_queue: List[Tuple[int, Lease]] = []
+            self._next_ticket = 0
+            self._granted: Set[Lease] = set()
+            self._condition: Optional[asyncio.Condition] = None
+            self._loop: Optional[asyncio.AbstractEventLoop] = None
+            Singleton._initialized[ResourceScheduler] = True
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        # asyncio primitives are bound to the event loop they are first used in
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._loop is not loop:
+            self._condition = asyncio.Condition()
+            self._loop = loop
+        return self._condition
+
+    def _is_deadlocked(self) -> bool:
+        """Whether every granted lease waits, directly or through a nested slot, for a nested slot.
+
+        No lease can be released then, the oldest nested request goes through over capacity.
+        """
+        waiting: Set[Lease] = set()
+        for _, lease in self._nested_queue:
+            ancestor: Optional[Lease] = lease
+            while ancestor is not None and ancestor not in waiting:
+                waiting.add(ancestor)
+                ancestor = ancestor.parent
+        return bool(self._nested_queue) and self._granted <= waiting
+
+    async def acquire(self, request: ResourceRequest, parent: Optional[Lease] = None) -> Lease:
+        """Wait until the request fits in the unused capacity and reserve it.
+
+        Args:
+            request (ResourceRequest): The resources the step needs.
+            parent (Optional[Lease], optional): The lease of the slot the step is nested in, its available resources are borrowed first.
+                Defaults to None for an outermost slot.
+
+        Returns:
+            Lease: The granted resources, to release once the step is done.
+        """
+        request = request.clamp(self.capacity)
+
+        def split() -> Tuple[ResourceRequest, ResourceRequest]:
+            if parent is None:
+                return ZERO_RESOURCES, request
+            available = parent.available
+            borrowed = ResourceRequest(cpus=min(request.cpus, available.cpus), memory_mb=min(request.memory_mb, available.memory_mb))
+            return borrowed, _subtract(request, borrowed)
+
+        async with self.condition:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            if parent is not None:
+                # Nested requests skip the outermost queue, their task is holding capacity already
+                self._nested_queue.append((ticket, parent))
+                # The waiters nested in the other leases may be deadlocked now
+                self.condition.notify_all()
+                try:
+                    await self.condition.wait_for(
+                        lambda: split()[1].fits(self.used, self.capacity) or (self._is_deadlocked() and self._nested_queue[0][0] == ticket)
+                    )
+                finally:
+                    self._nested_queue.remove((ticket, parent))
+                    self.condition.notify_all()
+            else:
+                self._queue.append(ticket)
+                try:
+                    await self.condition.wait_for(lambda: self._queue[0] == ticket and request.fits(self.used, self.capacity))
+                finally:
+                    self._queue.remove(ticket)
+                    # The next ticket may fit already
+                    self.condition.notify_all()
+            borrowed, reserved = split()
+            if parent is not None:
+                parent.lent = _add(parent.lent, borrowed)
+            self.used = _add(self.used, reserved)
+            lease = Lease(request, borrowed, reserved, parent)
+            self._granted.add(lease)
+        return lease
+
+    async def release(self, lease: Lease) -> None:
+        async with self.condition:
+            self.used = _subtract(self.used, lease.reserved)
+            if lease.parent is not None:
+                lease.parent.lent = _subtract(lease.parent.lent, lease.borrowed)
+            self._granted.discard(lease)
+            self.condition.notify_all()
+
+    @asynccontextmanager
+    async def slot(self, request: ResourceRequest) -> AsyncIterator[ResourceRequest]:
+        """Hold a slot of the runner capacity for the duration of the block, yielding the resources reserved from the capacity."""
+        lease = await self.acquire(request, _current_lease.get())
+        token = _current_lease.set(lease)
+        try:
+            yield lease.reserved
+        finally:
+            _current_lease.reset(token)
+            await self.release(lease)
+
+    async def sync(self, container: Container, request: ResourceRequest) -> Container:
+        """Run the pending execs of a container in a slot of the runner capacity.
+
+        Builders are lazy, this is where their heavy execs actually run, e.g. `await ResourceScheduler().sync(gradle, GRADLE_RESOURCES)`.
+        """
+        async with self.slot(request):
+            return await container.sync()
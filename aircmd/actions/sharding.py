@@ -0,0 +1,166 @@
+"""Split test modules into shards of balanced duration, and merge the JUnit reports of the shards into one."""
+
+import ast
+import os
+import tempfile
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional
+
+from dagger import Client, Container
+from pydantic import BaseModel
+
+from .pipelines import get_files_contents
+
+JUNIT_COUNTERS = ["tests", "failures", "errors", "skipped"]
+SHARD_OUTPUT_DIR = "/tmp/pytest-shard"
+
+
+class TestTimings(BaseModel):
+    """The durations of the test modules recorded in previous runs, in seconds."""
+
+    __test__ = False
+
+    durations: Dict[str, float] = {}
+
+    @classmethod
+    def load(cls, path: str) -> "TestTimings":
+        return cls.parse_file(path) if os.path.isfile(path) else cls()
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(path), delete=False) as f:
+            f.write(self.json(indent=2, sort_keys=True))
+        os.replace(f.name, path)
+
+    def update(self, durations: Dict[str, float]) -> "TestTimings":
+        return TestTimings(durations={**self.durations, **durations})
+
+
+def count_tests(path: str) -> int:
+    """The number of test functions of a test module, at least 1."""
+    with open(path, "rb") as f:
+        tree = ast.parse(f.read(), filename=path)
+    return max(1, sum(1 for node in ast.walk(tree) if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test")))
+
+
+def get_test_weights(test_files: List[str], timings: TestTimings) -> Dict[str, float]:
+    """The expected duration of each test module.
+
+    Modules without recorded timings are weighted by their number of tests, times the mean recorded duration of a test.
+    """
+    weights: Dict[str, float] = {path: timings.durations[path] for path in test_files if path in timings.durations}
+    counts = {path: count_tests(path) for path in test_files}
+    recorded_tests = sum(counts[path] for path in weights)
+    recorded_seconds = sum(weights.values(), 0.0)
+    seconds_per_test = recorded_seconds / recorded_tests if recorded_tests and recorded_seconds else 1.0
+    for path in test_files:
+        weights.setdefault(path, counts[path] * seconds_per_test)
+    return weights
+
+
+def shard_tests(test_files: List[str], shard_count: int, timings: Optional[TestTimings] = None) -> List[List[str]]:
+    """Split test modules into shards of balanced expected duration, longest modules first to the least loaded shard.
+
+    Args:
+        test_files (List[str]): The test modules, relative to the current working directory.
+        shard_count (int): The number of shards, at most one per module.
+        timings (Optional[TestTimings], optional): The durations recorded in previous runs. Defaults to None.
+
+    Returns:
+        List[List[str]]: The sorted test modules of each shard.
+    """
+    weights = get_test_weights(test_files, timings or TestTimings())
+    shards: List[List[str]] = [[] for _ in range(max(1, min(shard_count, len(test_files))))]
+    loads = [0.0] * len(shards)
+    for path in sorted(test_files, key=lambda p: (-weights[p], p)):
+        index = loads.index(min(loads))
+        shards[index].append(path)
+        loads[index] += weights[path]
+    return [sorted(shard) for shard in shards if shard]
+
+
+def get_junit_durations(junit_xml: str, test_files: List[str]) -> Dict[str, float]:
+    """Sum the durations of the test cases of a JUnit report per test module.
+
+    pytest reports the module of a test case as its dotted classname, e.g. tests.test_graph or tests.test_graph.TestClass.
+    """
+    modules = {os.path.splitext(path)[0].replace(os.sep, "."): path for path in test_files}
+    durations: Dict[str, float] = {}
+    for testcase in ET.fromstring(junit_xml).iter("testcase"):
+        parts = testcase.get("classname", "").split(".")
+        for depth in range(len(parts), 0, -1):
+            path = modules.get(".".join(parts[:depth]))
+            if path is not None:
+                durations[path] = durations.get(path, 0.0) + float(testcase.get("time", 0) or 0)
+                break
+    return durations
+
+
+def merge_junit_reports(junit_xmls: List[str], name: str = "pytest") -> str:
+    """Merge the JUnit reports of the shards into a single report, with the summed counters and durations."""
+    merged = ET.Element("testsuites", name=name)
+    totals = {counter: 0 for counter in JUNIT_COUNTERS}
+    total_time = 0.0
+    for junit_xml in junit_xmls:
+        root = ET.fromstring(junit_xml)
+        for testsuite in [root] if root.tag == "testsuite" else root.iter("testsuite"):
+            merged.append(testsuite)
+            for counter in JUNIT_COUNTERS:
+                totals[counter] += int(testsuite.get(counter, 0))
+            total_time += float(testsuite.get("time", 0) or 0)
+    for counter, total in totals.items():
+        merged.set(counter, str(total))
+    merged.set("time", f"{total_time:.3f}")
+    return ET.tostring(merged, encoding="unicode", xml_declaration=True)
+
+
+class ShardResult(BaseModel):
+    index: int
+    test_files: List[str]
+    exit_code: int
+    junit_xml: Optional[str] = None
+    duration: float
+
+    @property
+    def passed(self) -> bool:
+        # pytest exits with 5 when no test got collected, e.g. a shard of modules without tests
+        return self.exit_code in (0, 5)
+
+    def __str__(self) -> str:
+        status = "passed" if self.passed else f"failed with exit code {self.exit_code}"
+        return f"Test shard {self.index}: {len(self.test_files)} modules {status} in {self.duration:.1f}s"
+
+
+async def run_pytest_shard(
+    client: Client, environment: Container, index: int, test_files: List[str], pytest_command: Optional[List[str]] = None
+) -> ShardResult:
+    """Run a shard of test modules in its own container, on top of an environment with the tests installed.
+
+    Args:
+        client (Client): The dagger client.
+        environment (Container): The installed test environment, shared by all the shards.
+        index (int): The index of the shard, for reporting.
+        test_files (List[str]): The test modules of the shard, relative to the environment workdir.
+        pytest_command (List[str], optional): The command running pytest, e.g. ["poetry", "run", "pytest"]. Defaults to ["pytest"].
+
+    Returns:
+        ShardResult: The exit code and JUnit report of the shard.
+    """
+    start = time.monotonic()
+    # The exec always succeeds, the engine would otherwise cache failed and flaky runs and replay them on reruns of the same inputs
+    shard = environment.with_env_variable("CACHEBUSTER", str(uuid.uuid4())).with_exec(
+        # pytest failures must not fail the exec, so that the reports of all the shards can be read and merged
+        ["sh", "-c", f'mkdir -p {SHARD_OUTPUT_DIR}; "$@" --junitxml={SHARD_OUTPUT_DIR}/junit.xml; echo $? > {SHARD_OUTPUT_DIR}/exit-code', "sh"]
+        + (pytest_command or ["pytest"])
+        + test_files
+    )
+    outputs = await get_files_contents(client, shard, ["exit-code", "junit.xml"], directory=SHARD_OUTPUT_DIR)
+    return ShardResult(
+        index=index,
+        test_files=test_files,
+        exit_code=int((outputs["exit-code"] or "1").strip()),
+        junit_xml=outputs["junit.xml"],
+        duration=time.monotonic() - start,
+    )
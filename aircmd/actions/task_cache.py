@@ -0,0 +1,118 @@
+"""Record the outcome of tasks keyed by a hash of their inputs, so that reruns on an unchanged tree skip them."""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from ..models.settings import GlobalSettings
+from .images import pin_image
+from .uploads import UploadPlanner
+
+
+class TaskInputs(BaseModel):
+    """The inputs a task result depends on."""
+
+    # Include patterns of the host files the task uploads, relative to the current working directory
+    host_paths: List[str] = []
+    # Names of the GlobalSettings fields the task reads
+    settings_fields: List[str] = []
+    # Base images of the task containers, hashed with their locked digests (check aircmd images lock)
+    images: List[str] = []
+    # Any other value the task depends on, e.g. a version
+    extra: Dict[str, str] = {}
+
+
+class TaskResult(BaseModel):
+    key: str
+    task_name: str
+    outcome: Any = None
+    recorded_at: float
+
+
+def get_task_cache_key(task_name: str, inputs: TaskInputs, settings: GlobalSettings) -> str:
+    """Hash the inputs of a task.
+
+    Args:
+        task_name (str): The name of the task, two tasks with the same inputs get different keys.
+        inputs (TaskInputs): The inputs the task declares.
+        settings (GlobalSettings): The global settings object, the declared fields are hashed with their values.
+
+    Returns:
+        str: The cache key of the task result.
+    """
+    key = hashlib.sha256(f"task:{task_name}\n".encode())
+    if inputs.host_paths:
+        host_manifest = UploadPlanner().plan(".", exclude=[], include=inputs.host_paths, respect_gitignore=False).manifest
+        key.update(f"host:{host_manifest.digest}\n".encode())
+    settings_values = settings.dict(include=set(inputs.settings_fields))
+    for field in sorted(inputs.settings_fields):
+        key.update(f"setting:{field}={json.dumps(settings_values.get(field), default=str)}\n".encode())
+    for image in sorted(inputs.images):
+        key.update(f"image:{pin_image(image, settings)}\n".encode())
+    for name, value in sorted(inputs.extra.items()):
+        key.update(f"extra:{name}={value}\n".encode())
+    return key.hexdigest()
+
+
+class TaskResultCache:
+    """Task outcomes recorded on the host, valid for expiration seconds.
+
+    Args:
+        root (str): The directory of the recorded results.
+        expiration (int): How long a recorded result is reused, in seconds.
+        enabled (bool, optional): Whether recorded results are reused, results are recorded either way. Defaults to True.
+    """
+
+    def __init__(self, root: str, expiration: int, enabled: bool = True) -> None:
+        self.root = root
+        self.expiration = expiration
+        self.enabled = enabled
+
+    @classmethod
+    def from_settings(cls, settings: GlobalSettings, use_cache: bool = True) -> "TaskResultCache":
+        return cls(os.path.join(settings.CACHE_DIR, "task-results"), settings.TASK_CACHE_EXPIRATION, use_cache)
+
+    def _result_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+
+    def _is_expired(self, result: TaskResult) -> bool:
+        return time.time() - result.recorded_at > self.expiration
+
+    def get(self, key: str) -> Optional[TaskResult]:
+        """The result recorded for a key, None if there is none, if it expired or if the cache is disabled."""
+        result_path = self._result_path(key)
+        if not self.enabled or not os.path.isfile(result_path):
+            return None
+        result = TaskResult.parse_file(result_path)
+        return None if self._is_expired(result) else result
+
+    def put(self, key: str, task_name: str, outcome: Any = None) -> TaskResult:
+        """Record the outcome of a successful task run, it must be JSON serializable."""
+        result = TaskResult(key=key, task_name=task_name, outcome=outcome, recorded_at=time.time())
+        os.makedirs(self.root, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=self.root, delete=False) as f:
+            f.write(result.json())
+        os.replace(f.name, self._result_path(key))
+        self.prune()
+        return result
+
+    def prune(self) -> List[str]:
+        """Remove the expired results.
+
+        Returns:
+            List[str]: The keys of the removed results.
+        """
+        pruned = []
+        for filename in os.listdir(self.root):
+            if not filename.endswith(".json"):
+                continue
+            result_path = os.path.join(self.root, filename)
+            if time.time() - os.path.getmtime(result_path) > self.expiration:
+                os.remove(result_path)
+                pruned.append(filename[: -len(".json")])
+        return pruned
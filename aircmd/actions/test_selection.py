@@ -0,0 +1,213 @@
+"""Select the test modules affected by the changes since a base ref, through the import graph of the package."""
+
+import ast
+import fnmatch
+import os
+from typing import Dict, Iterable, List, Optional, Set
+
+import pygit2  # type: ignore
+from pydantic import BaseModel
+
+from ..models.settings import GlobalSettings
+
+# Changes to these files can affect any test
+FULL_RUN_FILES = ["pyproject.toml", "poetry.lock", "setup.py", "setup.cfg", "requirements*.txt", "conftest.py", "pytest.ini", "tox.ini"]
+
+
+class TestSelection(BaseModel):
+    """The test modules to run, and why the others are skipped."""
+
+    __test__ = False
+
+    full_run: bool
+    reason: str
+    changed_files: List[str] = []
+    selected: List[str] = []
+    skipped: List[str] = []
+
+    def __str__(self) -> str:
+        if self.full_run:
+            return f"Running all the tests: {self.reason}"
+        report = [f"Running {len(self.selected)}/{len(self.selected) + len(self.skipped)} test modules: {self.reason}"]
+        report += [f"  run  {path}" for path in self.selected]
+        report += [f"  skip {path} (does not import any changed module)" for path in self.skipped]
+        return "\n".join(report)
+
+
+def get_changed_files(repo_path: str, base_ref: str, revision: str = "HEAD") -> List[str]:
+    """The files changed between the merge base of base_ref and revision, and in the working tree.
+
+    Args:
+        repo_path (str): The path of the git repository.
+        base_ref (str): The ref to compare with, e.g. origin/main.
+        revision (str, optional): The revision to compare. Defaults to "HEAD".
+
+    Raises:
+        KeyError: Raised if base_ref or revision cannot be resolved.
+
+    Returns:
+        List[str]: The changed paths, relative to the current working directory.
+    """
+    repo = pygit2.Repository(repo_path)
+    commit = repo.revparse_single(revision).peel(pygit2.Commit)
+    base_commit = repo.revparse_single(base_ref).peel(pygit2.Commit)
+    merge_base = repo.merge_base(base_commit.id, commit.id)
+    changed_paths: Set[str] = set()
+    if merge_base is not None:
+        for delta in repo.diff(repo[merge_base].peel(pygit2.Commit).tree, commit.tree).deltas:
+            changed_paths.update([delta.old_file.path, delta.new_file.path])
+    for path, flags in repo.status().items():
+        if not flags & pygit2.GIT_STATUS_IGNORED:
+            changed_paths.add(path)
+    return sorted(os.path.relpath(os.path.join(repo.workdir, path)) for path in changed_paths)
+
+
+def get_module_name(path: str) -> str:
+    """The dotted module name of a python file, relative to the current working directory."""
+    module_path = os.path.splitext(os.path.normpath(path))[0]
+    if os.path.basename(module_path) == "__init__":
+        module_path = os.path.dirname(module_path)
+    return module_path.replace(os.sep, ".")
+
+
+def _iter_python_files(source_roots: Iterable[str]) -> Iterable[str]:
+    for source_root in source_roots:
+        for dirpath, dirnames, filenames in os.walk(source_root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".") and d != "__pycache__"]
+            for filename in filenames:
+                if filename.endswith(".py"):
+                    yield os.path.normpath(os.path.join(dirpath, filename))
+
+
+def get_imported_modules(path: str) -> Set[str]:
+    """The modules a python file imports, with relative imports resolved, including the parents of each module."""
+    with open(path, "rb") as f:
+        tree = ast.parse(f.read(), filename=path)
+    package = get_module_name(path)
+    if os.path.basename(path) != "__init__.py":
+        package = package.rpartition(".")[0]
+    imported: Set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imported.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            if node.level:
+                parent = package.split(".")[: len(package.split(".")) - node.level + 1] if package else []
+                base = ".".join(parent + ([base] if base else []))
+            imported.add(base)
+            # `from package import module` imports a submodule
+            imported.update(f"{base}.{alias.name}" for alias in node.names)
+    return {".".join(module.split(".")[:depth]) for module in imported if module for depth in range(1, len(module.split(".")) + 1)}
+
+
+def build_import_graph(source_roots: List[str]) -> Dict[str, Set[str]]:
+    """Map the python files of the source roots to the files of the source roots they import.
+
+    Args:
+        source_roots (List[str]): The package and test directories, relative to the current working directory.
+
+    Returns:
+        Dict[str, Set[str]]: The imported file paths of each file path.
+    """
+    modules = {get_module_name(path): path for path in _iter_python_files(source_roots)}
+    return {
+        path: {modules[module] for module in get_imported_modules(path) if module in modules and modules[module] != path}
+        for path in modules.values()
+    }
+
+
+def get_affected_files(changed_files: List[str], import_graph: Dict[str, Set[str]]) -> Set[str]:
+    """The changed files and the files importing them, transitively."""
+    importers: Dict[str, Set[str]] = {}
+    for path, imported_paths in import_graph.items():
+        for imported_path in imported_paths:
+            importers.setdefault(imported_path, set()).add(path)
+    affected = set()
+    to_visit = [os.path.normpath(path) for path in changed_files]
+    while to_visit:
+        path = to_visit.pop()
+        if path in affected:
+            continue
+        affected.add(path)
+        to_visit.extend(importers.get(path, set()))
+    return affected
+
+
+def is_test_module(path: str) -> bool:
+    filename = os.path.basename(path)
+    return fnmatch.fnmatch(filename, "test_*.py") or fnmatch.fnmatch(filename, "*_test.py")
+
+
+def get_test_modules(test_roots: List[str]) -> List[str]:
+    """The test modules of the test directories, relative to the current working directory."""
+    return sorted(path for path in _iter_python_files(test_roots) if is_test_module(path))
+
+
+def select_tests(
+    changed_files: List[str],
+    source_roots: List[str],
+    test_roots: List[str],
+    full_run_reason: Optional[str] = None,
+    full_run_files: List[str] = FULL_RUN_FILES,
+) -> TestSelection:
+    """Select the test modules affected by changed files.
+
+    Args:
+        changed_files (List[str]): The changed paths, relative to the current working directory.
+        source_roots (List[str]): The package directories the tests import.
+        test_roots (List[str]): The test directories.
+        full_run_reason (Optional[str], optional): A reason to run all the tests anyway, e.g. running on main. Defaults to None.
+        full_run_files (List[str], optional): Patterns of the files whose changes can affect any test. Defaults to FULL_RUN_FILES.
+
+    Returns:
+        TestSelection: The test modules to run and the ones skipped.
+    """
+    if full_run_reason is not None:
+        return TestSelection(full_run=True, reason=full_run_reason, changed_files=changed_files)
+    for path in changed_files:
+        if any(fnmatch.fnmatch(os.path.basename(path), pattern) for pattern in full_run_files):
+            return TestSelection(full_run=True, reason=f"{path} changed", changed_files=changed_files)
+        in_roots = any(os.path.normpath(path).startswith(os.path.normpath(root) + os.sep) for root in source_roots + test_roots)
+        if in_roots and not path.endswith(".py"):
+            # Data files are not part of the import graph
+            return TestSelection(full_run=True, reason=f"{path} changed and is not a python module", changed_files=changed_files)
+        if in_roots and not os.path.exists(path) and not is_test_module(path):
+            # Deleted and renamed modules are not part of the import graph, the tests still importing them must run
+            return TestSelection(full_run=True, reason=f"{path} was deleted or renamed", changed_files=changed_files)
+
+    import_graph = build_import_graph(source_roots + test_roots)
+    affected = get_affected_files(changed_files, import_graph)
+    test_modules = get_test_modules(test_roots)
+    selected = [path for path in test_modules if path in affected]
+    skipped = [path for path in test_modules if path not in affected]
+    changed_python_files = [path for path in changed_files if path.endswith(".py")]
+    return TestSelection(
+        full_run=False,
+        reason=f"{len(changed_python_files)} changed python files",
+        changed_files=changed_files,
+        selected=selected,
+        skipped=skipped,
+    )
+
+
+def select_tests_since_base_ref(settings: GlobalSettings, source_roots: List[str], test_roots: List[str]) -> TestSelection:
+    """Select the test modules affected by the changes since settings.TEST_SELECTION_BASE_REF.
+
+    All the tests run on the branches of settings.TEST_SELECTION_FULL_RUN_BRANCHES, or when the changes cannot be computed.
+
+    Args:
+        settings (GlobalSettings): The global settings object.
+        source_roots (List[str]): The package directories the tests import.
+        test_roots (List[str]): The test directories.
+
+    Returns:
+        TestSelection: The test modules to run and the ones skipped.
+    """
+    if settings.GIT_CURRENT_BRANCH in settings.TEST_SELECTION_FULL_RUN_BRANCHES:
+        return select_tests([], source_roots, test_roots, full_run_reason=f"running on {settings.GIT_CURRENT_BRANCH}")
+    try:
+        changed_files = get_changed_files(settings.GIT_REPO_ROOT_PATH, settings.TEST_SELECTION_BASE_REF, settings.GIT_CURRENT_REVISION)
+    except (KeyError, ValueError, pygit2.GitError) as e:
+        return select_tests([], source_roots, test_roots, full_run_reason=f"the changes since {settings.TEST_SELECTION_BASE_REF} are unknown: {e}")
+    return select_tests(changed_files, source_roots, test_roots)
@@ -0,0 +1,375 @@
+"""Plan the host directory uploads made to the dagger engine.
+
+An upload plan combines the configured excludes, the .gitignore rules and the caller includes into the patterns handed to
+`client.host().directory`, and walks the host directory with the same patterns to compute a content manifest of what gets uploaded.
+"""
+
+import fnmatch
+import hashlib
+import logging
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dagger import Client, Directory
+from pydantic import BaseModel, Field
+
+from ..models.singleton import Singleton
+
+GLOB_CHARACTERS = "*?["
+
+logger = logging.getLogger(__name__)
+
+
+class ManifestEntry(BaseModel):
+    path: str
+    size: int
+    mtime_ns: int
+    # Only computed when the manifest content digest is needed
+    sha256: Optional[str] = None
+
+
+class UploadManifest(BaseModel):
+    entries: List[ManifestEntry] = []
+
+    @property
+    def file_count(self) -> int:
+        return len(self.entries)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(entry.size for entry in self.entries)
+
+    @property
+    def digest(self) -> str:
+        """The digest of the paths and contents of the files, stable across checkouts.
+
+        Raises:
+            ValueError: Raised if the file contents were not hashed, check UploadPlanner.plan.
+        """
+        manifest_hash = hashlib.sha256()
+        for entry in sorted(self.entries, key=lambda e: e.path):
+            if entry.sha256 is None:
+                raise ValueError(f"The content of {entry.path} was not hashed")
+            manifest_hash.update(f"{entry.path}\0{entry.sha256}\n".encode())
+        return manifest_hash.hexdigest()
+
+    @property
+    def stat_digest(self) -> str:
+        """The digest of the paths, sizes and modification times of the files, cheap to compute but local to the host."""
+        manifest_hash = hashlib.sha256()
+        for entry in sorted(self.entries, key=lambda e: e.path):
+            manifest_hash.update(f"{entry.path}\0{entry.size}\0{entry.mtime_ns}\n".encode())
+        return manifest_hash.hexdigest()
+
+
+class UploadPlan(BaseModel):
+    subdir: str
+    exclude: List[str]
+    include: Optional[List[str]] = None
+    manifest: UploadManifest = Field(default_factory=UploadManifest)
+
+
+class UploadReport(BaseModel):
+    subdir: str
+    file_count: int
+    total_bytes: int
+    digest: str
+    reused: bool
+
+    def __str__(self) -> str:
+        action = "Reused upload of" if self.reused else "Uploading"
+        return f"{action} {self.subdir}: {self.file_count} files, {self.total_bytes / 1024 / 1024:.2f} MiB (manifest {self.digest[:12]})"
+
+
+def normalize_pattern(pattern: str) -> str:
+    pattern = pattern.strip()
+    while pattern.startswith("./"):
+        pattern = pattern[2:]
+    return pattern.rstrip("/")
+
+
+def rebase_pattern(pattern: str, subdir: str) -> List[str]:
+    """Rewrite a pattern relative to a directory into the patterns relative to one of its subdirectories.
+
+    Patterns that cannot match anything in the subdirectory are dropped, e.g. "**/build" is kept as is
+    while "a/b/build" becomes "build" for the "a/b" subdirectory and is dropped for the "c" subdirectory.
+    """
+    negated = pattern.startswith("!")
+    pattern_segments = normalize_pattern(pattern.lstrip("!")).split("/")
+    subdir_segments = [segment for segment in normalize_pattern(subdir).split("/") if segment not in ("", ".")]
+
+    def rebase(pattern_segments: Tuple[str, ...], subdir_segments: Tuple[str, ...]) -> List[str]:
+        if not subdir_segments:
+            return ["/".join(pattern_segments)] if pattern_segments else []
+        if not pattern_segments:
+            return []
+        head, *tail = pattern_segments
+        if head == "**":
+            return rebase(tuple(tail), subdir_segments) + rebase(pattern_segments, subdir_segments[1:])
+        if fnmatch.fnmatchcase(subdir_segments[0], head):
+            return rebase(tuple(tail), subdir_segments[1:])
+        return []
+
+    rebased = list(dict.fromkeys(rebase(tuple(pattern_segments), tuple(subdir_segments))))
+    return [f"!{p}" for p in rebased] if negated else rebased
+
+
+def parse_gitignore(content: str, gitignore_dir: str = "") -> List[str]:
+    """Convert .gitignore rules to exclude patterns relative to the directory holding the upload root.
+
+    Args:
+        content (str): The content of the .gitignore file.
+        gitignore_dir (str, optional): The directory of the .gitignore file, relative to the upload root. Defaults to "".
+
+    Returns:
+        List[str]: The exclude patterns, negated rules are kept as "!" patterns.
+    """
+    patterns = []
+    prefix = f"{normalize_pattern(gitignore_dir)}/" if normalize_pattern(gitignore_dir) not in ("", ".") else ""
+    for line in content.splitlines():
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negated = line.startswith("!")
+        rule = line[1:] if negated else line
+        rule = rule.replace("\\#", "#").replace("\\!", "!").rstrip("/")
+        if not rule:
+            continue
+        # Rules without a slash, except a trailing one, match at any depth below the .gitignore directory
+        if "/" not in rule:
+            rule = f"**/{rule}"
+        pattern = prefix + rule.lstrip("/")
+        patterns.append(f"!{pattern}" if negated else pattern)
+    return patterns
+
+
+@lru_cache(maxsize=None)
+def _compile_pattern(pattern: str) -> "re.Pattern[str]":
+    regex = ""
+    index = 0
+    while index < len(pattern):
+        if pattern.startswith("**/", index):
+            regex += "(?:.*/)?"
+            index += 3
+        elif pattern.startswith("**", index):
+            regex += ".*"
+            index += 2
+        elif pattern[index] == "*":
+            regex += "[^/]*"
+            index += 1
+        elif pattern[index] == "?":
+            regex += "[^/]"
+            index += 1
+        elif pattern[index] == "[" and "]" in pattern[index:]:
+            end = pattern.index("]", index)
+            regex += "[" + pattern[index + 1:end].replace("!", "^", 1) + "]"
+            index = end + 1
+        else:
+            regex += re.escape(pattern[index])
+            index += 1
+    return re.compile(regex)
+
+
+def matches(path: str, pattern: str) -> bool:
+    """Whether a relative path, or one of its parent directories, matches a pattern."""
+    regex = _compile_pattern(normalize_pattern(pattern))
+    segments = path.split("/")
+    return any(regex.fullmatch("/".join(segments[:depth])) for depth in range(1, len(segments) + 1))
+
+
+def is_excluded(path: str, exclude: List[str]) -> bool:
+    """Whether a relative path is excluded, the last matching pattern wins so "!" patterns can re-include paths."""
+    excluded = False
+    for pattern in exclude:
+        if pattern.startswith("!"):
+            if excluded and matches(path, pattern[1:]):
+                excluded = False
+        elif not excluded and matches(path, pattern):
+            excluded = True
+    return excluded
+
+
+def is_included(path: str, include: Optional[List[str]]) -> bool:
+    return include is None or any(matches(path, pattern) for pattern in include)
+
+
+def _walk_roots(include: Optional[List[str]]) -> List[str]:
+    """The directories or files to walk to find the included files: the literal prefixes of the include patterns."""
+    if include is None:
+        return [""]
+    walk_roots = []
+    for pattern in include:
+        literal_segments = []
+        for segment in normalize_pattern(pattern).split("/"):
+            if any(character in segment for character in GLOB_CHARACTERS):
+                break
+            literal_segments.append(segment)
+        walk_roots.append("/".join(literal_segments))
+    if "" in walk_roots:
+        return [""]
+    # Drop the roots nested in other roots
+    return [r for r in sorted(set(walk_roots)) if not any(r.startswith(f"{other}/") for other in walk_roots if other != r)]
+
+
+class UploadPlanner(Singleton):
+    """Plan host directory uploads and reuse the identical ones within a session."""
+
+    def __init__(self) -> None:
+        if not Singleton._initialized[UploadPlanner]:
+            self._file_hashes: Dict[Tuple[str, int, int], str] = {}
+            self._uploads: Dict[Tuple[str, Tuple[str, ...], Optional[Tuple[str, ...]], bool], Tuple[Directory, UploadPlan]] = {}
+            self._uploads_by_stat_digest: Dict[str, List[Tuple[Directory, UploadPlan]]] = {}
+            self.reports: List[UploadReport] = []
+            Singleton._initialized[UploadPlanner] = True
+
+    def _hash_file(self, path: str, stat: os.stat_result) -> str:
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        if key not in self._file_hashes:
+            file_hash = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    file_hash.update(chunk)
+            self._file_hashes[key] = file_hash.hexdigest()
+        return self._file_hashes[key]
+
+    def _hash_manifest(self, plan: UploadPlan) -> UploadManifest:
+        """Fill in the content hashes of a plan manifest."""
+        for entry in plan.manifest.entries:
+            if entry.sha256 is None:
+                absolute_path = os.path.join(plan.subdir, entry.path)
+                entry.sha256 = self._hash_file(absolute_path, os.stat(absolute_path))
+        return plan.manifest
+
+    def _walk(self, root: str, exclude: List[str], include: Optional[List[str]], hash_contents: bool) -> Iterator[ManifestEntry]:
+        for walk_root in _walk_roots(include):
+            absolute_walk_root = os.path.join(root, walk_root)
+            if os.path.isfile(absolute_walk_root):
+                candidates: Iterator[Tuple[str, List[str], List[str]]] = iter([(os.path.dirname(absolute_walk_root), [], [os.path.basename(absolute_walk_root)])])
+            else:
+                candidates = os.walk(absolute_walk_root)
+            for dirpath, dirnames, filenames in candidates:
+                relative_dirpath = os.path.relpath(dirpath, root)
+                relative_dirpath = "" if relative_dirpath == "." else relative_dirpath
+                # Prune excluded directories, unless a "!" pattern could re-include something below them
+                if not any(p.startswith("!") for p in exclude):
+                    dirnames[:] = [d for d in dirnames if not is_excluded(os.path.join(relative_dirpath, d), exclude)]
+                for filename in filenames:
+                    relative_path = os.path.join(relative_dirpath, filename)
+                    absolute_path = os.path.join(dirpath, filename)
+                    if is_excluded(relative_path, exclude) or not is_included(relative_path, include) or not os.path.isfile(absolute_path):
+                        continue
+                    stat = os.stat(absolute_path)
+                    yield ManifestEntry(
+                        path=relative_path,
+                        size=stat.st_size,
+                        mtime_ns=stat.st_mtime_ns,
+                        sha256=self._hash_file(absolute_path, stat) if hash_contents else None,
+                    )
+
+    def _gitignore_exclude(self, subdir: str, exclude: List[str], include: Optional[List[str]]) -> List[str]:
+        """Collect the .gitignore rules applying to the walked part of subdir, as patterns relative to subdir."""
+        gitignore_exclude: List[str] = []
+        read_gitignore_dirs = set()
+
+        def read_gitignore(directory: str) -> None:
+            # directory is relative to the current working directory
+            directory = os.path.normpath(directory)
+            gitignore_path = os.path.join(directory, ".gitignore")
+            if directory in read_gitignore_dirs or not os.path.isfile(gitignore_path):
+                return
+            read_gitignore_dirs.add(directory)
+            with open(gitignore_path) as f:
+                content = f.read()
+            relative_directory = os.path.relpath(directory, subdir)
+            if relative_directory.startswith(".."):
+                # A .gitignore in a parent directory of subdir
+                rules = parse_gitignore(content)
+                gitignore_exclude.extend(rebased for rule in rules for rebased in rebase_pattern(rule, os.path.relpath(subdir, directory)))
+            else:
+                gitignore_exclude.extend(parse_gitignore(content, relative_directory))
+
+        # The .gitignore files of the directories leading to the walked directories, from the current working directory down
+        for walk_root in _walk_roots(include):
+            walk_root_path = os.path.normpath(os.path.join(subdir, walk_root))
+            segments = [] if walk_root_path == "." else walk_root_path.split("/")
+            for depth in range(len(segments)):
+                read_gitignore(os.path.join(".", *segments[:depth]))
+            if os.path.isdir(walk_root_path):
+                for dirpath, dirnames, _ in os.walk(walk_root_path):
+                    read_gitignore(dirpath)
+                    relative_dirpath = os.path.relpath(dirpath, subdir)
+                    dirnames[:] = [d for d in dirnames if not is_excluded(os.path.normpath(os.path.join(relative_dirpath, d)), exclude + gitignore_exclude)]
+        return gitignore_exclude
+
+    def plan(
+        self, subdir: str, exclude: List[str], include: Optional[List[str]] = None, respect_gitignore: bool = True, hash_contents: bool = True
+    ) -> UploadPlan:
+        """Plan the upload of a host directory.
+
+        Args:
+            subdir (str): The directory to upload, relative to the current working directory.
+            exclude (List[str]): The patterns to exclude, relative to the current working directory.
+            include (Optional[List[str]], optional): The patterns to include, relative to subdir. Defaults to None.
+            respect_gitignore (bool, optional): Whether to exclude what the .gitignore files ignore,
+                except what the include patterns explicitly list. Defaults to True.
+            hash_contents (bool, optional): Whether to hash the file contents, for the manifest digest. Defaults to True.
+
+        Returns:
+            UploadPlan: The patterns to upload subdir with and the manifest of the uploaded files.
+        """
+        subdir = os.path.normpath(normalize_pattern(subdir) or ".")
+        include = [normalize_pattern(p) for p in include] if include is not None else None
+        subdir_exclude = [rebased for pattern in exclude for rebased in rebase_pattern(pattern, subdir)]
+
+        if respect_gitignore:
+            gitignore_exclude = self._gitignore_exclude(subdir, subdir_exclude, include)
+            # Explicit includes take precedence over the .gitignore rules
+            if include is not None:
+                gitignore_exclude = [p for p in gitignore_exclude if p.startswith("!") or not any(matches(i, p) for i in include)]
+            subdir_exclude += gitignore_exclude
+
+        subdir_exclude = list(dict.fromkeys(subdir_exclude))
+        manifest = UploadManifest(entries=sorted(self._walk(subdir, subdir_exclude, include, hash_contents), key=lambda entry: entry.path))
+        return UploadPlan(subdir=subdir, exclude=subdir_exclude, include=include, manifest=manifest)
+
+    def upload(self, client: Client, subdir: str, exclude: List[str], include: Optional[List[str]] = None, respect_gitignore: bool = True) -> Directory:
+        """Upload a host directory according to its plan, reusing an identical upload of the session if any.
+
+        Uploads are matched on the paths, sizes and modification times of their files, the contents are only hashed
+        to tell apart uploads of different directories matching on those.
+        """
+        key = (subdir, tuple(sorted(exclude)), tuple(sorted(include)) if include is not None else None, respect_gitignore)
+        if key in self._uploads:
+            directory, plan = self._uploads[key]
+            self._report(plan, reused=True)
+            return directory
+
+        plan = self.plan(subdir, exclude, include, respect_gitignore, hash_contents=False)
+        candidates = self._uploads_by_stat_digest.setdefault(plan.manifest.stat_digest, [])
+        reused_directory = None
+        for candidate_directory, candidate_plan in (candidates if plan.manifest.file_count > 0 else []):
+            # The same files, or identical looking files of another directory
+            if candidate_plan.subdir == plan.subdir or self._hash_manifest(candidate_plan).digest == self._hash_manifest(plan).digest:
+                reused_directory = candidate_directory
+                break
+        if reused_directory is not None:
+            directory = reused_directory
+        else:
+            directory = client.host().directory(plan.subdir, exclude=plan.exclude, include=plan.include)
+            candidates.append((directory, plan))
+        self._uploads[key] = (directory, plan)
+        self._report(plan, reused=reused_directory is not None)
+        return directory
+
+    def _report(self, plan: UploadPlan, reused: bool) -> None:
+        report = UploadReport(
+            subdir=plan.subdir,
+            file_count=plan.manifest.file_count,
+            total_bytes=plan.manifest.total_bytes,
+            digest=plan.manifest.stat_digest,
+            reused=reused,
+        )
+        self.reports.append(report)
+        logger.info(report)
@@ -0,0 +1,116 @@
+"""Build the standard environments up front and concurrently, so that fresh runners do not pay their cold setup in the middle of a flow."""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+from dagger import Client, Container
+from pydantic import BaseModel
+
+from ..models.settings import GlobalSettings
+from .constants import GHA_NODE_VERSION
+from .environments import (
+    with_crane,
+    with_node,
+    with_openjdk,
+    with_pnpm,
+    with_poetry,
+    with_python_base,
+)
+from .images import pin_image
+
+EnvironmentBuilder = Callable[[Client, GlobalSettings], Container]
+
+STANDARD_ENVIRONMENTS: Dict[str, EnvironmentBuilder] = {
+    "python": lambda client, settings: with_python_base(client, settings=settings),
+    "poetry": lambda client, settings: with_poetry(client, settings),
+    "node": lambda client, settings: with_node(client, GHA_NODE_VERSION, settings).with_(with_pnpm(client, settings=settings)),
+    "openjdk": with_openjdk,
+    "dind": lambda client, settings: client.container().from_(pin_image(settings.DOCKER_DIND_IMAGE, settings)),
+    "docker-cli": lambda client, settings: client.container().from_(pin_image(settings.DOCKER_CLI_IMAGE, settings)),
+    "crane": with_crane,
+}
+
+
+class WarmupReport(BaseModel):
+    environment: str
+    duration: float
+    # Whether the exact same environment definition was already warmed up on this host
+    warm: bool
+    error: Optional[str] = None
+
+    def __str__(self) -> str:
+        if self.error is not None:
+            return f"{self.environment}: failed after {self.duration:.1f}s: {self.error}"
+        return f"{self.environment}: {self.duration:.1f}s ({'warm' if self.warm else 'cold'})"
+
+
+def _get_history_path(cache_dir: str) -> str:
+    return os.path.join(cache_dir, "warmup.json")
+
+
+def _read_history(cache_dir: str) -> Dict[str, str]:
+    history_path = _get_history_path(cache_dir)
+    if not os.path.isfile(history_path):
+        return {}
+    with open(history_path) as f:
+        history: Dict[str, str] = json.load(f)
+    return history
+
+
+async def warm_environment(client: Client, settings: GlobalSettings, name: str, builder: EnvironmentBuilder, warmed_definitions: Dict[str, str]) -> WarmupReport:
+    """Build an environment and report how long it took.
+
+    Args:
+        client (Client): The dagger client.
+        settings (GlobalSettings): The global settings object.
+        name (str): The environment name.
+        builder (EnvironmentBuilder): The function building the environment container.
+        warmed_definitions (Dict[str, str]): The digest of the definition last warmed up for each environment, updated on success.
+
+    Returns:
+        WarmupReport: The duration of the build, and whether the definition was warmed up before.
+    """
+    start = time.monotonic()
+    try:
+        container = builder(client, settings)
+        definition = hashlib.sha256((await container.id()).encode()).hexdigest()
+        await container.sync()
+    except Exception as e:
+        return WarmupReport(environment=name, duration=time.monotonic() - start, warm=False, error=str(e))
+    warm = warmed_definitions.get(name) == definition
+    warmed_definitions[name] = definition
+    return WarmupReport(environment=name, duration=time.monotonic() - start, warm=warm)
+
+
+async def warm_environments(
+    client: Client, settings: GlobalSettings, environments: Dict[str, EnvironmentBuilder], parallelism: Optional[int] = None
+) -> List[WarmupReport]:
+    """Build environments concurrently, parallelism at a time, and record their definitions in the aircmd cache.
+
+    Args:
+        client (Client): The dagger client.
+        settings (GlobalSettings): The global settings object.
+        environments (Dict[str, EnvironmentBuilder]): The environment builders, keyed by environment name.
+        parallelism (Optional[int], optional): How many environments are built at once. Defaults to settings.WARMUP_PARALLELISM.
+
+    Returns:
+        List[WarmupReport]: The report of each environment, in the order of environments.
+    """
+    semaphore = asyncio.Semaphore(parallelism or settings.WARMUP_PARALLELISM)
+    warmed_definitions = _read_history(settings.CACHE_DIR)
+
+    async def warm(name: str, builder: EnvironmentBuilder) -> WarmupReport:
+        async with semaphore:
+            report = await warm_environment(client, settings, name, builder, warmed_definitions)
+        print(report)
+        return report
+
+    reports = await asyncio.gather(*(warm(name, builder) for name, builder in environments.items()))
+    os.makedirs(settings.CACHE_DIR, exist_ok=True)
+    with open(_get_history_path(settings.CACHE_DIR), "w") as f:
+        json.dump(warmed_definitions, f, indent=2, sort_keys=True)
+    return list(reports)
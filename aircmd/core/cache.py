@@ -0,0 +1,166 @@
+import time
+from typing import List, Optional
+
+from asyncclick import ClickException
+from dagger import Client
+
+from ..actions.cache_snapshots import CacheSnapshotReport, export_cache_volumes, get_snapshot_volumes, import_cache_volumes
+from ..actions.cache_volumes import (
+    CacheVolumeInventory,
+    empty_cache_volumes,
+    get_inventory_path,
+    measure_cache_volumes,
+    plan_cache_volume_prune,
+)
+from ..models.base import PipelineContext
+from ..models.click_commands import ClickCommandMetadata, ClickGroup
+from ..models.click_params import ClickFlag, ClickOption, ParameterType
+from ..models.click_utils import LazyPassDecorator
+from ..models.settings import GlobalSettings
+
+cache_group = ClickGroup(group_name="cache", group_help="Commands for inspecting, pruning and snapshotting the cache volumes of the environments")
+
+pass_global_settings = LazyPassDecorator(GlobalSettings, ensure=True)
+
+
+def format_size(size_bytes: Optional[int]) -> str:
+    if size_bytes is None:
+        return "unknown"
+    size = float(size_bytes)
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TiB"
+
+
+async def refresh_inventory(settings: GlobalSettings, client: Optional[Client], pipeline_name: str) -> CacheVolumeInventory:
+    """Measure the volumes of the host inventory and record their sizes."""
+    inventory_path = get_inventory_path(settings)
+    inventory = CacheVolumeInventory.load(inventory_path)
+    if not inventory.volumes:
+        return inventory
+    cache_client = await PipelineContext(global_settings=settings).get_dagger_client(client, pipeline_name)
+    sizes = await measure_cache_volumes(cache_client, settings, sorted(inventory.volumes))
+    # Volumes may have been used by concurrent runs in the meantime, their usage times are read again
+    with CacheVolumeInventory.update(inventory_path) as inventory:
+        for volume, size_bytes in sizes.items():
+            if volume in inventory.volumes:
+                inventory.volumes[volume] = inventory.volumes[volume].copy(update={"size_bytes": size_bytes, "measured_at": time.time()})
+    return inventory
+
+
+class StatsCommand(ClickCommandMetadata):
+    command_name: str = "stats"
+    command_help: str = "Report the size and last use of the cache volumes used on this host"
+
+
+@cache_group.command(StatsCommand())
+@pass_global_settings
+async def stats(settings: GlobalSettings, client: Optional[Client] = None) -> CacheVolumeInventory:
+    """Measure the cache volumes recorded in the host inventory and print them, largest first"""
+    inventory = await refresh_inventory(settings, client, "Aircmd Cache Stats")
+    if not inventory.volumes:
+        print(f"No cache volume recorded in {get_inventory_path(settings)}")
+        return inventory
+    now = time.time()
+    for record in sorted(inventory.volumes.values(), key=lambda record: -(record.size_bytes or 0)):
+        last_used_days = (now - record.last_used_at) / (24 * 3600)
+        print(f"{record.volume:<48} {record.scope.value:<8} {format_size(record.size_bytes):>12}  last used {last_used_days:.1f} days ago")
+    print(f"{len(inventory.volumes)} cache volumes, {format_size(inventory.total_bytes)} in total, the limit is {format_size(settings.CACHE_VOLUMES_MAX_BYTES)}")
+    return inventory
+
+
+class PruneCommand(ClickCommandMetadata):
+    command_name: str = "prune"
+    command_help: str = "Empty the cache volumes unused for too long, then the least recently used ones above the size limit"
+    flags: List[ClickFlag] = [ClickFlag(name="--dry-run", help="Only print the cache volumes which would be emptied")]
+    options: List[ClickOption] = [
+        ClickOption(name="--max-age", type=ParameterType.INT, help="How long an unused volume is kept, in seconds. Defaults to CACHE_VOLUME_MAX_AGE"),
+        ClickOption(name="--max-bytes", type=ParameterType.INT, help="The total size of the volumes to keep. Defaults to CACHE_VOLUMES_MAX_BYTES"),
+    ]
+
+
+@cache_group.command(PruneCommand())
+@pass_global_settings
+async def prune(
+    settings: GlobalSettings,
+    dry_run: bool = False,
+    max_age: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    client: Optional[Client] = None,
+) -> List[str]:
+    """Empty the cache volumes picked by the age and size policy and remove them from the host inventory"""
+    inventory = await refresh_inventory(settings, client, "Aircmd Cache Prune")
+    max_age = max_age if max_age is not None else settings.CACHE_VOLUME_MAX_AGE
+    max_bytes = max_bytes if max_bytes is not None else settings.CACHE_VOLUMES_MAX_BYTES
+    to_prune = plan_cache_volume_prune(inventory, max_age, max_bytes)
+    if not to_prune:
+        print(f"Nothing to prune, {len(inventory.volumes)} cache volumes use {format_size(inventory.total_bytes)}")
+        return []
+    freed_bytes = sum(inventory.volumes[volume].size_bytes or 0 for volume in to_prune)
+    for volume in to_prune:
+        print(f"{'Would empty' if dry_run else 'Emptying'} {volume} ({format_size(inventory.volumes[volume].size_bytes)})")
+    if dry_run:
+        return to_prune
+
+    cache_client = await PipelineContext(global_settings=settings).get_dagger_client(client, "Aircmd Cache Prune")
+    await empty_cache_volumes(cache_client, settings, to_prune)
+    with CacheVolumeInventory.update(get_inventory_path(settings)) as inventory:
+        for volume in to_prune:
+            inventory.volumes.pop(volume, None)
+    print(f"Emptied {len(to_prune)} cache volumes, freeing {format_size(freed_bytes)}")
+    return to_prune
+
+
+VOLUMES_OPTION = ClickOption(name="--volumes", help="Comma separated names of the cache volumes, e.g. pip_cache,gradle-cache. Defaults to CACHE_SNAPSHOT_VOLUMES")
+
+
+def get_volumes_option(settings: GlobalSettings, volumes: Optional[str]) -> List[str]:
+    try:
+        return get_snapshot_volumes(settings, volumes.split(",") if volumes else None)
+    except ValueError as e:
+        raise ClickException(str(e))
+
+
+def print_snapshot_reports(reports: List[CacheSnapshotReport], verb: str, duration: float) -> None:
+    for report in reports:
+        print(report)
+    transferred_bytes = sum(report.size_bytes or 0 for report in reports)
+    print(f"{verb} {len(reports)} cache volumes in {duration:.1f}s, {format_size(transferred_bytes)} transferred")
+
+
+class ExportCommand(ClickCommandMetadata):
+    command_name: str = "export"
+    command_help: str = "Snapshot cache volumes to content addressed tarballs in the CACHE_SNAPSHOT_STORE"
+    options: List[ClickOption] = [VOLUMES_OPTION]
+
+
+@cache_group.command(ExportCommand())
+@pass_global_settings
+async def export(settings: GlobalSettings, volumes: Optional[str] = None, client: Optional[Client] = None) -> List[CacheSnapshotReport]:
+    """Export the cache volumes of the current namespace whose contents are not in the store yet"""
+    start = time.monotonic()
+    volume_names = get_volumes_option(settings, volumes)
+    cache_client = await PipelineContext(global_settings=settings).get_dagger_client(client, "Aircmd Cache Export")
+    reports = await export_cache_volumes(cache_client, settings, volume_names)
+    print_snapshot_reports(reports, "Exported", time.monotonic() - start)
+    return reports
+
+
+class ImportCommand(ClickCommandMetadata):
+    command_name: str = "import"
+    command_help: str = "Restore cache volumes from their latest snapshots in the CACHE_SNAPSHOT_STORE"
+    options: List[ClickOption] = [VOLUMES_OPTION]
+
+
+@cache_group.command(ImportCommand())
+@pass_global_settings
+async def import_(settings: GlobalSettings, volumes: Optional[str] = None, client: Optional[Client] = None) -> List[CacheSnapshotReport]:
+    """Extract the latest snapshots over the cache volumes of the current namespace, skipping the ones already restored"""
+    start = time.monotonic()
+    volume_names = get_volumes_option(settings, volumes)
+    cache_client = await PipelineContext(global_settings=settings).get_dagger_client(client, "Aircmd Cache Import")
+    reports = await import_cache_volumes(cache_client, settings, volume_names)
+    print_snapshot_reports(reports, "Imported", time.monotonic() - start)
+    return reports
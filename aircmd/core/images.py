@@ -0,0 +1,53 @@
+from typing import List, Optional
+
+from dagger import Client
+
+from ..actions.images import get_base_images, load_image_lock, write_image_lock
+from ..actions.registry import RegistryInspector
+from ..models.base import GlobalContext, PipelineContext
+from ..models.click_commands import ClickCommandMetadata, ClickGroup
+from ..models.click_params import ClickFlag
+from ..models.click_utils import LazyPassDecorator
+from ..models.docker import ImageLock
+from ..models.settings import GlobalSettings
+
+images_group = ClickGroup(group_name="images", group_help="Commands for managing the base images of the environments")
+
+pass_global_context = LazyPassDecorator(GlobalContext, ensure=True)
+pass_global_settings = LazyPassDecorator(GlobalSettings, ensure=True)
+
+
+class LockCommand(ClickCommandMetadata):
+    command_name: str = "lock"
+    command_help: str = "Pin the base images of the environments and plugins to digests in the images lockfile"
+    flags: List[ClickFlag] = [ClickFlag(name="--update", help="Resolve the digests of the images already locked again")]
+
+@images_group.command(LockCommand())
+@pass_global_context
+@pass_global_settings
+async def lock(ctx: GlobalContext, settings: GlobalSettings, update: bool = False, client: Optional[Client] = None) -> ImageLock:
+    """Resolve the base images to digests, only the ones missing from the lockfile unless --update is set"""
+    lockfile_path = settings.IMAGES_LOCKFILE
+    image_lock = load_image_lock(lockfile_path)
+    images = get_base_images(settings, ctx.plugin_manager.plugins.values())
+    to_resolve = images if update else [image for image in images if image not in image_lock.images]
+    if not to_resolve:
+        print(f"All the {len(images)} base images are locked in {lockfile_path}")
+        return image_lock
+
+    lock_client = await PipelineContext(global_settings=settings).get_dagger_client(client, "Aircmd Images Lock")
+    digests = await RegistryInspector(lock_client, settings).get_digests(to_resolve)
+    locked_images = dict(image_lock.images)
+    for image in to_resolve:
+        digest = digests[image]
+        if digest is None:
+            print(f"Failed to resolve {image}, keeping its previous digest" if image in locked_images else f"Failed to resolve {image}")
+            continue
+        if locked_images.get(image) != digest:
+            print(f"{image}: {locked_images.get(image, 'unlocked')} -> {digest}")
+        locked_images[image] = digest
+
+    image_lock = ImageLock(images=locked_images)
+    write_image_lock(lockfile_path, image_lock)
+    print(f"Locked {len(locked_images)} base images in {lockfile_path}")
+    return image_lock
@@ -0,0 +1,44 @@
+import time
+from typing import List, Optional
+
+from dagger import Client
+
+from ..actions.host_caches import seed_cache_volumes_from_host
+from ..actions.warmup import STANDARD_ENVIRONMENTS, WarmupReport, warm_environments
+from ..models.base import GlobalContext, PipelineContext
+from ..models.click_commands import ClickCommandMetadata
+from ..models.click_params import ClickOption, ParameterType
+from ..models.click_utils import LazyPassDecorator
+from ..models.settings import GlobalSettings
+
+pass_global_context = LazyPassDecorator(GlobalContext, ensure=True)
+pass_global_settings = LazyPassDecorator(GlobalSettings, ensure=True)
+
+
+class WarmCommand(ClickCommandMetadata):
+    command_name: str = "warm"
+    command_help: str = "Build the standard and plugin environments up front to pre-heat the engine"
+    options: List[ClickOption] = [
+        ClickOption(name="--parallelism", type=ParameterType.INT, help="How many environments are built at once"),
+    ]
+
+
+@pass_global_context
+@pass_global_settings
+async def warm(ctx: GlobalContext, settings: GlobalSettings, parallelism: Optional[int] = None, client: Optional[Client] = None) -> List[WarmupReport]:
+    """Build the environments of the builders and of the plugins concurrently, reporting their time and cache status"""
+    environments = dict(STANDARD_ENVIRONMENTS)
+    for plugin in ctx.plugin_manager.plugins.values():
+        for name, builder in getattr(plugin, "environments", {}).items():
+            environments[f"{plugin.name}/{name}"] = builder
+
+    warm_client = await PipelineContext(global_settings=settings).get_dagger_client(client, "Aircmd Warm")
+    start = time.monotonic()
+    await seed_cache_volumes_from_host(warm_client, settings)
+    reports = await warm_environments(warm_client, settings, environments, parallelism)
+    failed = [report.environment for report in reports if report.error is not None]
+    cold = [report.environment for report in reports if report.error is None and not report.warm]
+    print(f"Warmed up {len(reports) - len(failed)}/{len(reports)} environments in {time.monotonic() - start:.1f}s, {len(cold)} cold")
+    if failed:
+        print(f"Failed environments: {', '.join(failed)}")
+    return reports
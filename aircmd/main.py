@@ -8,7 +8,10 @@ import anyio
 from asyncclick import Context
 from dotenv import load_dotenv
 
+from .core.cache import cache_group
+from .core.images import images_group
 from .core.plugins import plugin_group
+from .core.warm import WarmCommand, warm
 from .models.base import GlobalContext
 from .models.click_commands import ClickGroup
 from .models.click_utils import LazyPassDecorator
@@ -39,6 +42,9 @@ cli = ClickGroup(group_name=None, group_help="Aircmd: A CLI for Airbyte")
 # Add core commands that live in `aircmd` itself (not plugins) to the top level entrypoint
 
 cli.add_group(plugin_group)  # commands to manage plugins
+cli.add_group(images_group)  # commands to pin the base images
+cli.add_group(cache_group)  # commands to inspect and prune the cache volumes
+cli.command(WarmCommand())(warm)  # pre-heat the engine with the standard environments
 
 def main() -> None:
     anyio.run(async_main)
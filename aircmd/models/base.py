@@ -15,6 +15,7 @@ from prefect.context import (
 from pydantic import BaseModel, Field, PrivateAttr
 
 from ..plugin_manager import PluginManager
+from .docker import DockerdPool
 from .settings import GlobalSettings
 from .singleton import Singleton
 
@@ -28,7 +29,9 @@ def get_context() -> Context:
 
 class PipelineContext(BaseModel, Singleton):
     global_settings: GlobalSettings
+    # The docker hosts are set up on first use, with a pool if DOCKERD_POOL_SIZE is above 1, check get_dockerd_pool
     dockerd_service: Optional[Container] = Field(default=None)
+    dockerd_pool: Optional[DockerdPool] = Field(default=None)
     _dagger_client: Optional[Client] = PrivateAttr(default=None)
     _click_context: Callable[[], Context] = PrivateAttr(default_factory=lambda: get_context)
 
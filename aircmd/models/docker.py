@@ -0,0 +1,162 @@
+import asyncio
+import json
+from typing import Any, Dict, List, Literal, Optional
+
+from dagger import Container
+from pydantic import BaseModel, PrivateAttr
+
+
+class ImageLoadReport(BaseModel):
+    """Outcome of loading an image tarball to a docker host."""
+
+    image_id: str
+    image_tag: str
+    loaded: bool
+    duration: float
+    docker_host: Optional[str] = None
+    # The index of the pooled daemon holding the image, containers using it must be bound to it
+    docker_host_index: Optional[int] = None
+
+    def __str__(self) -> str:
+        action = "Loaded" if self.loaded else "Reused already present"
+        host = f" on {self.docker_host}" if self.docker_host else ""
+        return f"{action} image {self.image_id} as {self.image_tag}{host} in {self.duration:.2f}s"
+
+
+class DockerdPool(BaseModel):
+    """A pool of dockerd services that containers get bound to as docker hosts.
+
+    Each service is reachable under its own hostname and tracks how many callers currently use it,
+    so new callers can be assigned to the least loaded daemon.
+    """
+
+    services: List[Container]
+    registry_mirror: Optional[Container] = None
+    hostname_prefix: str = "global-docker-host"
+    _loads: List[int] = PrivateAttr(default_factory=list)
+    _ready: List[bool] = PrivateAttr(default_factory=list)
+    _probe_locks: List[asyncio.Lock] = PrivateAttr(default_factory=list)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def __init__(self, **data: Any):
+        super().__init__(**data)
+        if not self.services:
+            raise ValueError("A dockerd pool needs at least one dockerd service.")
+        self._loads = [0] * len(self.services)
+        self._ready = [False] * len(self.services)
+        self._probe_locks = [asyncio.Lock() for _ in self.services]
+
+    def __len__(self) -> int:
+        return len(self.services)
+
+    @property
+    def loads(self) -> List[int]:
+        return list(self._loads)
+
+    def hostname(self, index: int) -> str:
+        return self.hostname_prefix if len(self.services) == 1 else f"{self.hostname_prefix}-{index}"
+
+    def pick(self, index: Optional[int] = None) -> int:
+        """The index of the least loaded daemon unless an index is given, without assigning a caller to it."""
+        if index is None:
+            index = min(range(len(self.services)), key=lambda i: self._loads[i])
+        return index
+
+    def acquire(self, index: Optional[int] = None) -> int:
+        """Assign a caller to a daemon, the least loaded one unless an index is given, and return its index. Release it once done."""
+        index = self.pick(index)
+        self._loads[index] += 1
+        return index
+
+    def release(self, index: int) -> None:
+        self._loads[index] = max(0, self._loads[index] - 1)
+
+    def is_ready(self, index: int) -> bool:
+        return self._ready[index]
+
+    def mark_ready(self, index: int) -> None:
+        self._ready[index] = True
+
+    def probe_lock(self, index: int) -> asyncio.Lock:
+        return self._probe_locks[index]
+
+
+class ProxyCounters(BaseModel):
+    requests: int = 0
+    hits: int = 0
+    misses: int = 0
+    bytes_pulled: int = 0
+    bytes_pushed: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.requests if self.requests else 0.0
+
+
+class RegistryMirrorStats(BaseModel):
+    """Pull-through counters of a registry mirror, as exposed on its /debug/vars endpoint."""
+
+    blobs: ProxyCounters = ProxyCounters()
+    manifests: ProxyCounters = ProxyCounters()
+
+    @classmethod
+    def from_debug_vars(cls, debug_vars: str) -> "RegistryMirrorStats":
+        proxy = json.loads(debug_vars).get("registry", {}).get("proxy", {})
+
+        def counters(metrics: Dict[str, int]) -> ProxyCounters:
+            return ProxyCounters(
+                requests=metrics.get("Requests", 0),
+                hits=metrics.get("Hits", 0),
+                misses=metrics.get("Misses", 0),
+                bytes_pulled=metrics.get("BytesPulled", 0),
+                bytes_pushed=metrics.get("BytesPushed", 0),
+            )
+
+        return cls(blobs=counters(proxy.get("blobs", {})), manifests=counters(proxy.get("manifests", {})))
+
+
+class RegistryQuery(BaseModel):
+    """A registry lookup: the digest of an image reference, the tags of a repository or the manifest of an image reference."""
+
+    kind: Literal["digest", "tags", "manifest"]
+    reference: str
+
+    class Config:
+        frozen = True
+
+
+class RegistryResult(BaseModel):
+    query: RegistryQuery
+    output: Optional[str] = None
+    error: Optional[str] = None
+    fetched_at: float
+
+    @property
+    def digest(self) -> Optional[str]:
+        return self.output.strip() if self.output is not None and self.query.kind == "digest" else None
+
+    @property
+    def tags(self) -> List[str]:
+        return self.output.split() if self.output is not None and self.query.kind == "tags" else []
+
+    @property
+    def manifest(self) -> Optional[Dict[str, Any]]:
+        if self.output is None or self.query.kind != "manifest":
+            return None
+        manifest: Dict[str, Any] = json.loads(self.output)
+        return manifest
+
+
+class ImageLock(BaseModel):
+    """The digests the base images of the environments are pinned to, keyed by image reference."""
+
+    images: Dict[str, str] = {}
+
+    def pin(self, image: str) -> str:
+        """The image reference pinned to its locked digest, or the reference itself if it is not locked or already pinned."""
+        digest = self.images.get(image)
+        if digest is None or "@" in image:
+            return image
+        return f"{image}@{digest}"
@@ -1,10 +1,12 @@
 import os
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
+from dagger import Client, Container
 from pydantic import BaseModel
 
 from .click_commands import ClickGroup
+from .settings import GlobalSettings
 
 
 class Plugin(BaseModel, ABC):
@@ -15,6 +17,9 @@ class Plugin(BaseModel, ABC):
     name: str
     base_dirs: List[str]
     groups: Dict[Optional[str], ClickGroup] = {}
+    base_images: List[str] = []
+    # Environment builders to warm up with `aircmd warm`, keyed by environment name, called with the dagger client and the global settings
+    environments: Dict[str, Callable[[Client, GlobalSettings], Container]] = {}
 
     @abstractmethod
     def add_group(self, group: ClickGroup) -> None:
@@ -105,9 +105,40 @@ class GlobalSettings(BaseSettings, Singleton):
         ],
         env="DEFAULT_EXCLUDED_FILES"
     )
+    SOURCE_MODE: str = Field("host", env="AIRCMD_SOURCE_MODE")
+    CACHE_DIR: str = Field(default_factory=lambda: platformdirs.user_cache_dir("aircmd"), env="AIRCMD_CACHE_DIR")
+    UPLOAD_RESPECT_GITIGNORE: bool = Field(True, env="UPLOAD_RESPECT_GITIGNORE")
     DOCKER_VERSION:str = Field("20.10.23", env="DOCKER_VERSION")
     DOCKER_DIND_IMAGE: str = Field("docker:dind", env="DOCKER_DIND_IMAGE")
     DOCKER_CLI_IMAGE: str = Field("docker:cli", env="DOCKER_CLI_IMAGE")
+    DOCKERD_POOL_SIZE: int = Field(1, env="DOCKERD_POOL_SIZE")
+    DOCKERD_READINESS_TIMEOUT: int = Field(60, env="DOCKERD_READINESS_TIMEOUT")
+    REGISTRY_MIRROR_ENABLED: bool = Field(False, env="REGISTRY_MIRROR_ENABLED")
+    REGISTRY_MIRROR_IMAGE: str = Field("registry:2", env="REGISTRY_MIRROR_IMAGE")
+    REGISTRY_MIRROR_REMOTE_URL: str = Field("https://registry-1.docker.io", env="REGISTRY_MIRROR_REMOTE_URL")
+    REGISTRY_INSPECTION_TTL: int = Field(300, env="REGISTRY_INSPECTION_TTL")
+    REGISTRY_INSPECTION_PARALLELISM: int = Field(8, env="REGISTRY_INSPECTION_PARALLELISM")
+    TEST_SELECTION_BASE_REF: str = Field("origin/main", env="TEST_SELECTION_BASE_REF")
+    TEST_SELECTION_FULL_RUN_BRANCHES: List[str] = Field(["main", "master"], env="TEST_SELECTION_FULL_RUN_BRANCHES")
+    TEST_SHARDS: Optional[int] = Field(None, env="TEST_SHARDS")
+    TEST_REPORT_PATH: str = Field("test-results/junit.xml", env="TEST_REPORT_PATH")
+    TASK_CACHE_EXPIRATION: int = Field(7 * 24 * 3600, env="TASK_CACHE_EXPIRATION")
+    CACHE_VOLUME_MAIN_BRANCHES: List[str] = Field(["main", "master"], env="CACHE_VOLUME_MAIN_BRANCHES")
+    CACHE_VOLUME_MAX_AGE: int = Field(14 * 24 * 3600, env="CACHE_VOLUME_MAX_AGE")
+    CACHE_VOLUMES_MAX_BYTES: int = Field(50 * 1024**3, env="CACHE_VOLUMES_MAX_BYTES")
+    CACHE_SNAPSHOT_STORE: Optional[str] = Field(None, env="CACHE_SNAPSHOT_STORE")
+    CACHE_SNAPSHOT_S3_ENDPOINT_URL: Optional[str] = Field(None, env="CACHE_SNAPSHOT_S3_ENDPOINT_URL")
+    CACHE_SNAPSHOT_VOLUMES: List[str] = Field(["pip_cache", "poetry_cache", "gradle-cache"], env="CACHE_SNAPSHOT_VOLUMES")
+    CACHE_SNAPSHOT_RESTORE: bool = Field(False, env="CACHE_SNAPSHOT_RESTORE")
+    CACHE_SNAPSHOT_PARALLELISM: int = Field(4, env="CACHE_SNAPSHOT_PARALLELISM")
+    SEED_FROM_HOST_CACHES: bool = Field(False, env="AIRCMD_SEED_FROM_HOST_CACHES")
+    SYNC_TO_HOST_CACHES: bool = Field(False, env="AIRCMD_SYNC_TO_HOST_CACHES")
+    ARTIFACT_STORE_MAX_BYTES: int = Field(5 * 1024**3, env="ARTIFACT_STORE_MAX_BYTES")
+    SCHEDULER_CPUS: Optional[float] = Field(None, env="SCHEDULER_CPUS")
+    SCHEDULER_MEMORY_MB: Optional[int] = Field(None, env="SCHEDULER_MEMORY_MB")
+    PIPELINE_PARALLELISM: int = Field(4, env="PIPELINE_PARALLELISM")
+    WARMUP_PARALLELISM: int = Field(4, env="WARMUP_PARALLELISM")
+    IMAGES_LOCKFILE: str = Field("aircmd-images.lock.json", env="AIRCMD_IMAGES_LOCKFILE")
     GRADLE_HOMEDIR_PATH: str = Field("/root/.gradle", env="GRADLE_HOMEDIR_PATH")
     GRADLE_CACHE_VOLUME_PATH: str = Field("/root/gradle-cache", env="GRADLE_CACHE_VOLUME_PATH")
 
@@ -118,7 +149,14 @@ class GlobalSettings(BaseSettings, Singleton):
     SECRET_DOCKER_HUB_USERNAME: Optional[SecretStr] = Field(None, env="SECRET_DOCKER_HUB_USERNAME")
     SECRET_DOCKER_HUB_PASSWORD: Optional[SecretStr] = Field(None, env="SECRET_DOCKER_HUB_PASSWORD")
     SECRET_TAILSCALE_AUTHKEY: Optional[SecretStr] = Field(None, env="SECRET_TAILSCALE_AUTHKEY")
+    SECRET_CACHE_SNAPSHOT_S3_ACCESS_KEY_ID: Optional[SecretStr] = Field(None, env="SECRET_CACHE_SNAPSHOT_S3_ACCESS_KEY_ID")
+    SECRET_CACHE_SNAPSHOT_S3_SECRET_ACCESS_KEY: Optional[SecretStr] = Field(None, env="SECRET_CACHE_SNAPSHOT_S3_SECRET_ACCESS_KEY")
     
+    SYSTEM_PACKAGES_INDEX_MAX_AGE: int = Field(360, env="SYSTEM_PACKAGES_INDEX_MAX_AGE")
+    PYTHON_INSTALLER: str = Field("pip", env="PYTHON_INSTALLER")
+    PIP_VERSION: str = Field("23.2.1", env="PIP_VERSION")
+    UV_VERSION: str = Field("0.4.30", env="UV_VERSION")
+    POETRY_VERSION: str = Field("1.5.1", env="POETRY_VERSION")
     PIP_CACHE_DIR: str = Field(
         default_factory=lambda: platformdirs.user_cache_dir("pip"),
         env="PIP_CACHE_DIR"
@@ -1,12 +1,16 @@
 
 
-from typing import Optional
+from typing import List, Optional
 
 from dagger import Client, Container
 from prefect import flow
 
+from aircmd.actions.cache_snapshots import restore_cache_snapshots
+from aircmd.actions.graph import PipelineGraph
+from aircmd.actions.host_caches import seed_cache_volumes_from_host, sync_cache_volumes_to_host
 from aircmd.models.base import PipelineContext
 from aircmd.models.click_commands import ClickCommandMetadata, ClickGroup
+from aircmd.models.click_params import ClickFlag
 from aircmd.models.click_utils import LazyPassDecorator
 from aircmd.models.github import github_integration
 from aircmd.models.plugins import DeveloperPlugin
@@ -21,28 +25,42 @@ pass_global_settings: LazyPassDecorator = LazyPassDecorator(GlobalSettings)
 
 core_group = ClickGroup(group_name="core", group_help="Commands for developing on aircmd")
 
+# The test step reuses the wheel of the build step, which runs once even when several steps need it
+core_graph = PipelineGraph()
+core_graph.add_step("build", build_task)
+core_graph.add_step("test", test_task, inputs={"build_result": "build"})
+
+
+NO_CACHE_FLAG = ClickFlag(name="--no-cache", help="Run the tasks even if they succeeded on identical inputs before")
+
 
 class BuildCommand(ClickCommandMetadata):
     command_name: str = "build"
     command_help: str = "Builds aircmd"
+    flags: List[ClickFlag] = [NO_CACHE_FLAG]
 
 class TestCommand(ClickCommandMetadata):
     command_name: str = "test"
     command_help: str = "Tests aircmd"
+    flags: List[ClickFlag] = [NO_CACHE_FLAG]
 
 class CICommand(ClickCommandMetadata):
     command_name: str = "ci"
     command_help: str = "Run CI for aircmd"
+    flags: List[ClickFlag] = [NO_CACHE_FLAG]
 
 @core_group.command(BuildCommand())
 @pass_pipeline_context
 @pass_global_settings
 @flow(validate_parameters=False, name="Aircmd Core Build")
 @github_integration
-async def build(ctx: PipelineContext,settings: GlobalSettings, client: Optional[Client] = None) ->  Container:
+async def build(ctx: PipelineContext,settings: GlobalSettings, no_cache: bool = False, client: Optional[Client] = None) ->  Container:
     build_client = await ctx.get_dagger_client(client, ctx.prefect_flow_run_context.flow_run.name)
-    build_future = await build_task.submit(build_client, settings)
-    result = await build_future.result()
+    await restore_cache_snapshots(build_client, settings)
+    await seed_cache_volumes_from_host(build_client, settings)
+    outputs = await core_graph.run(["build"], settings.PIPELINE_PARALLELISM, client=build_client, settings=settings, use_cache=not no_cache)
+    await sync_cache_volumes_to_host(build_client, settings)
+    result: Container = outputs["build"]
     return result
 
 @core_group.command(TestCommand())
@@ -50,11 +68,13 @@ async def build(ctx: PipelineContext,settings: GlobalSettings, client: Optional[
 @pass_global_settings
 @flow(validate_parameters=False, name="Aircmd Core Test")
 @github_integration
-async def test(ctx: PipelineContext, settings: GlobalSettings, client: Optional[Client] = None) -> Container:
+async def test(ctx: PipelineContext, settings: GlobalSettings, no_cache: bool = False, client: Optional[Client] = None) -> Container:
     test_client = await ctx.get_dagger_client(client, ctx.prefect_flow_run_context.flow_run.name)
-    build_result = await build()
-    test_future = await test_task.submit(test_client, settings, build_result)
-    result = await test_future.result()
+    await restore_cache_snapshots(test_client, settings)
+    await seed_cache_volumes_from_host(test_client, settings)
+    outputs = await core_graph.run(["test"], settings.PIPELINE_PARALLELISM, client=test_client, settings=settings, use_cache=not no_cache)
+    await sync_cache_volumes_to_host(test_client, settings)
+    result: Container = outputs["test"]
     return result
 
 @core_group.command(CICommand())
@@ -62,9 +82,13 @@ async def test(ctx: PipelineContext, settings: GlobalSettings, client: Optional[
 @pass_global_settings
 @flow(validate_parameters=False, name = "Aircmd Core CI")
 @github_integration
-async def ci(ctx: PipelineContext, settings: GlobalSettings, client: Optional[Client] = None) -> Container:
-    await ctx.get_dagger_client(client, ctx.prefect_flow_run_context.flow_run.name)
-    test_result:Container = await test()
+async def ci(ctx: PipelineContext, settings: GlobalSettings, no_cache: bool = False, client: Optional[Client] = None) -> Container:
+    ci_client = await ctx.get_dagger_client(client, ctx.prefect_flow_run_context.flow_run.name)
+    await restore_cache_snapshots(ci_client, settings)
+    await seed_cache_volumes_from_host(ci_client, settings)
+    outputs = await core_graph.run(["build", "test"], settings.PIPELINE_PARALLELISM, client=ci_client, settings=settings, use_cache=not no_cache)
+    await sync_cache_volumes_to_host(ci_client, settings)
+    test_result: Container = outputs["test"]
     return test_result
 
 
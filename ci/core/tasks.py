@@ -1,15 +1,50 @@
+import os
+import time
+
 from dagger import CacheVolume, Client, Container
 from prefect import task
 
+from aircmd.actions.artifacts import ArtifactStore
+from aircmd.actions.asyncutils import gather
+from aircmd.actions.cache_volumes import get_cache_volume
+from aircmd.actions.constants import PYTHON_IMAGE
 from aircmd.actions.environments import with_poetry
+from aircmd.actions.sharding import TestTimings, get_junit_durations, merge_junit_reports, run_pytest_shard, shard_tests
+from aircmd.actions.task_cache import TaskInputs, TaskResultCache, get_task_cache_key
+from aircmd.actions.test_selection import get_test_modules, select_tests_since_base_ref
 from aircmd.models.settings import GlobalSettings
 
+BUILD_SOURCES = ["./pyproject.toml", "./poetry.lock", "./ci", "./aircmd"]
+TEST_SOURCES = ["./tests"] + BUILD_SOURCES
+
+INSTALLER_SETTINGS = ["PYTHON_INSTALLER", "PIP_VERSION", "UV_VERSION", "POETRY_VERSION"]
+BUILD_INPUTS = TaskInputs(host_paths=BUILD_SOURCES, settings_fields=INSTALLER_SETTINGS, images=[PYTHON_IMAGE])
+TEST_INPUTS = TaskInputs(host_paths=TEST_SOURCES, settings_fields=INSTALLER_SETTINGS, images=[PYTHON_IMAGE])
+
+
+def with_test_report(container: Container, settings: GlobalSettings, junit_xml: str) -> Container:
+    """Write the JUnit report of a test run to the host TEST_REPORT_PATH and to the container, relative to /src."""
+    os.makedirs(os.path.dirname(settings.TEST_REPORT_PATH) or ".", exist_ok=True)
+    with open(settings.TEST_REPORT_PATH, "w") as f:
+        f.write(junit_xml)
+    return container.with_new_file(os.path.join("/src", settings.TEST_REPORT_PATH), junit_xml)
+
 
 @task
-async def build_task(client: Client, settings: GlobalSettings) -> Container:
-    mypy_cache: CacheVolume = client.cache_volume("mypy_cache")
-    result = (with_poetry(client)
-            .with_directory("/src", client.host().directory(".", include=["./pyproject.toml", "./poetry.lock", "./ci", "./aircmd"]))
+async def build_task(client: Client, settings: GlobalSettings, use_cache: bool = True) -> Container:
+    # The outcome of a build is the digest of its wheel in the artifact store, reused as is on identical inputs
+    task_cache = TaskResultCache.from_settings(settings, use_cache)
+    artifact_store = ArtifactStore.from_settings(settings)
+    cache_key = get_task_cache_key("aircmd-core-build", BUILD_INPUTS, settings)
+    if (cached_result := task_cache.get(cache_key)) is not None:
+        stored_wheel = artifact_store.fetch_directory(client, cached_result.outcome)
+        if stored_wheel is not None:
+            print(f"Reusing the wheel built from identical sources on {time.ctime(cached_result.recorded_at)}")
+            return client.container().with_directory("/src/dist", stored_wheel)
+
+    mypy_cache: CacheVolume = get_cache_volume(client, "mypy_cache", settings, plugin="core_ci")
+    result = (with_poetry(client, settings)
+            .with_directory("/src", client.host().directory(".", include=BUILD_SOURCES))
             .with_workdir("/src")
             .with_exec(["poetry", "install"])
             .with_mounted_cache("/src/.mypy_cache", mypy_cache)
@@ -18,19 +53,58 @@ async def build_task(client: Client, settings: GlobalSettings) -> Container:
             .with_exec(["poetry", "build"])
     )
     await result.sync()
+    wheel_digest = await artifact_store.publish_directory(result.directory("/src/dist"))
+    task_cache.put(cache_key, "aircmd-core-build", wheel_digest)
     return result
 
 @task
-async def test_task(client: Client, settings: GlobalSettings, build_result: Container) -> Container:
-    mypy_cache: CacheVolume = client.cache_volume("mypy_cache")
-    result = (with_poetry(client)
-            .with_directory("/src", client.host().directory(".", include=["./tests", "./pyproject.toml", "./poetry.lock", "./ci", "./aircmd"]))
+async def test_task(client: Client, settings: GlobalSettings, build_result: Container, use_cache: bool = True) -> Container:
+    # Tests which passed on identical sources are not run again, their recorded report is returned instead
+    task_cache = TaskResultCache.from_settings(settings, use_cache)
+    cache_key = get_task_cache_key("aircmd-core-test", TEST_INPUTS, settings)
+    if (cached_result := task_cache.get(cache_key)) is not None and cached_result.outcome is not None:
+        print(f"Skipping the tests, they passed on identical sources on {time.ctime(cached_result.recorded_at)}")
+        return with_test_report(client.container(), settings, cached_result.outcome)
+
+    test_selection = select_tests_since_base_ref(settings, source_roots=["aircmd", "ci"], test_roots=["tests"])
+    print(test_selection)
+    if not test_selection.full_run and not test_selection.selected:
+        # An empty report, no test covers the changes
+        return with_test_report(client.container(), settings, merge_junit_reports([]))
+
+    # The installed environment is shared by the shards, each shard runs a balanced subset of the test modules on top of it
+    mypy_cache: CacheVolume = get_cache_volume(client, "mypy_cache", settings, plugin="core_ci")
+    environment = (with_poetry(client, settings)
+            .with_directory("/src", client.host().directory(".", include=TEST_SOURCES))
             .with_workdir("/src")
             .with_mounted_cache("/src/.mypy_cache", mypy_cache)
             .with_directory("/src/dist", build_result.directory("/src/dist"))  # Mount the wheel directory
             .with_exec(["poetry", "install", "--only", "test"])  # Install the dependencies using Poetry
             .with_exec(["sh", "-c", "poetry run pip install $(find /src/dist -name 'aircmd-*.whl')"])  # Install the wheel file using Poetry
-            .with_exec(["poetry", "run", "pytest"])  # Run the tests using Poetry
     )
-    await result.sync()
-    return result
+    await environment.sync()
+
+    test_files = get_test_modules(["tests"]) if test_selection.full_run else test_selection.selected
+    timings_path = os.path.join(settings.CACHE_DIR, "test-timings", "aircmd-core.json")
+    timings = TestTimings.load(timings_path)
+    shards = shard_tests(test_files, settings.TEST_SHARDS or os.cpu_count() or 1, timings)
+    shard_results = await gather(
+        *[run_pytest_shard] * len(shards),
+        args=[(client, environment, index, shard, ["poetry", "run", "pytest"]) for index, shard in enumerate(shards)],
+    )
+    for shard_result in shard_results:
+        print(shard_result)
+
+    junit_xmls = [shard_result.junit_xml for shard_result in shard_results if shard_result.junit_xml]
+    test_report = merge_junit_reports(junit_xmls)
+    environment = with_test_report(environment, settings, test_report)
+    durations = {path: duration for junit_xml in junit_xmls for path, duration in get_junit_durations(junit_xml, test_files).items()}
+    timings.update(durations).save(timings_path)
+
+    failed_shards = [shard_result for shard_result in shard_results if not shard_result.passed]
+    if failed_shards:
+        raise RuntimeError(f"{len(failed_shards)}/{len(shard_results)} test shards failed, check the report at {settings.TEST_REPORT_PATH}")
+    # Only a full run vouches for the whole tree
+    if test_selection.full_run:
+        task_cache.put(cache_key, "aircmd-core-test", test_report)
+    return environment
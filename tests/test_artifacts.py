@@ -0,0 +1,30 @@
+import os
+from pathlib import Path
+
+from aircmd.actions.artifacts import ArtifactStore, get_directory_digest
+
+
+def stage(store: ArtifactStore, content: bytes) -> str:
+    staging_path = store._staging_path()
+    with open(os.path.join(staging_path, "aircmd-0.1.0-py3-none-any.whl"), "wb") as f:
+        f.write(content)
+    return staging_path
+
+
+def test_artifact_store_deduplicates_and_evicts_least_recently_used(tmp_path: Path) -> None:
+    store = ArtifactStore(str(tmp_path), max_bytes=250)
+
+    first = store._add(stage(store, b"a" * 100), key="wheel-sources-1")
+    assert store._add(stage(store, b"a" * 100), key="wheel-sources-2") == first
+    assert store.resolve("wheel-sources-1") == store.resolve("wheel-sources-2") == first
+    assert get_directory_digest(str(store.get_path(first))) == first
+
+    second = store._add(stage(store, b"b" * 100), key="wheel-sources-3")
+    os.utime(str(store.get_path(second)), (1, 1))
+    # The second artifact is now the least recently used one
+    third = store._add(stage(store, b"c" * 100), key="wheel-sources-4")
+
+    assert store.resolve("wheel-sources-3") is None
+    assert store.get_path(first) is not None
+    assert store.get_path(third) is not None
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".staging-")]
@@ -0,0 +1,105 @@
+import asyncio
+from typing import List, Tuple
+
+import pytest
+
+from aircmd.actions.asyncutils import gather, gather_iter
+
+
+class InFlightCounter:
+    def __init__(self) -> None:
+        self.started = 0
+        self.in_flight = 0
+        self.peak = 0
+        self.cancelled = 0
+
+    async def work(self, value: int, duration: float = 0.01) -> int:
+        self.started += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(duration)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.in_flight -= 1
+        if value < 0:
+            raise ValueError(f"negative value {value}")
+        return value * 2
+
+
+@pytest.mark.parametrize("limit", [1, 8, 32, None])
+def test_gather_keeps_at_most_limit_calls_in_flight(limit: int) -> None:
+    counter = InFlightCounter()
+    calls = 200
+    results = asyncio.run(gather(*[counter.work] * calls, args=[(i,) for i in range(calls)], limit=limit))
+
+    assert results == [i * 2 for i in range(calls)]
+    assert counter.started == calls
+    assert counter.peak == (limit or calls)
+    assert counter.in_flight == 0
+
+
+def test_gather_iter_collects_errors_and_respects_semaphores() -> None:
+    counter = InFlightCounter()
+    semaphore = asyncio.Semaphore(2)
+
+    async def collect() -> List[tuple]:
+        return [
+            (result.index, result.result, type(result.error).__name__ if result.error else None)
+            async for result in gather_iter(
+                *[counter.work] * 6, args=[(1,), (-1,), (3,), (4,), (5,), (6,)], semaphores=[semaphore] * 6, fail_fast=False
+            )
+        ]
+
+    results = asyncio.run(collect())
+    assert sorted(results) == [(0, 2, None), (1, None, "ValueError"), (2, 6, None), (3, 8, None), (4, 10, None), (5, 12, None)]
+    assert counter.peak == 2
+
+
+def test_gather_fails_fast_and_cancels_in_flight_calls() -> None:
+    counter = InFlightCounter()
+
+    async def slow(value: int) -> int:
+        return await counter.work(value, duration=10)
+
+    with pytest.raises(ValueError, match="negative value"):
+        asyncio.run(gather(slow, slow, counter.work, args=[(1,), (2,), (-1,)]))
+    assert counter.cancelled == 2
+    assert counter.in_flight == 0
+
+
+def test_gather_fails_fast_without_starting_more_calls() -> None:
+    counter = InFlightCounter()
+
+    with pytest.raises(ValueError, match="negative value"):
+        asyncio.run(gather(*[counter.work] * 4, args=[(-1,), (1,), (2,), (3,)], limit=1))
+    assert counter.started == 1
+
+
+def test_gather_iter_starts_the_next_call_as_soon_as_one_finishes() -> None:
+    counter = InFlightCounter()
+    # One slow call and short ones: the short calls take turns in the other slot while the slow one runs, instead of
+    # waiting for the whole batch to finish
+    durations = [0.5, 0.1, 0.1, 0.1, 0.1]
+
+    async def bounded() -> Tuple[List[int], float]:
+        start = asyncio.get_running_loop().time()
+        completion_order = [
+            result.index
+            async for result in gather_iter(*[counter.work] * len(durations), args=[(i, duration) for i, duration in enumerate(durations)], limit=2)
+        ]
+        return completion_order, asyncio.get_running_loop().time() - start
+
+    async def unbounded() -> float:
+        start = asyncio.get_running_loop().time()
+        await asyncio.gather(*[counter.work(i, duration) for i, duration in enumerate(durations)])
+        return asyncio.get_running_loop().time() - start
+
+    completion_order, bounded_duration = asyncio.run(bounded())
+    assert completion_order == [1, 2, 3, 4, 0]
+    assert counter.peak == 2
+    # As fast as the unbounded gather, batches of 2 would take 0.5 + 0.1 + 0.1 seconds
+    unbounded_duration = asyncio.run(unbounded())
+    assert bounded_duration < unbounded_duration + 0.1
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import subprocess
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+from asyncclick import ClickException
+from pydantic import BaseModel
+
+from aircmd.actions.cache_snapshots import SNAPSHOT_MARKER, LocalSnapshotStore, S3SnapshotStore, get_snapshot_store, get_volume_digest_command
+from aircmd.core.cache import get_volumes_option
+
+
+class FakeSettings(BaseModel):
+    CACHE_DIR: str
+    CACHE_SNAPSHOT_STORE: Optional[str] = None
+
+
+def get_digest(path: Path) -> str:
+    return subprocess.run(get_volume_digest_command(), cwd=path, capture_output=True, text=True, check=True).stdout.strip()
+
+
+def test_volume_digest_tracks_contents_but_not_the_marker(tmp_path: Path) -> None:
+    (tmp_path / "wheels").mkdir()
+    (tmp_path / "wheels" / "a.whl").write_text("a")
+    os.symlink("wheels/a.whl", tmp_path / "latest.whl")
+    digest = get_digest(tmp_path)
+
+    (tmp_path / SNAPSHOT_MARKER).write_text("previous digest")
+    assert get_digest(tmp_path) == digest
+    (tmp_path / "wheels" / "a.whl").write_text("b")
+    assert get_digest(tmp_path) != digest
+    digest = get_digest(tmp_path)
+    os.remove(tmp_path / "latest.whl")
+    os.symlink("wheels/b.whl", tmp_path / "latest.whl")
+    assert get_digest(tmp_path) != digest
+
+
+def test_local_store_refs(tmp_path: Path) -> None:
+    store = LocalSnapshotStore(None, str(tmp_path))  # type: ignore[arg-type]
+    assert asyncio.run(store.get_ref("pip_cache")) is None
+    asyncio.run(store.set_ref("pip_cache", "abc"))
+    assert asyncio.run(store.get_ref("pip_cache")) == "abc"
+    assert not asyncio.run(store.has("abc"))
+    (tmp_path / "objects").mkdir()
+    (tmp_path / "objects" / "abc.tar.gz").write_bytes(b"")
+    assert asyncio.run(store.has("abc"))
+
+
+def test_snapshot_store_location(tmp_path: Path) -> None:
+    default_store = get_snapshot_store(None, FakeSettings(CACHE_DIR=str(tmp_path)))  # type: ignore[arg-type]
+    assert isinstance(default_store, LocalSnapshotStore) and default_store.root == str(tmp_path / "cache-snapshots")
+    s3_store = get_snapshot_store(None, FakeSettings(CACHE_DIR=str(tmp_path), CACHE_SNAPSHOT_STORE="s3://runners/caches/"))  # type: ignore[arg-type]
+    assert isinstance(s3_store, S3SnapshotStore) and s3_store.url == "s3://runners/caches"
+
+
+def test_plugin_scoped_volumes_cannot_be_snapshotted() -> None:
+    class Settings(BaseModel):
+        GIT_CURRENT_BRANCH: str = "main"
+        CACHE_VOLUME_MAIN_BRANCHES: List[str] = ["main"]
+
+    with pytest.raises(ClickException):
+        get_volumes_option(Settings(), "pip_cache,mypy_cache")  # type: ignore[arg-type]
@@ -0,0 +1,90 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+import pytest
+from pydantic import BaseModel
+
+from aircmd.actions import cache_volumes
+from aircmd.actions.cache_volumes import (
+    CacheVolumeInventory,
+    CacheVolumeRecord,
+    CacheVolumeScope,
+    get_cache_volume_name,
+    get_inventory_path,
+    plan_cache_volume_prune,
+    record_cache_volume_use,
+)
+
+DAY = 24 * 3600
+
+
+class FakeSettings(BaseModel):
+    GIT_CURRENT_BRANCH: str = "main"
+    CACHE_VOLUME_MAIN_BRANCHES: List[str] = ["main", "master"]
+    CACHE_DIR: str = "."
+
+
+@pytest.mark.parametrize(
+    "branch, expected",
+    [("master", "gradle-cache-branch-main"), ("release/1.2", "gradle-cache-branch-release"), ("fix-typo", "gradle-cache-branch-dev")],
+)
+def test_branch_scoped_volumes_are_namespaced_per_branch_family(branch: str, expected: str) -> None:
+    assert get_cache_volume_name("gradle-cache", FakeSettings(GIT_CURRENT_BRANCH=branch)) == expected  # type: ignore[arg-type]
+
+
+def test_volume_names_by_scope() -> None:
+    settings = FakeSettings(GIT_CURRENT_BRANCH="feature/cache")
+    assert get_cache_volume_name("pip_cache", settings) == "pip_cache"  # type: ignore[arg-type]
+    assert get_cache_volume_name("mypy_cache", settings, plugin="core_ci") == "mypy_cache-plugin-core_ci"  # type: ignore[arg-type]
+    assert get_cache_volume_name("docker_cache", settings, instance="pool-1") == "docker_cache-branch-feature-pool-1"  # type: ignore[arg-type]
+    with pytest.raises(ValueError):
+        get_cache_volume_name("mypy_cache", settings)  # type: ignore[arg-type]
+    with pytest.raises(ValueError):
+        get_cache_volume_name("unregistered", settings)  # type: ignore[arg-type]
+
+
+def test_volume_uses_are_recorded_in_the_inventory(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(cache_volumes, "_recorded_volumes", set())
+    settings = FakeSettings(CACHE_DIR=str(tmp_path))
+    record_cache_volume_use(settings, "gradle-cache-branch-main", "gradle-cache")  # type: ignore[arg-type]
+    record_cache_volume_use(settings, "pip_cache", "pip_cache")  # type: ignore[arg-type]
+
+    inventory = CacheVolumeInventory.load(get_inventory_path(settings))  # type: ignore[arg-type]
+    assert sorted(inventory.volumes) == ["gradle-cache-branch-main", "pip_cache"]
+    assert inventory.volumes["gradle-cache-branch-main"].namespace == "branch-main"
+    assert inventory.volumes["pip_cache"].scope == CacheVolumeScope.SHARED
+
+
+def test_concurrent_inventory_updates_are_not_lost(tmp_path: Path) -> None:
+    inventory_path = str(tmp_path / "cache-volumes.json")
+
+    def record(volume: str) -> None:
+        with CacheVolumeInventory.update(inventory_path) as inventory:
+            # Without the lock, the other updates would load the inventory in the meantime and overwrite this one
+            time.sleep(0.01)
+            inventory.volumes[volume] = CacheVolumeRecord(volume=volume, name=volume, scope=CacheVolumeScope.SHARED, first_used_at=0, last_used_at=0)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(record, [f"volume-{i}" for i in range(8)]))
+    assert sorted(CacheVolumeInventory.load(inventory_path).volumes) == [f"volume-{i}" for i in range(8)]
+
+
+def test_prune_plan_evicts_unused_then_least_recently_used_volumes() -> None:
+    now = 100 * DAY
+
+    def record(volume: str, last_used_days_ago: int, size_bytes: int) -> CacheVolumeRecord:
+        last_used_at = now - last_used_days_ago * DAY
+        return CacheVolumeRecord(
+            volume=volume, name=volume, scope=CacheVolumeScope.SHARED, first_used_at=0, last_used_at=last_used_at, size_bytes=size_bytes
+        )
+
+    inventory = CacheVolumeInventory(volumes={
+        "stale": record("stale", 30, 1),
+        "old": record("old", 5, 40),
+        "recent": record("recent", 2, 40),
+        "hot": record("hot", 0, 40),
+    })
+    assert plan_cache_volume_prune(inventory, max_age=14 * DAY, max_bytes=100, now=now) == ["stale", "old"]
+    assert plan_cache_volume_prune(inventory, max_age=60 * DAY, max_bytes=1000, now=now) == []
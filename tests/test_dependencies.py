@@ -0,0 +1,109 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from aircmd.actions.dependencies import (
+    SETUP_METADATA_SCRIPT,
+    LocalDependencyGraph,
+    LocalDependencyResolver,
+    get_manifest_requirements,
+    get_pyproject_requirements,
+    parse_local_requirement,
+    parse_requirement_include,
+    parse_setup_metadata,
+)
+
+
+def test_parse_local_requirement() -> None:
+    assert parse_local_requirement("-e ../bases/connector-acceptance-test") == "../bases/connector-acceptance-test"
+    assert parse_local_requirement("-e .[tests]") == "."
+    assert parse_local_requirement("file:../common  # shared helpers") == "../common"
+    assert parse_local_requirement("requests==2.31.0") is None
+    assert parse_local_requirement("# -e ../commented") is None
+
+
+def test_parse_requirement_include() -> None:
+    assert parse_requirement_include("-r requirements-dev.txt") == "requirements-dev.txt"
+    assert parse_requirement_include("--constraint=../constraints.txt  # pins") == "../constraints.txt"
+    assert parse_requirement_include("-e ../common") is None
+    assert parse_requirement_include("requests==2.31.0") is None
+
+
+def test_get_pyproject_requirements() -> None:
+    pyproject_toml = """
+[project]
+name = "source_a"
+dependencies = ["requests>=2", "common @ file:///common"]
+
+[project.optional-dependencies]
+tests = ["pytest", "source-a[docs]"]
+"""
+    assert get_pyproject_requirements(pyproject_toml) == ["requests>=2", "common @ file:///common"]
+    assert get_pyproject_requirements(pyproject_toml, ["tests"]) == ["requests>=2", "common @ file:///common", "pytest"]
+    assert get_pyproject_requirements("[tool.poetry.dependencies]\npython = \"^3.11\"\n") is None
+
+
+SETUP_METADATA = json.dumps({"install_requires": ["requests>=2", 'tomli; python_version < "3.12"'], "extras_require": {"tests": ["pytest"]}})
+
+
+def test_parse_setup_metadata() -> None:
+    assert parse_setup_metadata(SETUP_METADATA) == ["requests>=2", 'tomli; python_version < "3.12"']
+    assert parse_setup_metadata(SETUP_METADATA, ["tests"]) == ["requests>=2", 'tomli; python_version < "3.12"', "pytest"]
+    # setup.py failed without the package sources
+    assert parse_setup_metadata("") is None
+
+
+def test_setup_metadata_script_does_not_need_the_package_sources(tmp_path: Path) -> None:
+    (tmp_path / "setup.py").write_text(
+        'from setuptools import setup\n'
+        'setup(name="demo", packages=["demo"], install_requires=["requests>=2"], extras_require={"tests:python_version >= \'3\'": ["pytest"]})\n'
+    )
+    output = subprocess.run([sys.executable, "-c", SETUP_METADATA_SCRIPT], cwd=tmp_path, capture_output=True, text=True, check=True).stdout
+    assert parse_setup_metadata(output, ["tests"]) == ["requests>=2", "pytest; python_version >= '3'"]
+
+    (tmp_path / "setup.py").write_text("from demo import __version__\n")
+    output = subprocess.run([sys.executable, "-c", SETUP_METADATA_SCRIPT], cwd=tmp_path, capture_output=True, text=True, check=True).stdout
+    assert parse_setup_metadata(output) is None
+
+
+def test_manifest_requirements_are_complete_when_the_metadata_declares_them() -> None:
+    requirements_txt = "-e .\n-r requirements-dev.txt\n"
+    requirements = get_manifest_requirements(requirements_txt, None, SETUP_METADATA)
+    assert requirements.requirements == ["-r requirements-dev.txt", "requests>=2", 'tomli; python_version < "3.12"']
+    assert requirements.complete
+    assert not get_manifest_requirements(requirements_txt, None, "").complete
+    assert not get_manifest_requirements(None, "[tool.poetry]\nname = \"a\"\n", None).complete
+    # Local path dependencies are left to pip
+    assert not get_manifest_requirements(None, '[project]\nname = "a"\ndependencies = ["b @ file:///b"]\n', None).complete
+
+
+def test_resolve_local_dependency_graph(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    files = {
+        "connectors/source-a/requirements.txt": "-e .\n-e ../../cdk\n-e ../../common\nrequests\n",
+        "connectors/source-a/setup.py": "",
+        "common/pyproject.toml": '[tool.poetry.dependencies]\npython = "^3.11"\ncdk = {path = "../cdk", develop = true}\n',
+        "cdk/setup.py": "",
+    }
+    for path, content in files.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(content)
+    monkeypatch.chdir(tmp_path)
+
+    cache_dir = str(tmp_path / "cache")
+    graph = LocalDependencyResolver(cache_dir, "abc123").resolve("connectors/source-a")
+
+    assert graph.nodes == {"connectors/source-a": ["cdk", "common"], "cdk": [], "common": ["cdk"]}
+    assert graph.local_dependencies == ["cdk", "common"]
+    assert LocalDependencyResolver(cache_dir, "abc123").resolve("connectors/source-a/") == graph
+
+    (tmp_path / "cdk/requirements.txt").write_text("-e ../common\n")
+    with pytest.raises(ValueError):
+        LocalDependencyResolver(cache_dir, "abc123").resolve("connectors/source-a")
+
+
+def test_install_order_detects_cycles() -> None:
+    with pytest.raises(ValueError):
+        LocalDependencyGraph(root="a", nodes={"a": ["b"], "b": ["a"]}).install_order()
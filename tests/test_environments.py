@@ -0,0 +1,186 @@
+import asyncio
+import json
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, List, Optional
+
+import pytest
+from dagger import Container
+from pydantic import BaseModel
+
+from aircmd.actions import cache_volumes, environments
+from aircmd.actions.dependencies import ManifestRequirements
+from aircmd.actions.environments import (
+    get_dockerd_pool,
+    get_image_id_from_tarball_manifest,
+    get_package_install_command,
+    with_bound_docker_host,
+)
+from aircmd.actions.installers import PipInstaller
+from aircmd.actions.images import load_image_lock, write_image_lock
+from aircmd.actions.registry import get_inspection_script
+from aircmd.actions.warmup import warm_environments
+from aircmd.models.docker import DockerdPool, ImageLock, RegistryMirrorStats, RegistryQuery, RegistryResult
+
+
+def test_get_image_id_from_tarball_manifest() -> None:
+    legacy_manifest = json.dumps([{"Config": "abc123.json", "RepoTags": ["airbyte/source-foo:dev"], "Layers": []}])
+    oci_manifest = json.dumps([{"Config": "blobs/sha256/def456", "RepoTags": None, "Layers": []}])
+
+    assert get_image_id_from_tarball_manifest(legacy_manifest) == "sha256:abc123"
+    assert get_image_id_from_tarball_manifest(oci_manifest) == "sha256:def456"
+
+    with pytest.raises(ValueError):
+        get_image_id_from_tarball_manifest(json.dumps([]))
+
+
+def test_package_is_installed_without_dependencies_when_the_manifests_declare_them() -> None:
+    installer = PipInstaller(None)  # type: ignore[arg-type]
+    assert get_package_install_command(installer, ".[tests]", ManifestRequirements(requirements=["requests"], complete=True)) == [
+        "python", "-m", "pip", "install", "--no-deps", ".[tests]"
+    ]
+    assert "--no-deps" not in get_package_install_command(installer, ".", ManifestRequirements(complete=False))
+
+
+def test_dockerd_pool_assigns_least_loaded_daemon() -> None:
+    pool = DockerdPool(services=[Container.__new__(Container) for _ in range(3)])
+
+    assert [pool.acquire() for _ in range(3)] == [0, 1, 2]
+    pool.release(1)
+    assert pool.acquire() == 1
+    assert pool.acquire(2) == 2
+    assert pool.loads == [1, 1, 2]
+    assert pool.hostname(2) == "global-docker-host-2"
+    # Picking a daemon for a sync binding does not count in its load
+    assert pool.pick() == 0
+    assert pool.loads == [1, 1, 2]
+
+    with pytest.raises(ValueError):
+        DockerdPool(services=[])
+
+
+class FakeDockerSettings(BaseModel):
+    DOCKERD_POOL_SIZE: int = 1
+    REGISTRY_MIRROR_ENABLED: bool = False
+    GIT_CURRENT_BRANCH: str = "main"
+    CACHE_VOLUME_MAIN_BRANCHES: List[str] = ["main", "master"]
+    CACHE_DIR: str = "."
+
+
+class FakeContainer(Container):
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.bindings: List[str] = []
+
+    def with_env_variable(self, *args: Any, **kwargs: Any) -> Container:
+        return self
+
+    def with_service_binding(self, alias: str, service: Container) -> Container:
+        self.bindings.append(f"{alias}={getattr(service, 'name')}")
+        return self
+
+    def with_mounted_cache(self, *args: Any, **kwargs: Any) -> Container:
+        return self
+
+
+class FakeDaggerClient:
+    def cache_volume(self, key: str) -> str:
+        return key
+
+
+@pytest.mark.parametrize("pool_size, expected_binding", [(1, "global-docker-host=dockerd-None"), (3, "global-docker-host-0=dockerd-pool-0")])
+def test_flows_bind_to_the_dockerd_pool_when_it_is_enabled(
+    pool_size: int, expected_binding: str, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(cache_volumes, "_recorded_volumes", set())
+    monkeypatch.setattr(
+        environments,
+        "with_global_dockerd_service",
+        lambda client, settings, docker_service_name=None, registry_mirror=None: FakeContainer(f"dockerd-{docker_service_name}"),
+    )
+    context = SimpleNamespace(global_settings=FakeDockerSettings(DOCKERD_POOL_SIZE=pool_size, CACHE_DIR=str(tmp_path)), dockerd_service=None, dockerd_pool=None)
+    client = FakeDaggerClient()
+
+    pool: Optional[DockerdPool] = get_dockerd_pool(context, client)  # type: ignore[arg-type]
+    assert (pool is not None and len(pool) == pool_size) if pool_size > 1 else pool is None
+    assert context.dockerd_service is not None
+    # The docker hosts are only set up once
+    assert get_dockerd_pool(context, client) is pool  # type: ignore[arg-type]
+    bound = with_bound_docker_host(context, client, FakeContainer("flow"))  # type: ignore[arg-type]
+    assert bound.bindings == [expected_binding]  # type: ignore[attr-defined]
+
+
+def test_registry_mirror_stats_from_debug_vars() -> None:
+    debug_vars = json.dumps(
+        {
+            "cmdline": ["registry", "serve"],
+            "registry": {
+                "proxy": {
+                    "blobs": {"Requests": 4, "Hits": 3, "Misses": 1, "BytesPulled": 2048, "BytesPushed": 8192},
+                    "manifests": {"Requests": 2, "Hits": 0, "Misses": 2, "BytesPulled": 10, "BytesPushed": 10},
+                }
+            },
+        }
+    )
+    stats = RegistryMirrorStats.from_debug_vars(debug_vars)
+
+    assert stats.blobs.hits == 3
+    assert stats.blobs.hit_rate == 0.75
+    assert stats.manifests.misses == 2
+    assert RegistryMirrorStats.from_debug_vars("{}").blobs.requests == 0
+
+
+def test_registry_inspection_script_and_results() -> None:
+    queries = [
+        RegistryQuery(kind="digest", reference="airbyte/source-foo:1.0.0"),
+        RegistryQuery(kind="tags", reference="airbyte/source-foo"),
+        RegistryQuery(kind="manifest", reference="airbyte/source-bar:$(whoami)"),
+    ]
+    script = get_inspection_script(queries, parallelism=2)
+
+    assert "crane digest airbyte/source-foo:1.0.0 > /out/0.out" in script
+    assert "crane manifest 'airbyte/source-bar:$(whoami)'" in script
+    assert script.split("\n").count("wait") == 2
+
+    tags = RegistryResult(query=queries[1], output="1.0.0\n1.1.0\n", fetched_at=0)
+    failed = RegistryResult(query=queries[0], error="MANIFEST_UNKNOWN", fetched_at=0)
+    assert tags.tags == ["1.0.0", "1.1.0"]
+    assert tags.digest is None
+    assert failed.digest is None
+
+
+def test_image_lock_pins_locked_images(tmp_path: Path) -> None:
+    lockfile_path = str(tmp_path / "aircmd-images.lock.json")
+    write_image_lock(lockfile_path, ImageLock(images={"python:3.11-slim": "sha256:abc"}))
+    image_lock = load_image_lock(lockfile_path)
+
+    assert image_lock.pin("python:3.11-slim") == "python:3.11-slim@sha256:abc"
+    assert image_lock.pin("docker:dind") == "docker:dind"
+    assert image_lock.pin("python:3.11-slim@sha256:def") == "python:3.11-slim@sha256:def"
+    assert load_image_lock(str(tmp_path / "missing.json")).images == {}
+
+
+def test_warm_environments_reports_cache_status(tmp_path: Path) -> None:
+    class FakeContainer:
+        def __init__(self, definition: str) -> None:
+            self.definition = definition
+
+        async def id(self) -> str:
+            return self.definition
+
+        async def sync(self) -> "FakeContainer":
+            if self.definition == "broken":
+                raise RuntimeError("pull failed")
+            return self
+
+    class FakeSettings:
+        CACHE_DIR = str(tmp_path)
+        WARMUP_PARALLELISM = 2
+
+    environments = {name: (lambda client, settings, n=name: FakeContainer(n)) for name in ("python", "broken")}
+    first = asyncio.run(warm_environments(None, FakeSettings(), environments))  # type: ignore[arg-type]
+    second = asyncio.run(warm_environments(None, FakeSettings(), environments))  # type: ignore[arg-type]
+
+    assert [(report.environment, report.warm, report.error) for report in first] == [("python", False, None), ("broken", False, "pull failed")]
+    assert second[0].warm
+    assert second[1].error == "pull failed"
@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Iterator
+
+import pytest
+
+from aircmd.actions.githubactions import GITHUB_ACTION_ARCHIVE_SCRIPT, get_github_action_archive
+
+
+class InterruptedResponse:
+    def __enter__(self) -> "InterruptedResponse":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        pass
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        yield b"partial"
+        raise ConnectionError("connection reset")
+
+
+def test_interrupted_action_download_leaves_no_file(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("requests.get", lambda *args, **kwargs: InterruptedResponse())
+
+    with pytest.raises(ConnectionError):
+        get_github_action_archive("owner/action", "v1", str(tmp_path))
+    assert os.listdir(tmp_path / "github-actions" / "owner" / "action") == []
+
+
+def test_action_archive_is_downloaded_to_the_cache_volume_once(tmp_path: Path) -> None:
+    release = tmp_path / "v1.tar.gz"
+    release.write_bytes(b"archive")
+    archive_path = tmp_path / "github-actions" / "owner" / "action" / "v1.tar.gz"
+
+    def fetch(output_name: str) -> bytes:
+        output_path = tmp_path / output_name
+        subprocess.run([sys.executable, "-c", GITHUB_ACTION_ARCHIVE_SCRIPT, release.as_uri(), str(archive_path), str(output_path)], check=True)
+        return output_path.read_bytes()
+
+    assert fetch("first.tar.gz") == b"archive"
+    release.unlink()
+    # The release is gone, the cached archive is copied
+    assert fetch("second.tar.gz") == b"archive"
+    assert os.listdir(archive_path.parent) == ["v1.tar.gz"]
@@ -0,0 +1,63 @@
+import asyncio
+from typing import Any, List
+
+import pytest
+
+from aircmd.actions.graph import PipelineGraph
+
+
+def test_pipeline_graph_runs_shared_steps_once() -> None:
+    calls: List[str] = []
+    running: List[str] = []
+    max_running = 0
+
+    def make_step(name: str) -> Any:
+        async def step(**kwargs: Any) -> str:
+            nonlocal max_running
+            calls.append(name)
+            running.append(name)
+            max_running = max(max_running, len(running))
+            await asyncio.sleep(0.01)
+            running.remove(name)
+            return "+".join([name] + sorted(value for key, value in kwargs.items() if key != "settings"))
+        return step
+
+    graph = PipelineGraph()
+    graph.add_step("build", make_step("build"))
+    graph.add_step("lint", make_step("lint"))
+    graph.add_step("unit", make_step("unit"), inputs={"wheel": "build"})
+    graph.add_step("integration", make_step("integration"), inputs={"wheel": "build"})
+    graph.add_step("publish", make_step("publish"), inputs={"unit": "unit", "integration": "integration", "lint": "lint"})
+
+    outputs = asyncio.run(graph.run(["publish", "unit"], parallelism=2, settings=None))
+
+    assert sorted(calls) == ["build", "integration", "lint", "publish", "unit"]
+    assert max_running == 2
+    assert outputs["publish"] == "publish+integration+build+lint+unit+build"
+
+    with pytest.raises(ValueError):
+        graph.add_step("build", make_step("build"))
+    with pytest.raises(ValueError):
+        graph.resolve(["deploy"])
+
+
+def test_pipeline_graph_cancels_running_steps_on_failure() -> None:
+    cancelled = []
+
+    async def fail() -> None:
+        raise RuntimeError("build failed")
+
+    async def slow() -> None:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append("slow")
+            raise
+
+    graph = PipelineGraph()
+    graph.add_step("build", fail)
+    graph.add_step("slow", slow)
+
+    with pytest.raises(RuntimeError, match="build failed"):
+        asyncio.run(graph.run(["build", "slow"]))
+    assert cancelled == ["slow"]
@@ -0,0 +1,55 @@
+import asyncio
+import subprocess
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from aircmd.actions.host_caches import get_host_caches, get_seed_script, seed_cache_volumes_from_host, sync_cache_volumes_to_host
+
+
+class FakeSettings(BaseModel):
+    PIP_CACHE_DIR: str
+    POETRY_CACHE_DIR: str
+    SEED_FROM_HOST_CACHES: bool = False
+    SYNC_TO_HOST_CACHES: bool = False
+
+
+def test_host_caches_missing_on_the_host_are_left_out(tmp_path: Path) -> None:
+    (tmp_path / "pip").mkdir()
+    settings = FakeSettings(PIP_CACHE_DIR=str(tmp_path / "pip"), POETRY_CACHE_DIR=str(tmp_path / "pypoetry"))
+    host_caches = get_host_caches(settings)  # type: ignore[arg-type]
+    assert [host_cache.volume for host_cache in host_caches] == ["pip_cache"]
+    # The poetry virtualenvs are not part of the cache volume
+    assert all(not pattern.startswith("virtualenvs") for host_cache in host_caches for pattern in host_cache.include)
+
+
+def test_host_caches_are_opt_in(tmp_path: Path) -> None:
+    (tmp_path / "pip").mkdir()
+    settings = FakeSettings(PIP_CACHE_DIR=str(tmp_path / "pip"), POETRY_CACHE_DIR=str(tmp_path / "pypoetry"))
+    # No engine call is made without the settings, the client is never used
+    assert asyncio.run(seed_cache_volumes_from_host(None, settings)) == []  # type: ignore[arg-type]
+    assert asyncio.run(sync_cache_volumes_to_host(None, settings)) == []  # type: ignore[arg-type]
+
+
+def test_seeding_refreshes_stale_files_of_the_same_path(tmp_path: Path) -> None:
+    host_cache, volume = tmp_path / "host", tmp_path / "volume"
+    for root in (host_cache, volume):
+        (root / "http" / "a").mkdir(parents=True)
+    (host_cache / "http" / "a" / "same").write_text("same")
+    (volume / "http" / "a" / "same").write_text("same")
+    (host_cache / "http" / "a" / "stale").write_text("refreshed on the host")
+    (volume / "http" / "a" / "stale").write_text("stale")
+    (host_cache / "wheels" / "b").mkdir(parents=True)
+    (host_cache / "wheels" / "b" / "new.whl").write_text("new")
+    (volume / "http" / "a" / "volume-only").write_text("kept")
+
+    output = subprocess.run(["sh", "-c", get_seed_script(str(host_cache))], cwd=volume, check=True, capture_output=True, text=True).stdout
+    assert output.split() == ["1", "1"]
+    assert (volume / "http" / "a" / "stale").read_text() == "refreshed on the host"
+    assert (volume / "wheels" / "b" / "new.whl").read_text() == "new"
+    assert (volume / "http" / "a" / "volume-only").read_text() == "kept"
+    assert sorted(path.name for path in (volume / "http" / "a").iterdir()) == ["same", "stale", "volume-only"]
+
+    # Seeding again finds nothing to copy
+    output = subprocess.run(["sh", "-c", get_seed_script(str(host_cache))], cwd=volume, check=True, capture_output=True, text=True).stdout
+    assert output.split() == ["0", "0"]
@@ -0,0 +1,29 @@
+import pytest
+
+from aircmd.actions.installers import OfflineWheelInstaller, PipInstaller, UvInstaller, get_python_installer
+from aircmd.models.settings import GlobalSettings
+
+
+class Settings:
+    PIP_VERSION = "23.2.1"
+    UV_VERSION = "0.4.30"
+
+    def __init__(self, installer: str) -> None:
+        self.PYTHON_INSTALLER = installer
+
+
+def test_get_python_installer() -> None:
+    assert isinstance(get_python_installer(Settings("pip")), PipInstaller)  # type: ignore[arg-type]
+    assert isinstance(get_python_installer(Settings("uv")), UvInstaller)  # type: ignore[arg-type]
+    assert isinstance(get_python_installer(Settings("wheel-offline")), OfflineWheelInstaller)  # type: ignore[arg-type]
+    with pytest.raises(ValueError):
+        get_python_installer(Settings("conda"))  # type: ignore[arg-type]
+
+
+def test_install_commands() -> None:
+    settings: GlobalSettings = Settings("pip")  # type: ignore[assignment]
+    assert PipInstaller(settings).install_command(["."], no_deps=True, reinstall=True) == [
+        "python", "-m", "pip", "install", "--no-deps", "--force-reinstall", "."
+    ]
+    assert UvInstaller(settings).install_command(["-r", "requirements.txt"]) == ["uv", "pip", "install", "--system", "-r", "requirements.txt"]
+    assert OfflineWheelInstaller(settings).install_command(["poetry"]) == ["python", "-m", "pip", "install", "poetry"]
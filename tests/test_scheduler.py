@@ -0,0 +1,116 @@
+import asyncio
+from typing import Iterator, List
+
+import pytest
+
+from aircmd.actions.scheduler import ResourceRequest, ResourceScheduler
+from aircmd.models.singleton import Singleton
+
+
+class FakeSettings:
+    SCHEDULER_CPUS = 4
+    SCHEDULER_MEMORY_MB = 4096
+
+
+@pytest.fixture
+def scheduler() -> Iterator[ResourceScheduler]:
+    Singleton._instances.pop(ResourceScheduler, None)
+    yield ResourceScheduler(FakeSettings())  # type: ignore[arg-type]
+    Singleton._instances.pop(ResourceScheduler, None)
+
+
+def test_scheduler_limits_weighted_steps(scheduler: ResourceScheduler) -> None:
+    peak_cpus = 0.0
+    order: List[str] = []
+
+    async def step(name: str, request: ResourceRequest) -> None:
+        nonlocal peak_cpus
+        async with scheduler.slot(request):
+            order.append(name)
+            peak_cpus = max(peak_cpus, scheduler.used.cpus)
+            assert scheduler.used.memory_mb <= scheduler.capacity.memory_mb
+            await asyncio.sleep(0.01)
+
+    async def run() -> None:
+        await asyncio.gather(
+            step("gradle", ResourceRequest(cpus=3, memory_mb=3072)),
+            step("pip-1", ResourceRequest(cpus=1, memory_mb=1024)),
+            step("pip-2", ResourceRequest(cpus=1, memory_mb=1024)),
+            # Bigger than the runner, runs alone
+            step("huge", ResourceRequest(cpus=16, memory_mb=65536)),
+        )
+
+    asyncio.run(run())
+    assert order == ["gradle", "pip-1", "pip-2", "huge"]
+    assert peak_cpus == 4
+    assert scheduler.used == ResourceRequest(cpus=0, memory_mb=0)
+
+
+def test_nested_slots_only_reserve_the_difference(scheduler: ResourceScheduler) -> None:
+    dockerd = ResourceRequest(cpus=2, memory_mb=2048)
+    gradle = ResourceRequest(cpus=4, memory_mb=4096)
+
+    async def lease_with_gradle(leased: asyncio.Event, other_leased: asyncio.Event) -> None:
+        async with scheduler.slot(dockerd):
+            leased.set()
+            await other_leased.wait()
+            async with scheduler.slot(gradle) as reserved:
+                assert reserved == ResourceRequest(cpus=2, memory_mb=2048)
+                await asyncio.sleep(0.01)
+
+    async def run() -> None:
+        async with scheduler.slot(dockerd):
+            async with scheduler.slot(gradle) as reserved:
+                assert reserved == ResourceRequest(cpus=2, memory_mb=2048)
+                assert scheduler.used == ResourceRequest(cpus=4, memory_mb=4096)
+            assert scheduler.used == dockerd
+
+        # Both leases hold 2 of the 4 cores before asking for gradle, neither can wait for the other to release
+        first, second = asyncio.Event(), asyncio.Event()
+        await asyncio.wait_for(asyncio.gather(lease_with_gradle(first, second), lease_with_gradle(second, first)), timeout=5)
+
+    asyncio.run(run())
+    assert scheduler.used == ResourceRequest(cpus=0, memory_mb=0)
+
+
+def test_large_requests_are_not_overtaken(scheduler: ResourceScheduler) -> None:
+    order: List[str] = []
+
+    async def step(name: str, request: ResourceRequest, delay: float) -> None:
+        await asyncio.sleep(delay)
+        async with scheduler.slot(request):
+            order.append(name)
+            await asyncio.sleep(0.02)
+
+    async def run() -> None:
+        await asyncio.gather(
+            step("pip-1", ResourceRequest(cpus=1), 0),
+            step("gradle", ResourceRequest(cpus=4), 0.005),
+            *[step(f"pip-{i}", ResourceRequest(cpus=1), 0.01) for i in range(2, 5)],
+        )
+
+    asyncio.run(run())
+    assert order == ["pip-1", "gradle", "pip-2", "pip-3", "pip-4"]
+
+
+def test_sibling_nested_slots_share_the_lease_of_their_parent(scheduler: ResourceScheduler) -> None:
+    peak = 0
+    running = 0
+
+    async def step() -> None:
+        nonlocal peak, running
+        async with scheduler.slot(ResourceRequest(cpus=1)):
+            running += 1
+            peak = max(peak, running)
+            assert scheduler.used.cpus <= scheduler.capacity.cpus
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    async def run() -> None:
+        async with scheduler.slot(ResourceRequest(cpus=2)):
+            await asyncio.wait_for(asyncio.gather(*[step() for _ in range(20)]), timeout=5)
+
+    asyncio.run(run())
+    # 2 steps run on the cores of the lease, 2 more on the rest of the capacity
+    assert peak == 4
+    assert scheduler.used == ResourceRequest(cpus=0, memory_mb=0)
@@ -0,0 +1,49 @@
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import pytest
+
+from aircmd.actions.sharding import TestTimings, get_junit_durations, merge_junit_reports, shard_tests
+
+JUNIT_XML = """<?xml version="1.0" encoding="utf-8"?>
+<testsuites><testsuite name="pytest" tests="{tests}" failures="{failures}" errors="0" skipped="0" time="{time}">{testcases}</testsuite></testsuites>"""
+
+
+@pytest.fixture
+def test_files(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> list:
+    counts = {"tests/test_a.py": 4, "tests/test_b.py": 1, "tests/test_c.py": 2, "tests/test_d.py": 1}
+    for path, count in counts.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text("".join(f"def test_{i}():\n    pass\n" for i in range(count)))
+    monkeypatch.chdir(tmp_path)
+    return sorted(counts)
+
+
+def test_shard_tests_balances_recorded_durations(test_files: list) -> None:
+    timings = TestTimings(durations={"tests/test_a.py": 10.0, "tests/test_b.py": 6.0, "tests/test_c.py": 3.0, "tests/test_d.py": 1.0})
+    assert shard_tests(test_files, 2, timings) == [["tests/test_a.py"], ["tests/test_b.py", "tests/test_c.py", "tests/test_d.py"]]
+
+
+def test_shard_tests_weights_unrecorded_modules_by_test_count(test_files: list) -> None:
+    # 1 second per test recorded for test_b, test_a has 4 tests and goes alone
+    timings = TestTimings(durations={"tests/test_b.py": 1.0})
+    assert shard_tests(test_files, 2, timings) == [["tests/test_a.py"], ["tests/test_b.py", "tests/test_c.py", "tests/test_d.py"]]
+
+
+def test_shard_tests_caps_the_shard_count_at_the_module_count(test_files: list) -> None:
+    assert shard_tests(test_files[:2], 8) == [["tests/test_a.py"], ["tests/test_b.py"]]
+    assert shard_tests([], 8) == []
+
+
+def test_junit_durations_and_merge() -> None:
+    shard_0 = JUNIT_XML.format(tests=2, failures=0, time=3.0, testcases=(
+        '<testcase classname="tests.test_a" name="test_0" time="1.0"/>'
+        '<testcase classname="tests.test_a.TestClass" name="test_1" time="2.0"/>'
+    ))
+    shard_1 = JUNIT_XML.format(tests=1, failures=1, time=4.0, testcases='<testcase classname="tests.test_b" name="test_0" time="4.0"><failure/></testcase>')
+
+    assert get_junit_durations(shard_0, ["tests/test_a.py", "tests/test_b.py"]) == {"tests/test_a.py": 3.0}
+
+    merged = ET.fromstring(merge_junit_reports([shard_0, shard_1]))
+    assert len(merged.findall("testsuite")) == 2
+    assert (merged.get("tests"), merged.get("failures"), merged.get("time")) == ("3", "1", "7.000")
@@ -0,0 +1,51 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+from pydantic import BaseModel
+
+from aircmd.actions.task_cache import TaskInputs, TaskResult, TaskResultCache, get_task_cache_key
+
+
+class FakeSettings(BaseModel):
+    PIP_VERSION: str = "23.2.1"
+    IMAGES_LOCKFILE: str = "aircmd-images.lock.json"
+
+
+def test_task_cache_key_tracks_declared_inputs(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.py").write_text("print('hello')")
+    (tmp_path / "notes.txt").write_text("not an input")
+    inputs = TaskInputs(host_paths=["./src"], settings_fields=["PIP_VERSION"], images=["python:3.11-slim"])
+
+    def key(settings: FakeSettings = FakeSettings()) -> str:
+        return get_task_cache_key("build", inputs, settings)  # type: ignore[arg-type]
+
+    initial_key = key()
+    (tmp_path / "notes.txt").write_text("still not an input")
+    assert key() == initial_key
+    assert get_task_cache_key("test", inputs, FakeSettings()) != initial_key  # type: ignore[arg-type]
+    assert key(FakeSettings(PIP_VERSION="24.0")) != initial_key
+    (tmp_path / "aircmd-images.lock.json").write_text('{"images": {"python:3.11-slim": "sha256:abc"}}')
+    assert key() != initial_key
+    os.remove(tmp_path / "aircmd-images.lock.json")
+    (tmp_path / "src" / "main.py").write_text("print('hello world')")
+    assert key() != initial_key
+
+
+def test_task_result_cache_expiration_and_override(tmp_path: Path) -> None:
+    cache = TaskResultCache(str(tmp_path), expiration=60)
+    cache.put("fresh", "build", "sha256:abc")
+    stale_path = tmp_path / "stale.json"
+    stale_path.write_text(TaskResult(key="stale", task_name="build", recorded_at=time.time() - 120).json())
+
+    result = cache.get("fresh")
+    assert result is not None and result.outcome == "sha256:abc"
+    assert cache.get("stale") is None
+    assert cache.get("missing") is None
+    assert TaskResultCache(str(tmp_path), expiration=60, enabled=False).get("fresh") is None
+
+    os.utime(stale_path, (time.time() - 120, time.time() - 120))
+    assert cache.prune() == ["stale"]
@@ -0,0 +1,68 @@
+from pathlib import Path
+
+import pygit2  # type: ignore
+import pytest
+
+from aircmd.actions.test_selection import get_changed_files, select_tests
+
+
+@pytest.fixture
+def project(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    files = {
+        "pkg/__init__.py": "",
+        "pkg/core.py": "VALUE = 1\n",
+        "pkg/utils.py": "from .core import VALUE\n",
+        "pkg/cli.py": "from pkg import utils\n",
+        "pkg/data.json": "{}\n",
+        "tests/__init__.py": "",
+        "tests/test_utils.py": "from pkg.utils import VALUE\n",
+        "tests/test_cli.py": "import pkg.cli\n",
+        "pyproject.toml": "",
+    }
+    for path, content in files.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(content)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_select_tests_follows_imports(project: Path) -> None:
+    selection = select_tests(["pkg/cli.py"], ["pkg"], ["tests"])
+    assert (selection.full_run, selection.selected, selection.skipped) == (False, ["tests/test_cli.py"], ["tests/test_utils.py"])
+
+    # core is imported by utils, itself imported by cli
+    assert select_tests(["pkg/core.py"], ["pkg"], ["tests"]).selected == ["tests/test_cli.py", "tests/test_utils.py"]
+    assert select_tests(["README.md"], ["pkg"], ["tests"]).selected == []
+    assert select_tests(["pyproject.toml"], ["pkg"], ["tests"]).full_run
+    assert select_tests(["pkg/data.json"], ["pkg"], ["tests"]).full_run
+    assert select_tests([], ["pkg"], ["tests"], full_run_reason="running on main").reason == "running on main"
+
+
+def test_select_tests_runs_everything_when_a_module_is_deleted(project: Path) -> None:
+    # test_cli imports cli which imports utils, a deleted module is not in the import graph anymore
+    (project / "pkg" / "utils.py").unlink()
+    selection = select_tests(["pkg/utils.py"], ["pkg"], ["tests"])
+    assert selection.full_run and "deleted" in selection.reason
+
+    # A deleted test module has no test left to select
+    (project / "tests" / "test_utils.py").unlink()
+    assert not select_tests(["tests/test_utils.py"], ["pkg"], ["tests"]).full_run
+
+
+def test_get_changed_files_since_merge_base(project: Path) -> None:
+    repo = pygit2.init_repository(str(project))
+    signature = pygit2.Signature("aircmd", "aircmd@example.com")
+
+    def commit(message: str) -> None:
+        repo.index.add_all()
+        repo.index.write()
+        parents = [] if repo.head_is_unborn else [repo.head.target]
+        repo.create_commit("HEAD", signature, signature, message, repo.index.write_tree(), parents)
+
+    commit("init")
+    repo.branches.local.create("main", repo.head.peel(pygit2.Commit))
+    (project / "pkg" / "utils.py").write_text("from .core import VALUE as V\n")
+    commit("change utils")
+    (project / "tests" / "test_cli.py").write_text("import pkg.cli  # noqa\n")
+
+    assert get_changed_files(str(project), "main") == ["pkg/utils.py", "tests/test_cli.py"]
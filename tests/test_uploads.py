@@ -0,0 +1,124 @@
+import os
+from pathlib import Path
+from typing import List, Optional
+
+import pygit2  # type: ignore
+import pytest
+
+from aircmd.actions.gittree import export_git_tree
+from aircmd.actions.uploads import UploadPlanner, is_excluded, parse_gitignore, rebase_pattern
+from aircmd.models.singleton import Singleton
+
+
+def test_rebase_pattern() -> None:
+    assert rebase_pattern("**/build", "airbyte-integrations/connectors/source-foo") == ["**/build"]
+    assert rebase_pattern("airbyte-integrations/connectors/source-foo/secrets", "airbyte-integrations/connectors/source-foo") == ["secrets"]
+    assert rebase_pattern("airbyte-integrations/*/source-foo/.venv", "airbyte-integrations/connectors/source-foo") == [".venv"]
+    assert rebase_pattern(".git", "airbyte-integrations") == []
+    assert rebase_pattern("!**/build/keep", "a") == ["!**/build/keep"]
+    assert rebase_pattern("**/build", ".") == ["**/build"]
+
+
+def test_parse_gitignore() -> None:
+    gitignore = "\n".join(["# comment", "", "node_modules/", "/dist", "docs/_build", "!.env.example", ".env*"])
+    assert parse_gitignore(gitignore) == ["**/node_modules", "dist", "docs/_build", "!**/.env.example", "**/.env*"]
+    assert parse_gitignore("/dist", "frontend") == ["frontend/dist"]
+
+
+def test_is_excluded() -> None:
+    exclude = ["**/node_modules", "**/.env*", "!**/.env.example"]
+    assert is_excluded("frontend/node_modules/react/index.js", exclude)
+    assert is_excluded(".env", exclude)
+    assert not is_excluded(".env.example", exclude)
+    assert not is_excluded("src/main.py", exclude)
+
+
+@pytest.fixture
+def repo(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    files = {
+        ".gitignore": "node_modules/\n*.log\n",
+        "pkg/.gitignore": "/data\n",
+        "pkg/main.py": "print('hello')\n",
+        "pkg/debug.log": "noise\n",
+        "pkg/data/big.csv": "a,b\n" * 100,
+        "pkg/node_modules/lib/index.js": "module.exports = {}\n",
+        "pkg/build/out.whl": "wheel\n",
+        "other/main.py": "\n",
+    }
+    for path, content in files.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(content)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_upload_plan(repo: Path) -> None:
+    plan = UploadPlanner().plan("pkg", exclude=["**/build", "other"])
+
+    assert [entry.path for entry in plan.manifest.entries] == [".gitignore", "main.py"]
+    assert plan.manifest.total_bytes == os.path.getsize("pkg/.gitignore") + os.path.getsize("pkg/main.py")
+    assert "**/build" in plan.exclude and "**/node_modules" in plan.exclude and "data" in plan.exclude
+    assert "other" not in plan.exclude
+
+    # Explicit includes win over .gitignore rules
+    plan = UploadPlanner().plan("pkg", exclude=[], include=["main.py", "debug.log"])
+    assert [entry.path for entry in plan.manifest.entries] == ["debug.log", "main.py"]
+    assert "**/*.log" not in plan.exclude
+
+    assert UploadPlanner().plan("pkg", exclude=[], respect_gitignore=False).manifest.file_count == 6
+
+
+def test_export_git_tree(repo: Path, tmp_path_factory: pytest.TempPathFactory) -> None:
+    git_repo = pygit2.init_repository(str(repo))
+    git_repo.index.add_all()
+    git_repo.index.write()
+    signature = pygit2.Signature("aircmd", "aircmd@example.com")
+    git_repo.create_commit("HEAD", signature, signature, "init", git_repo.index.write_tree(), [])
+    (repo / "pkg" / "untracked.py").write_text("\n")
+    cache_dir = str(tmp_path_factory.mktemp("cache"))
+
+    export = export_git_tree(str(repo), "HEAD", "pkg", exclude=["**/build"], include=None, cache_dir=cache_dir)
+
+    # Ignored, untracked and excluded files are not part of the export
+    assert sorted(os.listdir(export.path)) == [".gitignore", "main.py"]
+    assert export.tree_id == str(git_repo.revparse_single("HEAD").peel(pygit2.Commit).tree["pkg"].id)
+    assert export_git_tree(str(repo), "HEAD", "pkg", exclude=["**/build"], include=None, cache_dir=cache_dir).path == export.path
+    assert export_git_tree(str(repo), "HEAD", "pkg", exclude=[], include=["main.py"], cache_dir=cache_dir).path != export.path
+
+
+class FakeHost:
+    def __init__(self) -> None:
+        self.uploads: List[str] = []
+
+    def directory(self, path: str, exclude: List[str], include: Optional[List[str]] = None) -> str:
+        self.uploads.append(path)
+        return f"directory-{len(self.uploads)}"
+
+
+class FakeClient:
+    def __init__(self) -> None:
+        self._host = FakeHost()
+
+    def host(self) -> FakeHost:
+        return self._host
+
+
+def test_upload_reuses_identical_uploads(repo: Path) -> None:
+    Singleton._instances.pop(UploadPlanner, None)
+    client = FakeClient()
+    for copy, content in [("copy", "print('hello')\n"), ("lookalike", "print('HELLO')\n")]:
+        (repo / copy).mkdir()
+        (repo / copy / "main.py").write_text(content)
+        os.utime(repo / copy / "main.py", ns=(0, os.stat(repo / "pkg" / "main.py").st_mtime_ns))
+
+    pkg = UploadPlanner().upload(client, "pkg", exclude=[], include=["main.py"])  # type: ignore[arg-type]
+    assert UploadPlanner().upload(client, "pkg", exclude=[], include=["main.py"]) == pkg  # type: ignore[arg-type]
+    # Same paths, sizes and modification times, the contents tell them apart
+    assert UploadPlanner().upload(client, "copy", exclude=[]) == pkg  # type: ignore[arg-type]
+    assert UploadPlanner().upload(client, "lookalike", exclude=[]) != pkg  # type: ignore[arg-type]
+    # The .gitignore rules change what gets uploaded
+    with_gitignore = UploadPlanner().upload(client, "pkg", exclude=[])  # type: ignore[arg-type]
+    assert UploadPlanner().upload(client, "pkg", exclude=[], respect_gitignore=False) != with_gitignore  # type: ignore[arg-type]
+    assert client.host().uploads == ["pkg", "lookalike", "pkg", "pkg"]
+    assert [report.reused for report in UploadPlanner().reports] == [False, True, True, False, False, False]
+    Singleton._instances.pop(UploadPlanner, None)